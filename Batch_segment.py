@@ -8,12 +8,20 @@ import random
 import sys
 import threading
 import time
+from collections import deque
 import cv2
 import numpy as np
 import pycuda.autoinit
 import pycuda.driver as cuda
 import tensorrt as trt
 
+from letterbox import letterbox_geometry
+from masks import InstanceMasks, decode_box_masks
+from occupancy import OccupancyAnalyzer
+from render import draw_mask
+from batcher import FrameBatcher
+from display import DisplaySink
+
 CONF_THRESH = 0.5
 IOU_THRESHOLD = 0.4
 
@@ -121,16 +129,18 @@ class YoLov5TRT(object):
         self.bindings = bindings
         self.batch_size = engine.max_batch_size
 
-        # Data length
-        self.det_output_length  = host_outputs[0].shape[0]
-        self.mask_output_length = host_outputs[1].shape[0]
+        # Data length, per image; the output buffers hold batch_size of each
+        self.det_output_length  = host_outputs[0].shape[0] // self.batch_size
+        self.mask_output_length = host_outputs[1].shape[0] // self.batch_size
         self.seg_w = int(self.input_w / 4)
         self.seg_h = int(self.input_h / 4)
-        self.seg_c = int(self.mask_output_length / (self.seg_w * self.seg_w))
+        self.seg_c = int(self.mask_output_length / (self.seg_h * self.seg_w))
         self.det_row_output_length = self.seg_c + 6
         
         # Draw mask
         self.colors_obj = Colors()
+        # Road/footpath ROIs, rasterized once per resolution
+        self.occupancy = OccupancyAnalyzer()
 
     def infer(self, raw_image_generator):
         threading.Thread.__init__(self)
@@ -159,12 +169,14 @@ class YoLov5TRT(object):
         batch_input_image = np.ascontiguousarray(batch_input_image)
 
         # Copy input image to host buffer
-        np.copyto(host_inputs[0], batch_input_image.ravel())
+        # Only the real frames of a partial batch are copied and run
+        num_frames = len(batch_image_raw)
+        np.copyto(host_inputs[0][:batch_input_image[:num_frames].size], batch_input_image[:num_frames].ravel())
         start = time.time()
         # Transfer input data  to the GPU.
         cuda.memcpy_htod_async(cuda_inputs[0], host_inputs[0], stream)
         # Run inference.
-        context.execute_async(batch_size=self.batch_size, bindings=bindings, stream_handle=stream.handle)
+        context.execute_async(batch_size=num_frames, bindings=bindings, stream_handle=stream.handle)
         # Transfer predictions back from the GPU.
         cuda.memcpy_dtoh_async(host_outputs[0], cuda_outputs[0], stream)
         cuda.memcpy_dtoh_async(host_outputs[1], cuda_outputs[1], stream)
@@ -175,62 +187,32 @@ class YoLov5TRT(object):
         self.ctx.pop()
         # Here we use the first row of output in that batch_size = 1
         output_bbox = host_outputs[0]
-        output_proto_mask = host_outputs[1]
+        # Per image views of the prototype masks
+        output_proto_mask = host_outputs[1].reshape(self.batch_size, self.seg_c, self.seg_h, self.seg_w)
         # Do postprocess
-        for i in range(self.batch_size):
+        for i in range(num_frames):
             result_boxes, result_scores, result_classid, result_proto_coef = self.post_process(
                 output_bbox[i * self.det_output_length: (i + 1) * self.det_output_length], batch_origin_h[i], batch_origin_w[i]
             )
             if result_proto_coef.shape[0] == 0:
                 continue
-            result_masks = self.process_mask(output_proto_mask, result_proto_coef, result_boxes, batch_origin_h[i], batch_origin_w[i])
+            result_masks = self.process_mask(output_proto_mask[i], result_proto_coef, result_boxes, batch_origin_h[i], batch_origin_w[i])
             
             
             
+            # Per-class unions of the masks decoded above, see masks.py
+            unions = result_masks.class_unions(result_classid, len(categories))
+            overlap = self.occupancy(unions)
             # Section for Road segmentation
-            road_masks = [mask for mask,result_classid in zip(result_masks,result_classid) if result_classid==1]
-            combined_road_mask = np.zeros((batch_origin_h[i],batch_origin_w[i]),np.uint8)
-            for road_instance in road_masks:
-            	imin = road_instance.min()
-            	imax = road_instance.max()
-            	a = (255 - 0)/(imax - imin)
-            	b = 255 - a * imax
-            	buffer_mask = (a * road_instance + b).astype(np.uint8)
-            	combined_road_mask = combined_road_mask | buffer_mask
             #Uncomment to view mask
-            #cv2.imshow("Frame",combined_road_mask)
-            white_image = np.ones((batch_origin_h[i],batch_origin_w[i]), dtype=np.uint8) * 255
-            top_black_height = int(0.50 * batch_origin_h[i])
-            white_image[0:top_black_height, :] = 0
-            total = cv2.countNonZero(white_image)
-            intersection_mask = white_image & combined_road_mask
-            intersection = cv2.countNonZero(intersection_mask)  
-            print(f"Overlap of road: {(intersection/total)*100}")
+            #cv2.imshow("Frame",unions[1].view(np.uint8) * 255)
+            print(f"Overlap of road: {overlap['road']}")
             
             
             # Section for Footpath Segmentation
-            footpath_masks = [mask for mask,result_classid in zip(result_masks,result_classid) if result_classid==0]
-            combined_footpath_mask = np.zeros((batch_origin_h[i],batch_origin_w[i]),np.uint8)
-            for footpath_instance in footpath_masks:
-            	iminf = footpath_instance.min()
-            	imaxf = footpath_instance.max()
-            	c = (255 - 0)/(imaxf - iminf)
-            	d = 255 - c * imaxf
-            	bufferf_mask = (c * footpath_instance + d).astype(np.uint8)
-            	combined_footpath_mask = combined_footpath_mask | bufferf_mask
             #Uncomment to view mask
-            #cv2.imshow("Frame",combined_footpath_mask)
-            white_imagef = np.ones((batch_origin_h[i],batch_origin_w[i]), dtype=np.uint8) * 255
-            top_black_heightf = int(0.75 * batch_origin_h[i])
-            left_black_widthf = int(0.25 * batch_origin_w[i])
-            right_black_widthf = int(0.25 * batch_origin_w[i])
-            white_imagef[0:top_black_heightf, :] = 0
-            white_imagef[:,0:left_black_widthf] = 0
-            white_imagef[:,-right_black_widthf] = 0
-            totalf = cv2.countNonZero(white_imagef)
-            intersection_maskf = white_imagef & combined_footpath_mask
-            intersectionf = cv2.countNonZero(intersection_maskf)  
-            print(f"Overlap of footpath: {(intersectionf/totalf)*100}")
+            #cv2.imshow("Frame",unions[0].view(np.uint8) * 255)
+            print(f"Overlap of footpath: {overlap['footpath']}")
             
             
             # Draw masks on  the original image
@@ -474,50 +456,27 @@ class YoLov5TRT(object):
             ih: rows of original image
             iw: cols of original image
         return:
-            mask_result: (n, ih, iw)
+            mask_result: InstanceMasks, n box-sized crops, np.asarray() gives (n, ih, iw)
         """
         result_proto_masks = output_proto_mask.reshape(self.seg_c, self.seg_h, self.seg_w)
-        c, mh, mw = result_proto_masks.shape
-        masks = self.sigmoid((result_proto_coef @ result_proto_masks.astype(np.float32).reshape(c, -1))).reshape(-1, mh, mw)
-        mask_result = []
-
-        for mask, box in zip(masks, result_boxes):
-            mask_s = np.zeros((ih, iw))
-            crop_mask = self.scale_mask(mask, ih, iw)            
-            x1 = int(box[0])
-            y1 = int(box[1])
-            x2 = int(box[2])
-            y2 = int(box[3])
-            crop = crop_mask[y1:y2, x1:x2]
-            crop = np.where(crop >= 0.5, 1, 0)
-            crop = crop.astype(np.uint8)
-            mask_s[y1:y2, x1:x2] = crop
-            mask_result.append(mask_s)
-
-        mask_result = np.array(mask_result)
-        return mask_result
+        geometry = letterbox_geometry(ih, iw, self.input_h, self.input_w)
+        # Only the box footprints are decoded and kept, see masks.py
+        return InstanceMasks(decode_box_masks(result_proto_masks, result_proto_coef, result_boxes, geometry), (ih, iw))
 
     def draw_mask(self, masks, colors_, im_src, alpha=0.5):
         """
         description: Draw mask on image ,
         param: 
-            masks  : result_mask
+            masks  : InstanceMasks of the result masks
             colors_: color to draw mask
             im_src : original image
             alpha  : scale between original  image and mask
         return:
             no return
         """
-        if len(masks) == 0:
-            return
-        masks = np.asarray(masks, dtype=np.uint8)
-        masks = np.ascontiguousarray(masks.transpose(1, 2, 0))
-        masks = np.asarray(masks, dtype=np.float32)
-        colors_ = np.asarray(colors_, dtype=np.float32)
-        s = masks.sum(2, keepdims=True).clip(0, 1)
-        masks = (masks @ colors_).clip(0, 255)
-        im_src[:] = masks * alpha + im_src * (1 - s * alpha)
-    
+        # uint8 blending inside the instance boxes only, see render.py
+        draw_mask(masks, colors_, im_src, alpha)
+
 
 class inferThread(threading.Thread):
     def __init__(self, yolov5_wrapper, image_path_batch):
@@ -562,8 +521,6 @@ class Colors:
     def hex2rgb(h):  # rgb order (PIL)
         return tuple(int(h[1 + i:1 + i + 2], 16) for i in (0, 2, 4))
 
-frame_batch = []
-
 PLUGIN_LIBRARY = "yolov5/build/libmyplugins.so"
 engine_file_path = "Seg/best_seg.engine"
 if len(sys.argv) > 1:
@@ -575,16 +532,24 @@ ctypes.CDLL(PLUGIN_LIBRARY)
 categories = ["Footpath","Road"]
 yolov5_wrapper = YoLov5TRT(engine_file_path)
 
-def process_frame_batch(batch):
-    # Perform inference on the batch
-    result_images, use_time = yolov5_wrapper.infer(batch)
+# Batches fill up to the engine's batch size, but a frame waits at most
+# BATCH_MAX_WAIT seconds for the rest of its batch
+BATCH_MAX_WAIT = 0.05
+batcher = FrameBatcher(lambda batch: yolov5_wrapper.infer(batch)[0], yolov5_wrapper.batch_size,
+                       max_wait=BATCH_MAX_WAIT, max_queue=4 * yolov5_wrapper.batch_size)
+# Results of the submitted frames, in frame order
+results = deque()
 
-    # Display or save the processed frames (result_images)
-    for i, result_image in enumerate(result_images):
-        cv2.imshow(f"Processed Frame", result_image)
 
-    # Clear the frame batch
-    del batch[:]
+# The window lives on its own thread and shows the newest frame, see display.py
+display = DisplaySink("Processed Frame")
+
+
+def show_results(block=False):
+    # Display or save the processed frames that are done, in order
+    while results and (block or results[0].done()):
+        result_image = results.popleft().result()
+        display.show(result_image)
 
 
 
@@ -599,17 +564,18 @@ try:
         if not ret:
             break
 
-        # Append the current frame to the batch
-        frame_batch.append(frame)
-
-        # If the batch size reaches 10 frames, process the batch
-        if len(frame_batch) == 10:
-            process_frame_batch(frame_batch)
+        # Hand the frame to the batcher, it runs once the batch is full or
+        # its first frame has waited long enough
+        results.append(batcher.submit(frame))
+        show_results()
 
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+        if display.quit:
             break
 
 finally:
+    batcher.close()
+    show_results(block=True)
+    print(batcher.report())
     cap.release()
-    cv2.destroyAllWindows()
     yolov5_wrapper.destroy()
+    display.close()
@@ -1,23 +1,26 @@
-import sys
-import cv2 
-import imutils
 from yoloDet import YoloTRT
+from capture import CaptureReader
+from display import DisplaySink
+from render import DetectionRenderer
 
 # use path for library and engine file
 model = YoloTRT(library="yolov5/build/libmyplugins.so", engine="det_final/TF.engine", conf=0.5, yolo_ver="v5")
 
-cap = cv2.VideoCapture("videos/demo.mp4")
+# Frames are decoded on a background thread, see capture.py
+cap = CaptureReader("videos/demo.mp4")
+# Detection runs on the full frame, only the displayed copy is 600 wide;
+# drawing and the window run on the display thread, see display.py
+renderer = DetectionRenderer(model.categories, width=600)
+display = DisplaySink("Output", render=renderer.render)
 
-while True:
-    ret, frame = cap.read()
-    frame = imutils.resize(frame, width=600)
-    detections, t = model.Inference(frame)
+for captured in cap:
+    detections, t = model.Detect(captured.image)
     # for obj in detections:
     #    print(obj['class'], obj['conf'], obj['box'])
     # print("FPS: {} sec".format(1/t))
-    cv2.imshow("Output", frame)
-    key = cv2.waitKey(1)
-    if key == ord('q'):
+    display.show(captured.image, detections)
+    if display.quit:
         break
 cap.release()
-cv2.destroyAllWindows()
+model.destroy()
+display.close()
@@ -0,0 +1,465 @@
+"""
+Inference backends shared by the segmentation, detection and classification wrappers.
+
+A backend owns the engine bindings of one model: a host buffer per input and output
+binding and the means to run them. TensorRTBackend does this with a deserialized
+engine, pagelocked host memory and a CUDA stream. ReplayBackend exposes the same
+binding shapes with plain NumPy buffers and fills the outputs from recorded or
+generated data, so the host-side code can be profiled on any Linux box.
+"""
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    import pycuda.autoinit
+    import pycuda.driver as cuda
+    import tensorrt as trt
+except ImportError:
+    cuda = None
+    trt = None
+
+
+# One engine binding: shape is the per-image shape, the batch dimension is implicit
+Binding = namedtuple("Binding", ["name", "shape", "dtype", "is_input"])
+
+
+def segmentation_bindings(input_h=640, input_w=640, seg_c=32, max_det=1000):
+    """
+    description: Binding layout of the yolov5 tensorrtx instance segmentation engine.
+    param:
+        input_h: network input height
+        input_w: network input width
+        seg_c:   number of prototype masks
+        max_det: maximum number of detections written by the yolo plugin
+    return:
+        a list of Binding
+    """
+    return [
+        Binding("data", (3, input_h, input_w), np.float32, True),
+        Binding("prob", (max_det * (seg_c + 6) + 1, 1, 1), np.float32, False),
+        Binding("proto", (seg_c, input_h // 4, input_w // 4), np.float32, False),
+    ]
+
+
+def detection_bindings(input_h=640, input_w=640, max_det=1000):
+    """
+    description: Binding layout of the yolov5 tensorrtx detection engine.
+    """
+    return [
+        Binding("data", (3, input_h, input_w), np.float32, True),
+        Binding("prob", (max_det * 38 + 1, 1, 1), np.float32, False),
+    ]
+
+
+def classification_bindings(num_classes, input_h=224, input_w=224):
+    """
+    description: Binding layout of the yolov5 tensorrtx classification engine.
+    """
+    return [
+        Binding("data", (3, input_h, input_w), np.float32, True),
+        Binding("prob", (num_classes,), np.float32, False),
+    ]
+
+
+class BufferSet(object):
+    """
+    description: Host buffers of all bindings for one batch in flight, plus
+                 whatever the backend needs to run them independently of the
+                 other buffer sets (device buffers, stream, execution context).
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.host_inputs = []
+        self.host_outputs = []
+        self.engine_time = 0.0
+        # {stage: seconds} of the last batch, see InferenceBackend.stage_times()
+        self.stage_times = {}
+
+
+class InferenceBackend(object):
+    """
+    description: Base class of the inference backends. Subclasses provide the
+                 buffer allocation and the actual execution.
+    param:
+        bindings:   list of Binding
+        batch_size: engine batch size
+        num_slots:  number of buffer sets, i.e. batches that can be in flight
+                    at once; execute() always uses the first one
+    """
+
+    def __init__(self, bindings, batch_size, num_slots=1):
+        self.binding_list = list(bindings)
+        self.batch_size = batch_size
+        self.input_shapes = []
+        self.output_shapes = []
+        self.engine_time = 0.0
+        self.enqueued = {}
+
+        for binding in self.binding_list:
+            if binding.is_input:
+                self.input_w = binding.shape[-1]
+                self.input_h = binding.shape[-2]
+                self.input_shapes.append(tuple(binding.shape))
+            else:
+                self.output_shapes.append(tuple(binding.shape))
+
+        self.slots = []
+        for index in range(num_slots):
+            slot = self.create_slot(index)
+            for binding in self.binding_list:
+                size = int(np.prod(binding.shape)) * batch_size
+                host_mem = self.allocate(binding, size, slot)
+                if binding.is_input:
+                    slot.host_inputs.append(host_mem)
+                else:
+                    slot.host_outputs.append(host_mem)
+            self.slots.append(slot)
+        # The synchronous API works on the first buffer set
+        self.host_inputs = self.slots[0].host_inputs
+        self.host_outputs = self.slots[0].host_outputs
+
+    @property
+    def num_slots(self):
+        return len(self.slots)
+
+    def create_slot(self, index):
+        """
+        description: Create the (still empty) buffer set number index.
+        """
+        return BufferSet(index)
+
+    def allocate(self, binding, size, slot):
+        """
+        description: Allocate the host buffer (and whatever else the backend
+                     needs) of one binding in one buffer set.
+        return:
+            a flat host array with `size` elements
+        """
+        raise NotImplementedError
+
+    def push(self):
+        """
+        description: Make the backend's device context current, if it has one.
+        """
+        pass
+
+    def pop(self):
+        """
+        description: Undo push().
+        """
+        pass
+
+    def execute(self, batch_size=None):
+        """
+        description: Run the engine on the host input buffers and leave the
+                     results in the host output buffers.
+        param:
+            batch_size: number of images to run, defaults to the engine batch size
+        return:
+            the engine time in seconds, transfers included
+        """
+        self.enqueue(0, batch_size)
+        return self.wait(0)
+
+    def enqueue(self, slot=0, batch_size=None):
+        """
+        description: Start the engine on the host inputs of a buffer set and
+                     return without waiting for it. The host buffers of that
+                     set must not be touched until wait() returns.
+        """
+        if slot in self.enqueued:
+            raise RuntimeError("buffer set {} is already in flight".format(slot))
+        self.enqueued[slot] = time.time()
+        self._enqueue(self.slots[slot], batch_size or self.batch_size)
+
+    def wait(self, slot=0):
+        """
+        description: Wait until the batch enqueued on a buffer set is done, its
+                     results are in that set's host output buffers then.
+        return:
+            the engine time in seconds, transfers included
+        """
+        start = self.enqueued.pop(slot)
+        buffers = self.slots[slot]
+        self._wait(buffers)
+        buffers.engine_time = self.slot_time(buffers, time.time() - start)
+        buffers.stage_times = self.stage_times(buffers)
+        self.engine_time = buffers.engine_time
+        return self.engine_time
+
+    def slot_time(self, slot, wall_time):
+        """
+        description: Engine time of the last batch of a buffer set; the wall
+                     time from enqueue() to the end of wait() unless the
+                     backend can measure better.
+        """
+        return wall_time
+
+    def stage_times(self, slot):
+        """
+        description: The engine time of the last batch of a buffer set split
+                     into stages, as far as the backend can tell them apart.
+        return:
+            {stage: seconds}
+        """
+        return {"engine": slot.engine_time}
+
+    def _enqueue(self, slot, batch_size):
+        raise NotImplementedError
+
+    def _wait(self, slot):
+        raise NotImplementedError
+
+    def destroy(self):
+        pass
+
+
+# Deserialized engines shared by the backends of one process, by engine file:
+# path -> [runtime, engine, number of backends using it]
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def acquire_engine(engine_file_path):
+    """
+    description: Deserialize an engine file once per process. Every backend
+                 on the same file gets the same ICudaEngine and only adds its
+                 own execution contexts, streams and buffers.
+    """
+    with _engines_lock:
+        entry = _engines.get(engine_file_path)
+        if entry is None:
+            TRT_LOGGER = trt.Logger(trt.Logger.INFO)
+            runtime = trt.Runtime(TRT_LOGGER)
+            # Deserialize the engine from file
+            with open(engine_file_path, "rb") as f:
+                entry = [runtime, runtime.deserialize_cuda_engine(f.read()), 0]
+            _engines[engine_file_path] = entry
+        entry[2] += 1
+        return entry[1]
+
+
+def release_engine(engine_file_path):
+    """
+    description: Drop a backend's reference to a shared engine, the engine is
+                 freed with its last user.
+    """
+    with _engines_lock:
+        entry = _engines[engine_file_path]
+        entry[2] -= 1
+        if entry[2] == 0:
+            del _engines[engine_file_path]
+
+
+class TensorRTBackend(InferenceBackend):
+    """
+    description: Runs a serialized TensorRT engine with pagelocked host buffers.
+                 Every buffer set has its own device buffers, CUDA stream and
+                 execution context (and so its own activation memory), so
+                 batches on different sets overlap with each other and with
+                 the host.
+    param:
+        engine_file_path: serialized engine
+        make_context:     create a CUDA context of its own; otherwise use the
+                          context current at construction (pycuda.autoinit's)
+                          and share the deserialized engine with the other
+                          backends on the same file in that context
+        num_slots:        number of buffer sets, see InferenceBackend
+    """
+
+    def __init__(self, engine_file_path, make_context=True, num_slots=1):
+        if trt is None:
+            raise ImportError("TensorRTBackend needs tensorrt and pycuda")
+        self.owns_context = make_context
+        if make_context:
+            # Create a Context on this device,
+            self.ctx = cuda.Device(0).make_context()
+            TRT_LOGGER = trt.Logger(trt.Logger.INFO)
+            self.runtime = trt.Runtime(TRT_LOGGER)
+            # Deserialize the engine from file
+            with open(engine_file_path, "rb") as f:
+                self.engine = self.runtime.deserialize_cuda_engine(f.read())
+            self.engine_file_path = None
+        else:
+            # Borrowed context, pushed around every use so that other threads
+            # (e.g. one per camera) can run this backend too
+            self.ctx = cuda.Context.get_current()
+            self.engine = acquire_engine(engine_file_path)
+            self.engine_file_path = engine_file_path
+
+        bindings = []
+        for binding in self.engine:
+            print('bingding:', binding, self.engine.get_binding_shape(binding))
+            bindings.append(Binding(
+                binding,
+                tuple(self.engine.get_binding_shape(binding)),
+                trt.nptype(self.engine.get_binding_dtype(binding)),
+                self.engine.binding_is_input(binding),
+            ))
+        InferenceBackend.__init__(self, bindings, self.engine.max_batch_size, num_slots)
+        # The synchronous API works on the first buffer set
+        first = self.slots[0]
+        self.stream = first.stream
+        self.context = first.context
+        self.cuda_inputs = first.cuda_inputs
+        self.cuda_outputs = first.cuda_outputs
+        self.bindings = first.bindings
+
+    def create_slot(self, index):
+        slot = BufferSet(index)
+        slot.stream = cuda.Stream()
+        slot.context = self.engine.create_execution_context()
+        slot.start = cuda.Event()
+        slot.uploaded = cuda.Event()
+        slot.executed = cuda.Event()
+        slot.end = cuda.Event()
+        slot.cuda_inputs = []
+        slot.cuda_outputs = []
+        slot.bindings = []
+        return slot
+
+    def allocate(self, binding, size, slot):
+        # Allocate host and device buffers
+        host_mem = cuda.pagelocked_empty(size, binding.dtype)
+        cuda_mem = cuda.mem_alloc(host_mem.nbytes)
+        # Append the device buffer to device bindings.
+        slot.bindings.append(int(cuda_mem))
+        if binding.is_input:
+            slot.cuda_inputs.append(cuda_mem)
+        else:
+            slot.cuda_outputs.append(cuda_mem)
+        return host_mem
+
+    def push(self):
+        # Make self the active context, pushing it on top of the context stack.
+        if self.ctx is not None:
+            self.ctx.push()
+
+    def pop(self):
+        # Remove any context from the top of the context stack, deactivating it.
+        if self.ctx is not None:
+            self.ctx.pop()
+
+    def _enqueue(self, slot, batch_size):
+        slot.start.record(slot.stream)
+        # Transfer input data  to the GPU. Only the first batch_size images of
+        # every binding, they start at the beginning of the host and device
+        # buffers alike, so a partial batch does not copy the unused rest
+        for host_mem, cuda_mem in zip(slot.host_inputs, slot.cuda_inputs):
+            cuda.memcpy_htod_async(cuda_mem, host_mem[:host_mem.size // self.batch_size * batch_size], slot.stream)
+        slot.uploaded.record(slot.stream)
+        # Run inference.
+        slot.context.execute_async(batch_size=batch_size, bindings=slot.bindings, stream_handle=slot.stream.handle)
+        slot.executed.record(slot.stream)
+        # Transfer predictions back from the GPU, again of the images run only
+        for host_mem, cuda_mem in zip(slot.host_outputs, slot.cuda_outputs):
+            cuda.memcpy_dtoh_async(host_mem[:host_mem.size // self.batch_size * batch_size], cuda_mem, slot.stream)
+        slot.end.record(slot.stream)
+
+    def _wait(self, slot):
+        # Synchronize the stream
+        slot.stream.synchronize()
+
+    def slot_time(self, slot, wall_time):
+        # GPU time of the stream, not how long the host took to come back for it
+        return slot.end.time_since(slot.start) / 1000.0
+
+    def stage_times(self, slot):
+        # The events recorded between the transfers and the engine run
+        return {
+            "h2d": slot.uploaded.time_since(slot.start) / 1000.0,
+            "execute": slot.executed.time_since(slot.uploaded) / 1000.0,
+            "d2h": slot.end.time_since(slot.executed) / 1000.0,
+        }
+
+    def destroy(self):
+        if self.owns_context:
+            self.pop()
+            return
+        # Free this backend's contexts and buffers, then its share of the engine
+        self.push()
+        for slot in self.slots:
+            for cuda_mem in slot.cuda_inputs + slot.cuda_outputs:
+                cuda_mem.free()
+            slot.context = None
+        self.context = None
+        self.pop()
+        if self.engine_file_path is not None:
+            self.engine = None
+            release_engine(self.engine_file_path)
+            self.engine_file_path = None
+
+
+class ReplayBackend(InferenceBackend):
+    """
+    description: CPU stand-in for TensorRTBackend. It has the same binding shapes
+                 but keeps its buffers in ordinary NumPy memory and, instead of
+                 running a network, writes prepared outputs into the host
+                 output buffers. Like a GPU it runs one batch at a time on a
+                 worker thread, so enqueue() returns at once.
+    param:
+        bindings:   list of Binding, see segmentation_bindings() and friends
+        batch_size: engine batch size
+        outputs:    None to leave the outputs zeroed (no detections),
+                    a sequence of per-call output lists replayed in a loop,
+                    or a callable taking the backend and returning such a list
+        latency:    seconds to sleep per batch to stand in for the engine, or a
+                    callable returning them, e.g. drawn from measured timings
+        num_slots:  number of buffer sets, see InferenceBackend
+    """
+
+    def __init__(self, bindings, batch_size=1, outputs=None, latency=0.0, num_slots=1):
+        self.outputs = outputs
+        self.latency = latency
+        self.calls = 0
+        self.device = ThreadPoolExecutor(max_workers=1)
+        InferenceBackend.__init__(self, bindings, batch_size, num_slots)
+
+    def create_slot(self, index):
+        slot = BufferSet(index)
+        slot.job = None
+        return slot
+
+    def allocate(self, binding, size, slot):
+        return np.zeros(size, dtype=binding.dtype)
+
+    def _enqueue(self, slot, batch_size):
+        slot.job = self.device.submit(self._run, slot)
+
+    def _wait(self, slot):
+        slot.run_time = slot.job.result()
+        slot.job = None
+
+    def slot_time(self, slot, wall_time):
+        # Time on the worker, without waiting behind other buffer sets
+        return slot.run_time
+
+    def stage_times(self, slot):
+        # No transfers, the replayed outputs are written in place
+        return {"execute": slot.run_time}
+
+    def _run(self, slot):
+        start = time.time()
+        if callable(self.outputs):
+            outputs = self.outputs(self)
+        elif self.outputs:
+            outputs = self.outputs[self.calls % len(self.outputs)]
+        else:
+            outputs = None
+        if outputs is not None:
+            for host_mem, output in zip(slot.host_outputs, outputs):
+                output = np.asarray(output, dtype=host_mem.dtype).ravel()
+                host_mem[:output.size] = output
+        self.calls += 1
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+        return time.time() - start
+
+    def destroy(self):
+        self.device.shutdown()
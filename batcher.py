@@ -0,0 +1,151 @@
+"""
+Dynamic frame batching in front of the inference wrappers.
+
+Frames are submitted one by one, from one camera or several, and come back as
+per-frame futures. A worker thread fills a batch up to the engine's batch size,
+but sends it off as soon as the oldest frame in it has waited max_wait seconds,
+so a slow or stalled source never holds frames back for longer than that.
+max_wait is the knob between latency (small) and full batches (large); stats()
+tells how full the batches actually were.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class FrameBatcher(object):
+    """
+    description: Group single frames into batches with a latency deadline.
+    param:
+        run_batch: callable taking a list of 1 to max_batch frames and returning
+                   one result per frame, in the same order
+        max_batch: batch size of the engine
+        max_wait:  seconds the first frame of a batch may wait for more frames
+        max_queue: frames waiting for a batch before submit() blocks, 0 for no limit
+    """
+
+    def __init__(self, run_batch, max_batch, max_wait=0.01, max_queue=0):
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.frames = queue.Queue(max_queue)
+        self.batch_sizes = [0] * (max_batch + 1)
+        self.waited = 0.0
+        self.closed = False
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def submit(self, frame):
+        """
+        description: Queue one frame.
+        return:
+            a concurrent.futures.Future holding the frame's result
+        """
+        if self.closed:
+            raise RuntimeError("submit() on a closed FrameBatcher")
+        future = Future()
+        self.frames.put((frame, future, time.time()))
+        return future
+
+    def close(self):
+        """
+        description: Run the frames already queued and stop the worker.
+        """
+        if not self.closed:
+            self.closed = True
+            self.frames.put(None)
+            self.worker.join()
+
+    def run(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = item[2] + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.time()
+                try:
+                    item = self.frames.get(timeout=timeout) if timeout > 0 else self.frames.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self.run_one(batch)
+            if stop:
+                return
+
+    def run_one(self, batch):
+        """
+        description: Run one batch and hand every frame its result, or the
+                     exception if the batch failed.
+        """
+        start = time.time()
+        self.batch_sizes[len(batch)] += 1
+        self.waited += sum(start - submitted for _, _, submitted in batch)
+        futures = [future for _, future, _ in batch]
+        try:
+            results = self.run_batch([frame for frame, _, _ in batch])
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+    def stats(self):
+        """
+        description: How well the batches were filled so far.
+        return:
+            a dict with the number of batches and frames, the mean occupancy
+            (frames per batch / max_batch), the mean seconds a frame waited
+            for its batch, and the count of batches per size
+        """
+        batches = sum(self.batch_sizes)
+        frames = sum(size * count for size, count in enumerate(self.batch_sizes))
+        return {
+            "batches": batches,
+            "frames": frames,
+            "occupancy": frames / float(batches * self.max_batch) if batches else 0.0,
+            "mean_wait": self.waited / frames if frames else 0.0,
+            "batch_sizes": {size: count for size, count in enumerate(self.batch_sizes) if count},
+        }
+
+    def report(self):
+        """
+        description: stats() as one line for the logs
+        """
+        stats = self.stats()
+        return "batches {} frames {} occupancy {:.1f}% wait {:.1f}ms sizes {}".format(
+            stats["batches"], stats["frames"], stats["occupancy"] * 100,
+            stats["mean_wait"] * 1000, stats["batch_sizes"])
+
+
+def segmentation_batcher(yolov5_wrapper, max_wait=0.01, max_queue=0, draw=True):
+    """
+    description: FrameBatcher in front of YoLov5TRT.infer; every frame's
+                 result is (drawn frame, engine time of its batch). With
+                 draw=False it is in front of YoLov5TRT.detect instead and every
+                 frame's result is (SegmentationResult, engine time).
+    """
+    def run_batch(frames):
+        if not draw:
+            results, use_time = yolov5_wrapper.detect(frames)
+            return [(result, use_time) for result in results]
+        batch_image_raw, use_time = yolov5_wrapper.infer(frames)
+        return [(image, use_time) for image in batch_image_raw]
+    return FrameBatcher(run_batch, yolov5_wrapper.batch_size, max_wait, max_queue)
+
+
+def detection_batcher(detector, max_wait=0.01, max_queue=0):
+    """
+    description: FrameBatcher in front of YoloTRT.Detect, which runs one
+                 frame at a time; every frame's result is (detections, engine time)
+                 and the frames are not drawn on. Several cameras can share one
+                 detector through it.
+    """
+    return FrameBatcher(lambda frames: [detector.Detect(frame) for frame in frames], 1, max_wait, max_queue)
@@ -0,0 +1,385 @@
+"""
+Benchmark the segmentation, detection and classification pipelines.
+
+By default the engine is replaced by a ReplayBackend, which keeps the real binding
+shapes and either replays recorded outputs, plays the engine outputs of the
+synthetic scene (--instances, see synthetic.py) or reports no detections, so this
+runs on any Linux box. Recorded outputs come from an .npz with one array per output
+binding, in binding order, or from an engine capture (see engine_capture.py). The
+frames come from a video or from the synthetic scene. The stand-in
+sleeps --latency seconds per batch; given a profiler JSON of a run on the device
+(--profile PATH there) it sleeps as long as the engine measured there instead,
+drawn from the recorded distribution. --backend trt runs the real engine.
+
+Every option below marked "list" takes comma-separated values and the benchmark
+runs every combination, each in a process of its own so CPU time and peak RSS
+are its own:
+
+    python benchmark.py --pipeline seg --batch 1,2 --in-flight 1,2 --workers 0,2 \\
+        --render off,on --replay street.cap --latency device.json --json sweep.json
+
+Per combination it reports the throughput, the latency of a batch from the moment
+it is handed to the pipeline until its results are back, the engine time, the CPU
+used by the benchmark and its workers (100% is one core) and the peak RSS.
+"""
+import argparse
+import importlib.util
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+
+import numpy as np
+
+from backend import ReplayBackend, classification_bindings, detection_bindings, segmentation_bindings
+from engine_capture import CAPTURE_MAGIC, EngineCapture
+from profiler import Profiler, StageHistogram
+from synthetic import Scene
+
+# Options that take a list of values to sweep
+SWEEP = ("batch", "in_flight", "workers", "render")
+
+# Classes of the classification engine of cls-vid-2.py
+CLASSIFICATION_CLASSES = 3
+
+
+def load_replay(path):
+    """
+    description: Load recorded engine outputs saved with np.savez(path, *outputs)
+                 or written by an engine_capture.CaptureWriter
+    return:
+        the outputs argument of a ReplayBackend, and the bindings of the
+        capture (None for an .npz)
+    """
+    with open(path, "rb") as f:
+        if f.read(len(CAPTURE_MAGIC)) == CAPTURE_MAGIC:
+            capture = EngineCapture(path)
+            return capture.replay(), capture.bindings
+    data = np.load(path)
+    return [[data[key] for key in sorted(data.files, key=lambda k: int(k.split('_')[-1]))]], None
+
+
+def engine_latency(spec, seed=0):
+    """
+    description: The latency argument of a ReplayBackend.
+    param:
+        spec: seconds per batch, or the path of a Profiler.dump() of a run on
+              the device. The engine stages found there (h2d, execute, d2h, or
+              engine) are replayed: every batch takes the same percentile of
+              each, picked at random
+    """
+    try:
+        return float(spec)
+    except ValueError:
+        pass
+    with open(spec) as f:
+        stages = json.load(f)["stages"]
+    names = [name for name in ("h2d", "execute", "d2h") if name in stages] or ["engine"]
+    if names[0] not in stages:
+        raise ValueError("{} holds no engine timings".format(spec))
+    hists = [StageHistogram.from_dict(stages[name]) for name in names]
+    rng = np.random.default_rng(seed)
+    return lambda: sum(hist.percentile(rng.uniform(0, 100)) for hist in hists) / 1e9
+
+
+def load_classifier():
+    """
+    description: The CustomYoloClass of cls-vid-2.py, whose file name is no module name
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cls-vid-2.py")
+    spec = importlib.util.spec_from_file_location("cls_vid_2", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.CustomYoloClass
+
+
+def build_pipeline(args, profiler=None):
+    """
+    description: Create the wrapper named by args.pipeline, on the TensorRT
+                 engine or on a ReplayBackend
+    param:
+        profiler: Profiler for the wrapper's stages, see profiler.py
+    return:
+        the wrapper, and a callable taking an iterable of frame batches and
+        yielding the engine time of every batch as it completes
+    """
+    trt = args.backend == "trt"
+    outputs, bindings = load_replay(args.replay) if args.replay else (None, None)
+    if not args.replay and args.instances is not None and args.pipeline != "cls" and not args.video:
+        # The engine outputs of the frames source_frames() draws
+        scene = Scene(args.width, args.height, instances=args.instances)
+        outputs = scene.replay(args.pipeline, args.source_frames, args.input_h, args.input_w)
+    latency = engine_latency(args.latency)
+    if args.pipeline == "seg":
+        from segmentation_final import YoLov5TRT
+        backend = None
+        if not trt:
+            backend = ReplayBackend(bindings or segmentation_bindings(args.input_h, args.input_w),
+                                    batch_size=args.batch, outputs=outputs, latency=latency,
+                                    num_slots=args.in_flight)
+        caps = {"nms_top_k": None, "max_det": None} if args.uncapped else {}
+        wrapper = YoLov5TRT(args.engine, backend=backend, in_flight=args.in_flight,
+                            postprocess_workers=args.workers, max_frame_shape=(args.height, args.width, 3),
+                            profiler=profiler, **caps)
+        return wrapper, lambda batches: (use_time for _, _, use_time in wrapper.results_stream(batches, args.render))
+    if args.pipeline == "det":
+        from yoloDet import YoloTRT
+        backend = None
+        if not trt:
+            backend = ReplayBackend(bindings or detection_bindings(args.input_h, args.input_w),
+                                    batch_size=1, outputs=outputs, latency=latency)
+        wrapper = YoloTRT(library=args.plugin, engine=args.engine, conf=0.5, yolo_ver="v5",
+                          backend=backend, profiler=profiler)
+        if args.uncapped:
+            wrapper.NMS_TOP_K = wrapper.MAX_DET = None
+        detect = wrapper.Inference if args.render else wrapper.Detect
+        return wrapper, lambda batches: (detect(frames[0])[1] for frames in batches)
+    CustomYoloClass = load_classifier()
+    backend = None
+    if not trt:
+        backend = ReplayBackend(bindings or classification_bindings(CLASSIFICATION_CLASSES, args.input_h, args.input_w),
+                                batch_size=args.batch, outputs=outputs, latency=latency)
+    wrapper = CustomYoloClass(args.engine, backend=backend)
+    return wrapper, lambda batches: (wrapper.infer(frames)[1] for frames in batches)
+
+
+def unsupported(args):
+    """
+    description: Why a combination cannot run, None if it can
+    """
+    if args.pipeline != "seg" and (args.in_flight != 1 or args.workers):
+        return "in-flight and workers are segmentation only"
+    if args.pipeline == "det" and args.batch != 1:
+        return "the detector runs one frame at a time"
+    if args.pipeline == "cls" and not args.render:
+        return "the classifier always draws"
+    return None
+
+
+def source_frames(args):
+    """
+    description: The frames fed to the pipeline in a loop: the first
+                 --source-frames of --video, or of the synthetic scene
+    """
+    if args.video:
+        import cv2
+        cap = cv2.VideoCapture(args.video)
+        frames = []
+        while len(frames) < args.source_frames:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames.append(frame)
+        cap.release()
+        if not frames:
+            raise ValueError("no frames in {}".format(args.video))
+        return frames
+    return list(Scene(args.width, args.height).frames(args.source_frames))
+
+
+def cpu_seconds():
+    """
+    description: User and system time of this process and its finished children
+    """
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return self_usage.ru_utime + self_usage.ru_stime + children.ru_utime + children.ru_stime
+
+
+def percentiles(values):
+    values = np.asarray(values) * 1000
+    return {"mean": float(values.mean()), "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)), "p99": float(np.percentile(values, 99)),
+            "max": float(values.max())}
+
+
+def run_config(args):
+    """
+    description: Benchmark one combination, in this process.
+    return:
+        a dict of the measurements, times in ms
+    """
+    frames = source_frames(args)
+    # The postprocess pool is sized for the frames actually fed
+    args.height, args.width = frames[0].shape[:2]
+    profiler = Profiler(enabled=args.profile is not None)
+    wrapper, run = build_pipeline(args, profiler)
+    # Submission time of every batch not completed yet, oldest first
+    submitted = deque()
+
+    def batches():
+        for n in range(args.warmup + args.frames):
+            batch = [frames[(n * args.batch + i) % len(frames)] for i in range(args.batch)]
+            if args.render:
+                # The pipelines draw on their input, hand them a fresh copy every time
+                batch = [frame.copy() for frame in batch]
+            submitted.append(time.perf_counter())
+            yield batch
+
+    latencies = []
+    engine_times = []
+    start = cpu_start = None
+    for n, engine_time in enumerate(run(batches())):
+        now = time.perf_counter()
+        latency = now - submitted.popleft()
+        if n >= args.warmup:
+            latencies.append(latency)
+            engine_times.append(engine_time)
+        if n == args.warmup - 1 or (n == 0 and not args.warmup):
+            # Stage timings, throughput and CPU without the warm-up batches
+            profiler.reset()
+            start, cpu_start = now, cpu_seconds()
+    # The workers are reaped here, their CPU time counts from now on
+    wrapper.destroy()
+    elapsed = time.perf_counter() - start
+    # Without warm-up the first batch only started the clock
+    timed = args.frames if args.warmup else args.frames - 1
+    cpu = cpu_seconds() - cpu_start
+
+    result = {"fps": timed * args.batch / elapsed if elapsed > 0 else 0.0,
+              "latency_ms": percentiles(latencies),
+              "engine_ms": percentiles(engine_times),
+              "cpu_percent": 100.0 * cpu / elapsed if elapsed > 0 else 0.0,
+              # ru_maxrss is in kB on Linux; the largest worker for the children
+              "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+              "peak_worker_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0}
+    if args.profile is not None:
+        result["stages"] = profiler.stats()
+        if args.profile:
+            profiler.dump(args.profile)
+    return result
+
+
+def parse_list(kind):
+    def parse(text):
+        return [kind(value) for value in text.split(",")]
+    return parse
+
+
+def parse_switch(text):
+    return {"on": True, "1": True, "off": False, "0": False}[text]
+
+
+def combinations(args):
+    """
+    description: One args namespace per combination of the swept options
+    """
+    values = [getattr(args, name) for name in SWEEP]
+    for combination in itertools.product(*values):
+        config = argparse.Namespace(**vars(args))
+        for name, value in zip(SWEEP, combination):
+            setattr(config, name, value)
+        yield config
+
+
+def run_isolated(config):
+    """
+    description: run_config() in a fresh interpreter; the pipeline's own
+                 prints are dropped
+    return:
+        the measurements, or {"error": ...}
+    """
+    with tempfile.NamedTemporaryFile(suffix=".json") as result:
+        command = [sys.executable, os.path.abspath(__file__),
+                   "--run-config", json.dumps(vars(config)), "--result", result.name]
+        process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if process.returncode:
+            lines = process.stderr.decode(errors="replace").strip().splitlines()
+            return {"error": lines[-1] if lines else "exit status {}".format(process.returncode)}
+        with open(result.name) as f:
+            return json.load(f)
+
+
+TABLE_HEADER = "{:>5} {:>9} {:>7} {:>6} {:>8} {:>8} {:>8} {:>8} {:>8} {:>6} {:>8}".format(
+    "batch", "in-flight", "workers", "render", "fps", "lat p50", "lat p95", "lat p99", "engine", "cpu%", "rss MB")
+
+
+def table_row(config, result):
+    """
+    description: One combination as a line of the table, times in ms
+    """
+    head = "{:>5} {:>9} {:>7} {:>6}".format(
+        config["batch"], config["in_flight"], config["workers"], "on" if config["render"] else "off")
+    if "skipped" in result:
+        return "{} skipped: {}".format(head, result["skipped"])
+    if "error" in result:
+        return "{} failed: {}".format(head, result["error"])
+    lat = result["latency_ms"]
+    rss = max(result["peak_rss_mb"], result["peak_worker_rss_mb"])
+    return "{} {:8.1f} {:8.2f} {:8.2f} {:8.2f} {:8.2f} {:6.0f} {:8.0f}".format(
+        head, result["fps"], lat["p50"], lat["p95"], lat["p99"], result["engine_ms"]["mean"],
+        result["cpu_percent"], rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pipeline", choices=["seg", "det", "cls"], default="seg")
+    parser.add_argument("--backend", choices=["replay", "trt"], default="replay")
+    parser.add_argument("--engine", default=None, help="serialized engine (trt backend)")
+    parser.add_argument("--plugin", default=None, help="plugin library of the engine (trt backend)")
+    parser.add_argument("--frames", type=int, default=100, help="batches timed per combination")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--input-h", type=int, default=640)
+    parser.add_argument("--input-w", type=int, default=640)
+    parser.add_argument("--video", default=None, help="take the frames from this video instead of the synthetic scene")
+    parser.add_argument("--source-frames", type=int, default=32, help="frames decoded or generated and looped")
+    parser.add_argument("--instances", type=int, default=None,
+                        help="play the synthetic scene's engine outputs with this many detection rows per frame")
+    parser.add_argument("--uncapped", action="store_true",
+                        help="lift the NMS top-k and max-det caps, so all --instances rows are kept")
+    parser.add_argument("--replay", default=None, help=".npz or engine capture of recorded engine outputs")
+    parser.add_argument("--latency", default="0", help="simulated engine seconds per batch, or a profiler JSON")
+    parser.add_argument("--batch", type=parse_list(int), default=[1], help="frames per batch (list)")
+    parser.add_argument("--in-flight", type=parse_list(int), default=[1], help="batches in flight (list, seg only)")
+    parser.add_argument("--workers", type=parse_list(int), default=[0],
+                        help="postprocess worker processes (list, seg only)")
+    parser.add_argument("--render", type=parse_list(parse_switch), default=[False],
+                        help="draw the results, on/off (list)")
+    parser.add_argument("--profile", nargs="?", const="", default=None, metavar="PATH",
+                        help="per-stage timings, also written as profiler JSON to PATH "
+                             "(PATH-N.json for the N-th combination) if given")
+    parser.add_argument("--json", default=None, metavar="PATH", help="write all results to PATH")
+    # A single combination, run by run_isolated()
+    parser.add_argument("--run-config", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--result", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_config:
+        result = run_config(argparse.Namespace(**json.loads(args.run_config)))
+        with open(args.result, "w") as f:
+            json.dump(result, f)
+        return
+    if args.backend == "trt" and not args.engine:
+        parser.error("--backend trt needs --engine")
+
+    configs = list(combinations(args))
+    print("pipeline={} backend={} frames={} source={}".format(
+        args.pipeline, args.backend, args.frames, args.video or "{}x{} synthetic".format(args.width, args.height)))
+    print(TABLE_HEADER)
+    rows = []
+    for n, config in enumerate(configs):
+        if args.profile and len(configs) > 1:
+            root, ext = os.path.splitext(args.profile)
+            config.profile = "{}-{}{}".format(root, n, ext or ".json")
+        reason = unsupported(config)
+        result = {"skipped": reason} if reason else run_isolated(config)
+        rows.append((vars(config), result))
+        print(table_row(vars(config), result))
+        if "stages" in result:
+            for name, s in result["stages"].items():
+                print("{:>20} {:8.3f} ms mean {:8.3f} ms p95".format(name, s["mean"], s["p95"]))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([{"config": {k: config[k] for k in ("pipeline", "backend") + SWEEP}, "result": result}
+                       for config, result in rows], f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Threaded video capture.
+
+cv2.VideoCapture.read() decodes on the caller's thread, so decode time adds to
+every frame's latency, and a live camera that is read too slowly hands out
+frames that waited in the driver buffer. CaptureReader decodes on a background
+thread into a bounded ring instead:
+
+    - "lossless": every frame is kept, decoding pauses while the ring is full
+                  (video files, offline runs)
+    - "latest":   decoding never waits, the oldest frame is dropped when the
+                  ring is full, with capacity=1 the reader always gets the
+                  newest frame (live cameras)
+
+Every frame carries its index in the stream and the time it was captured, so
+end-to-end latency is time.time() - frame.timestamp wherever it is needed.
+"""
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+
+# One decoded frame: position in the stream, capture time (time.time()) and BGR image
+Frame = namedtuple("Frame", ["index", "timestamp", "image"])
+
+LOSSLESS = "lossless"
+LATEST = "latest"
+
+
+class CaptureReader(object):
+    """
+    description: Decode a cv2.VideoCapture source on a background thread.
+    param:
+        source:   anything cv2.VideoCapture opens (file, device index, URL),
+                  or an already opened capture object with read()/release()
+        mode:     LOSSLESS or LATEST, see above; by default LATEST for device
+                  indices and LOSSLESS for everything else
+        capacity: frames the ring holds, defaults to 1 for LATEST and 8 for LOSSLESS
+        props:    optional {cv2.CAP_PROP_*: value} set before reading starts
+    """
+
+    def __init__(self, source, mode=None, capacity=None, props=None):
+        if mode is None:
+            mode = LATEST if isinstance(source, int) else LOSSLESS
+        if mode not in (LOSSLESS, LATEST):
+            raise ValueError("unknown capture mode {!r}".format(mode))
+        if capacity is None:
+            capacity = 1 if mode == LATEST else 8
+        self.cap = cv2.VideoCapture(source) if isinstance(source, (int, str)) else source
+        for prop, value in (props or {}).items():
+            self.cap.set(prop, value)
+        self.mode = mode
+        self.capacity = capacity
+        self.ring = deque()
+        self.lock = threading.Condition()
+        self.decoded = 0
+        self.dropped = 0
+        self.finished = False
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        index = 0
+        while not self.stopped:
+            ret, image = self.cap.read()
+            timestamp = time.time()
+            if not ret:
+                break
+            frame = Frame(index, timestamp, image)
+            index += 1
+            with self.lock:
+                if self.mode == LOSSLESS:
+                    while len(self.ring) >= self.capacity and not self.stopped:
+                        self.lock.wait()
+                elif len(self.ring) >= self.capacity:
+                    self.ring.popleft()
+                    self.dropped += 1
+                self.ring.append(frame)
+                self.decoded += 1
+                self.lock.notify_all()
+        with self.lock:
+            self.finished = True
+            self.lock.notify_all()
+
+    def read(self, timeout=None):
+        """
+        description: Next frame of the ring, waiting for the decoder if needed.
+        return:
+            a Frame, or None once the source is exhausted (or after timeout seconds)
+        """
+        with self.lock:
+            if not self.lock.wait_for(lambda: self.ring or self.finished, timeout):
+                return None
+            if not self.ring:
+                return None
+            frame = self.ring.popleft()
+            self.lock.notify_all()
+            return frame
+
+    def __iter__(self):
+        while True:
+            frame = self.read()
+            if frame is None:
+                return
+            yield frame
+
+    def isOpened(self):
+        """
+        description: True while frames can still come, like cv2.VideoCapture
+        """
+        with self.lock:
+            return bool(self.ring) or not self.finished
+
+    def release(self):
+        """
+        description: Stop decoding and release the capture.
+        """
+        with self.lock:
+            self.stopped = True
+            self.lock.notify_all()
+        self.thread.join()
+        self.cap.release()
@@ -14,14 +14,18 @@ import pycuda.driver as cuda
 import tensorrt as trt
 import cv2
 
-# Initialize the camera feed
-cap = cv2.VideoCapture(0)  # 0 corresponds to the default camera
+from capture import CaptureReader
+
+# Initialize the camera feed, decoded on its own thread keeping only the
+# newest frame
+cap = CaptureReader(0)  # 0 corresponds to the default camera
 
 def run(self):
     while True:
-        ret, frame = cap.read()  # Read a frame from the camera feed
-        if not ret:
+        captured = cap.read()  # Read a frame from the camera feed
+        if captured is None:
             break
+        frame = captured.image
 
         batch_image_raw, use_time = self.yolov5_wrapper.infer([frame])
 
@@ -9,9 +9,10 @@ import time
 import cv2
 import numpy as np
 import torch
-import pycuda.autoinit
-import pycuda.driver as cuda
-import tensorrt as trt
+
+from backend import TensorRTBackend
+from capture import CaptureReader
+from display import DisplaySink
 
 
 def get_img_path_batches(batch_size, img_dir):
@@ -41,56 +42,21 @@ class CustomYoloClass(object):
     description: A YOLOv5 class that wraps TensorRT ops, preprocess, and postprocess ops.
     """
 
-    def __init__(self, engine_file_path):
-        # Create a Context on this device,
-        self.ctx = cuda.Device(0).make_context()
-        stream = cuda.Stream()
-        TRT_LOGGER = trt.Logger(trt.Logger.INFO)
-        runtime = trt.Runtime(TRT_LOGGER)
-
-        # Deserialize the engine from file
-        with open(engine_file_path, "rb") as f:
-            engine = runtime.deserialize_cuda_engine(f.read())
-        context = engine.create_execution_context()
-
-        host_inputs = []
-        cuda_inputs = []
-        host_outputs = []
-        cuda_outputs = []
-        bindings = []
+    def __init__(self, engine_file_path=None, backend=None):
+        # Deserialize the engine and allocate its buffers, unless a backend
+        # (e.g. a ReplayBackend for CPU-only runs) is given
+        if backend is None:
+            backend = TensorRTBackend(engine_file_path)
         self.mean = (0.485, 0.456, 0.406)
         self.std = (0.229, 0.224, 0.225)
 
-        for binding in engine:
-            print('binding:', binding, engine.get_binding_shape(binding))
-            size = trt.volume(engine.get_binding_shape(
-                binding)) * engine.max_batch_size
-            dtype = trt.nptype(engine.get_binding_dtype(binding))
-            # Allocate host and device buffers
-            host_mem = cuda.pagelocked_empty(size, dtype)
-            cuda_mem = cuda.mem_alloc(host_mem.nbytes)
-            # Append the device buffer to device bindings.
-            bindings.append(int(cuda_mem))
-            # Append to the appropriate list.
-            if engine.binding_is_input(binding):
-                self.input_w = engine.get_binding_shape(binding)[-1]
-                self.input_h = engine.get_binding_shape(binding)[-2]
-                host_inputs.append(host_mem)
-                cuda_inputs.append(cuda_mem)
-            else:
-                host_outputs.append(host_mem)
-                cuda_outputs.append(cuda_mem)
-
         # Store
-        self.stream = stream
-        self.context = context
-        self.engine = engine
-        self.host_inputs = host_inputs
-        self.cuda_inputs = cuda_inputs
-        self.host_outputs = host_outputs
-        self.cuda_outputs = cuda_outputs
-        self.bindings = bindings
-        self.batch_size = engine.max_batch_size
+        self.backend = backend
+        self.host_inputs = backend.host_inputs
+        self.host_outputs = backend.host_outputs
+        self.input_h = backend.input_h
+        self.input_w = backend.input_w
+        self.batch_size = backend.batch_size
 
     def infer(self, raw_image_generator):
         """
@@ -100,17 +66,9 @@ class CustomYoloClass(object):
                 time_taken (float) - Inference time in seconds.
         """
         threading.Thread.__init__(self)
-        # Make self the active context, pushing it on top of the context stack.
-        self.ctx.push()
         # Restore
-        stream = self.stream
-        context = self.context
-        engine = self.engine
         host_inputs = self.host_inputs
-        cuda_inputs = self.cuda_inputs
         host_outputs = self.host_outputs
-        cuda_outputs = self.cuda_outputs
-        bindings = self.bindings
         # Do image preprocess
         batch_image_raw = []
         batch_input_image = np.empty(
@@ -123,19 +81,10 @@ class CustomYoloClass(object):
 
         # Copy input image to host buffer
         np.copyto(host_inputs[0], batch_input_image.ravel())
-        start = time.time()
-        # Transfer input data  to the GPU.
-        cuda.memcpy_htod_async(cuda_inputs[0], host_inputs[0], stream)
-        # Run inference.
-        context.execute_async(batch_size=self.batch_size,
-                              bindings=bindings, stream_handle=stream.handle)
-        # Transfer predictions back from the GPU.
-        cuda.memcpy_dtoh_async(host_outputs[0], cuda_outputs[0], stream)
-        # Synchronize the stream
-        stream.synchronize()
-        end = time.time()
-        # Remove any context from the top of the context stack, deactivating it.
-        self.ctx.pop()
+        # Run the engine, transfers included
+        self.backend.push()
+        use_time = self.backend.execute()
+        self.backend.pop()
         # Here we use the first row of output in that batch_size = 1
         output = host_outputs[0]
         # Do postprocess
@@ -145,11 +94,10 @@ class CustomYoloClass(object):
             cv2.putText(batch_image_raw[i], str(
                 classes_ls), (10, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 1, cv2.LINE_AA)
             print(classes_ls, predicted_conf_ls)
-        return batch_image_raw, end - start
+        return batch_image_raw, use_time
 
     def destroy(self):
-        # Remove any context from the top of the context stack, deactivating it.
-        self.ctx.pop()
+        self.backend.destroy()
 
     def get_raw_image(self, image_path_batch):
         """
@@ -227,42 +175,46 @@ class warmUpThread(threading.Thread):
             'warm_up->{}, time->{:.2f}ms'.format(batch_image_raw[0].shape, use_time * 1000))
 
 
-engine_file_path = "Cls/best.engine"
-
-yolov5_wrapper = CustomYoloClass(engine_file_path)
-
-cap = cv2.VideoCapture('videos/Input_fp_1.mp4')
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 640)
-
-try:
-    while cap.isOpened():
-        tr = time.time()
-
-        ret, frame = cap.read()
-
-        height = frame.shape[0]
-        cropped = frame[int(height / 2):]
-        cropped = cv2.resize(cropped, (640, 640))
-
-        tr2 = time.time()
-        print(f'{tr2-tr} ?')
-        if not ret:
-            break
-        # Resize the frame if needed
-        # frame = cv2.resize(frame, (640,640))
-        # Perform inference on the current frame
-        t1 = time.time()
-        result_image, use_time = yolov5_wrapper.infer([cropped])
-        t2 = time.time()
-        print(use_time)
-        print(f'{t2-t1} sec')
-        # Display or save the processed frame
-        cv2.imshow("Result", result_image[0])
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-finally:
-    cap.release()
-    cv2.destroyAllWindows()
-    yolov5_wrapper.destroy()
+if __name__ == "__main__":
+    engine_file_path = "Cls/best.engine"
+
+    yolov5_wrapper = CustomYoloClass(engine_file_path)
+
+    # Decoding runs on its own thread, see capture.py
+    cap = CaptureReader('videos/Input_fp_1.mp4',
+                        props={cv2.CAP_PROP_FRAME_WIDTH: 640, cv2.CAP_PROP_FRAME_HEIGHT: 640})
+    # The window lives on its own thread, see display.py
+    display = DisplaySink("Result")
+
+    try:
+        while cap.isOpened():
+            tr = time.time()
+
+            captured = cap.read()
+            if captured is None:
+                break
+            frame = captured.image
+
+            height = frame.shape[0]
+            cropped = frame[int(height / 2):]
+            cropped = cv2.resize(cropped, (640, 640))
+
+            tr2 = time.time()
+            print(f'{tr2-tr} ?')
+            # Resize the frame if needed
+            # frame = cv2.resize(frame, (640,640))
+            # Perform inference on the current frame
+            t1 = time.time()
+            result_image, use_time = yolov5_wrapper.infer([cropped])
+            t2 = time.time()
+            print(use_time)
+            print(f'{t2-t1} sec')
+            # Display or save the processed frame
+            display.show(result_image[0])
+            if display.quit:
+                break
+
+    finally:
+        cap.release()
+        yolov5_wrapper.destroy()
+        display.close()
@@ -209,8 +209,9 @@ class YoloTRT():
         if label:
             tf = max(tl - 1, 1)  # font thickness
             t_size = cv2.getTextSize(label, 0, fontScale=tl / 3, thickness=tf)[0]
+            c1 = (x1, y1)
             c2 = c1[0] + t_size[0], c1[1] - t_size[1] - 3
-            cv2.rectangle(img, (x1, y1), (x2, y2), color, -1)  # filled
+            cv2.rectangle(img, c1, c2, color, -1)  # filled label background
             cv2.putText(img, label, (c1[0], c1[1] - 2), 0, tl / 3, [225, 255, 255], thickness=tf, lineType=cv2.LINE_AA)
 
         return distance
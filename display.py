@@ -0,0 +1,120 @@
+"""
+Display on its own thread.
+
+cv2.imshow() and the cv2.waitKey() event poll cost milliseconds per frame, more
+while the window is moved or the X server is busy, and called inline they stall
+the inference loop every time. A DisplaySink owns the window on a background
+thread instead, all highgui calls happen there. The pipeline hands it frames
+with show(), which never waits; the sink shows the most recent frame and drops
+the ones it had no time for. Key presses come back through key() and quit, so
+the loop checks `if display.quit: break` instead of polling the GUI itself.
+
+With a render function, e.g. render.SegmentationRenderer.render, the drawing
+also happens on the display thread, and only for the frames actually shown.
+"""
+import queue
+import threading
+
+import cv2
+
+# Keys that end the pipeline by default: q and Esc
+QUIT_KEYS = (ord("q"), 27)
+
+
+class DisplaySink(object):
+    """
+    description: Show frames in an OpenCV window from a background thread.
+    param:
+        window:    window name
+        render:    optional function(image, result) returning the frame to show,
+                   called on the display thread
+        quit_keys: key codes that set quit
+        poll:      seconds between GUI event polls while no frame comes
+    """
+
+    def __init__(self, window, render=None, quit_keys=QUIT_KEYS, poll=0.01):
+        self.window = window
+        self.render = render
+        self.quit_keys = quit_keys
+        self.poll = poll
+        self.lock = threading.Condition()
+        self.latest = None
+        self.shown = 0
+        self.dropped = 0
+        self.error = None
+        self.pressed = queue.Queue()
+        self.quit_event = threading.Event()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def show(self, image, result=None):
+        """
+        description: Hand a frame to the display without waiting. A frame that
+                     was not shown yet is replaced, i.e. dropped.
+        param:
+            image:  the frame; it must not change until it is shown or
+                    replaced, hand over a copy of buffers that get reused
+            result: passed to render with the frame
+        """
+        with self.lock:
+            if self.latest is not None:
+                self.dropped += 1
+            self.latest = (image, result)
+            self.lock.notify_all()
+
+    @property
+    def quit(self):
+        """
+        description: True once a quit key was pressed in the window
+        """
+        return self.quit_event.is_set()
+
+    def key(self):
+        """
+        description: The oldest key pressed in the window and not read yet, or None
+        """
+        try:
+            return self.pressed.get_nowait()
+        except queue.Empty:
+            return None
+
+    def run(self):
+        try:
+            while True:
+                with self.lock:
+                    self.lock.wait_for(lambda: self.latest is not None or self.stopped, self.poll)
+                    if self.stopped:
+                        break
+                    item = self.latest
+                    self.latest = None
+                if item is not None:
+                    image, result = item
+                    if self.render is not None:
+                        image = self.render(image, result)
+                    cv2.imshow(self.window, image)
+                    self.shown += 1
+                key = cv2.waitKey(1) & 0xFF
+                if key != 0xFF:
+                    self.pressed.put(key)
+                    if key in self.quit_keys:
+                        self.quit_event.set()
+        except Exception as e:
+            # Stop the pipeline rather than leave it running without a display;
+            # close() raises the error on the pipeline's thread
+            self.error = e
+            self.quit_event.set()
+        finally:
+            if self.shown:
+                cv2.destroyWindow(self.window)
+
+    def close(self):
+        """
+        description: Stop the display thread and close the window.
+        """
+        with self.lock:
+            self.stopped = True
+            self.lock.notify_all()
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
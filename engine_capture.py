@@ -0,0 +1,225 @@
+"""
+Recorded engine outputs, for postprocessing benchmarks without the engine.
+
+A CaptureWriter handed to YoLov5TRT or YoloTRT (recorder=...) appends the host
+output buffers of every frame, plus the frame size the postprocessing needs,
+to a capture file. The file is a JSON header and then fixed-size records, so
+an EngineCapture maps it with np.memmap and hands out views of any frame
+without reading the rest; a capture of a long street drive costs no memory.
+
+The replay driver feeds the recorded frames to the same postprocessing code
+(post_process, nms, process_mask, the overlaps) at full speed, on any CPU
+machine, and prints the per-stage throughput and latency:
+
+    python segmentation_final.py --record=street.cap     (on the Jetson)
+    python engine_capture.py street.cap --repeat 3 --profile after.json
+
+A segmentation record holds the whole proto output (32x160x160 float32, about
+3.4 MB per frame at 640x640); record a few hundred frames, not an hour.
+"""
+import argparse
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+from backend import Binding
+from profiler import Profiler
+
+CAPTURE_MAGIC = b"YOLOCAP1"
+# The records start at a multiple of this, so the mapping is page aligned
+HEADER_ALIGN = 4096
+
+
+def record_dtype(outputs):
+    """
+    description: The record of one frame: its size and one field per output
+                 binding, in the binding's per-image shape.
+    param:
+        outputs: output bindings
+    """
+    fields = [("origin_h", "<i4"), ("origin_w", "<i4")]
+    fields += [(binding.name, np.dtype(binding.dtype), tuple(binding.shape)) for binding in outputs]
+    return np.dtype(fields)
+
+
+class CaptureWriter(object):
+    """
+    description: Appends the engine outputs of frames to a capture file.
+    param:
+        path:       capture file, overwritten
+        bindings:   the engine bindings, e.g. backend.binding_list
+        max_frames: stop recording after this many frames, None for no limit
+    """
+
+    def __init__(self, path, bindings, max_frames=None):
+        inputs = [binding for binding in bindings if binding.is_input]
+        self.outputs = [binding for binding in bindings if not binding.is_input]
+        self.max_frames = max_frames
+        self.frames = 0
+        self.record = np.zeros(1, dtype=record_dtype(self.outputs))
+        header = json.dumps({
+            "inputs": [[b.name, list(b.shape), np.dtype(b.dtype).str] for b in inputs],
+            "outputs": [[b.name, list(b.shape), np.dtype(b.dtype).str] for b in self.outputs],
+        }).encode()
+        start = len(CAPTURE_MAGIC) + 8 + len(header)
+        self.file = open(path, "wb")
+        self.file.write(CAPTURE_MAGIC + struct.pack("<Q", len(header)) + header)
+        self.file.write(b"\0" * (-start % HEADER_ALIGN))
+
+    def write(self, outputs, origin_h, origin_w):
+        """
+        description: Append one frame.
+        param:
+            outputs:  the frame's part of every output buffer, in binding order,
+                      e.g. the views of YoLov5TRT.output_views()
+            origin_h, origin_w: size of the frame
+        """
+        if self.file is None or (self.max_frames is not None and self.frames >= self.max_frames):
+            return
+        record = self.record[0]
+        record["origin_h"] = origin_h
+        record["origin_w"] = origin_w
+        for binding, output in zip(self.outputs, outputs):
+            record[binding.name] = np.reshape(output, binding.shape)
+        self.record.tofile(self.file)
+        self.frames += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class EngineCapture(object):
+    """
+    description: A capture file, memory-mapped read-only. A record cut short
+                 at the end (a recording that was killed) is left out.
+    param:
+        path: capture file written by a CaptureWriter
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+                raise ValueError("{} is not an engine capture".format(path))
+            length, = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(length).decode())
+        self.inputs = [Binding(name, tuple(shape), np.dtype(dtype), True) for name, shape, dtype in header["inputs"]]
+        self.outputs = [Binding(name, tuple(shape), np.dtype(dtype), False) for name, shape, dtype in header["outputs"]]
+        self.dtype = record_dtype(self.outputs)
+        start = len(CAPTURE_MAGIC) + 8 + length
+        offset = start + (-start % HEADER_ALIGN)
+        count = max(os.path.getsize(path) - offset, 0) // self.dtype.itemsize
+        self.records = np.memmap(path, dtype=self.dtype, mode="r", offset=offset, shape=(count,)) if count else \
+            np.zeros(0, dtype=self.dtype)
+
+    @property
+    def bindings(self):
+        """
+        description: The engine bindings, for a ReplayBackend of the same shape
+        """
+        return self.inputs + self.outputs
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        """
+        return:
+            outputs:  read-only views of the frame's outputs, in binding order
+            origin_h, origin_w: size of the frame
+        """
+        record = self.records[index]
+        return [record[binding.name] for binding in self.outputs], int(record["origin_h"]), int(record["origin_w"])
+
+    def __iter__(self):
+        for index in range(len(self.records)):
+            yield self[index]
+
+    def replay(self):
+        """
+        description: The outputs argument of a ReplayBackend running the
+                     recorded frames in a loop, every image of a batch
+                     getting the next frame.
+        """
+        def outputs(backend):
+            batch = []
+            for i in range(backend.batch_size):
+                frame, _, _ = self[(backend.calls * backend.batch_size + i) % len(self)]
+                batch.append(frame)
+            return [np.concatenate([np.ravel(frame[k]) for frame in batch]) for k in range(len(self.outputs))]
+        return outputs
+
+
+def postprocessor(capture, profiler, conf=0.5):
+    """
+    description: The postprocessing of the wrapper the capture was recorded
+                 with, on a ReplayBackend of the same binding shapes.
+    return:
+        the wrapper, and a function(outputs, origin_h, origin_w) running it on one frame
+    """
+    from backend import ReplayBackend
+    backend = ReplayBackend(capture.bindings)
+    if len(capture.outputs) == 2:
+        from segmentation_final import YoLov5TRT
+        wrapper = YoLov5TRT(backend=backend, profiler=profiler)
+
+        def run(outputs, origin_h, origin_w):
+            return wrapper.postprocess_image(np.ravel(outputs[0]), outputs[1], None, origin_h, origin_w, draw=False)
+        return wrapper, run
+    from yoloDet import YoloTRT
+    wrapper = YoloTRT(library=None, engine=None, conf=conf, yolo_ver="v5", backend=backend, profiler=profiler)
+
+    def run(outputs, origin_h, origin_w):
+        with profiler.stage("post_process"):
+            return wrapper.PostProcess(np.ravel(outputs[0])[:wrapper.LEN_ALL_RESULT], origin_h, origin_w)
+    return wrapper, run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a capture file through the postprocessing")
+    parser.add_argument("capture", help="file written with --record / CaptureWriter")
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the capture")
+    parser.add_argument("--warmup", type=int, default=5, help="frames run before timing")
+    parser.add_argument("--conf", type=float, default=0.5, help="confidence threshold (detection only)")
+    parser.add_argument("--profile", default=None, metavar="PATH", help="also write the stage timings as JSON")
+    args = parser.parse_args()
+
+    capture = EngineCapture(args.capture)
+    if not len(capture):
+        parser.error("{} holds no frames".format(args.capture))
+    profiler = Profiler()
+    wrapper, run = postprocessor(capture, profiler, args.conf)
+    for index in range(min(args.warmup, len(capture))):
+        run(*capture[index])
+    profiler.reset()
+
+    frames = 0
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for outputs, origin_h, origin_w in capture:
+            with profiler.stage("frame"):
+                run(outputs, origin_h, origin_w)
+            frames += 1
+    elapsed = time.perf_counter() - start
+    wrapper.destroy()
+
+    print("{} frames of {}, {} outputs, {:.1f} frames/s".format(
+        frames, args.capture, len(capture.outputs), frames / elapsed))
+    print(profiler.report())
+    if args.profile:
+        profiler.dump(args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Frames from a capture process through shared memory.
+
+Threads share the GIL with the NumPy postprocessing, so on a small board the
+capture thread of capture.py and the mask code slow each other down. Here a
+separate process decodes straight into the slots of a multiprocessing
+shared_memory ring (cv2 decodes into the slot, there is no extra copy) and the
+inference process reads NumPy views of those slots. Nothing is pickled and
+nothing is allocated per frame.
+
+Slots are handed out by sequence number. The writer publishes a slot by
+storing its sequence number after the pixels; in LOSSLESS mode it does not
+reuse a slot before the reader release()d it. In LATEST mode it never waits,
+and a reader can check with valid() that the slot was not overwritten while
+it used the view.
+
+NumPy stores to shared memory carry no memory barrier. x86 keeps stores in
+order, but the ARM cores of the Jetson do not: the reader could see a slot's
+sequence number before the pixels written ahead of it. The ring created by a
+process therefore has a fence, a multiprocessing lock that both sides take
+around their header accesses (publish/read, release/reserve); taking and
+giving back the lock orders the pixel stores before the sequence number for
+the other side. A ring attached by name has no lock to share and no fence,
+and valid() in LATEST mode stays best effort either way.
+"""
+import contextlib
+import multiprocessing
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from capture import LATEST, LOSSLESS
+
+# One frame in the ring: its sequence number, its index in the stream, capture
+# time (time.time()) and a view of the slot's pixels
+RingFrame = namedtuple("RingFrame", ["seq", "index", "timestamp", "image"])
+
+# Fields of the header
+HEAD, TAIL, FINISHED, STOP, STALLED = range(5)
+HEADER_FIELDS = 5
+
+# Sleep between polls of the ring, far below a frame interval
+POLL_INTERVAL = 0.0005
+# Default seconds a CaptureProcess side waits for the other, see CaptureProcess
+STALL_TIMEOUT = 30.0
+
+
+class SharedFrameRing(object):
+    """
+    description: Ring of fixed-size uint8 frames in one shared memory block.
+    param:
+        shape: (h, w, 3) of the frames
+        slots: number of frames the ring holds
+        name:  None to create a new block, or the name of one to attach to
+    """
+
+    def __init__(self, shape, slots=8, name=None):
+        self.shape = tuple(shape)
+        self.slots = slots
+        frame_size = int(np.prod(self.shape))
+        header_size = 8 * (HEADER_FIELDS + 3 * slots)
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=header_size + frame_size * slots)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        buf = self.shm.buf
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buf)
+        self.slot_seq = np.ndarray((slots,), dtype=np.int64, buffer=buf, offset=8 * HEADER_FIELDS)
+        self.slot_index = np.ndarray((slots,), dtype=np.int64, buffer=buf, offset=8 * (HEADER_FIELDS + slots))
+        self.slot_time = np.ndarray((slots,), dtype=np.float64, buffer=buf, offset=8 * (HEADER_FIELDS + 2 * slots))
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=buf, offset=header_size)
+        if self.owner:
+            self.header[:] = 0
+            self.slot_seq[:] = -1
+        # Memory fence between the payload and the header, comes over fork
+        # with the ring; see the module docstring
+        self.fence = multiprocessing.Lock() if self.owner else contextlib.nullcontext()
+        self.next_seq = 0
+
+    # Writer side
+
+    def reserve(self, lossless=True, timeout=None):
+        """
+        description: The next slot to write, waiting for the reader to release
+                     it in lossless mode.
+        param:
+            timeout: seconds to wait for a free slot, None for no limit; on
+                     timeout the ring is marked stalled and TimeoutError raised
+        return:
+            (seq, view of the slot), or None once the reader asked to stop
+        """
+        seq = int(self.header[HEAD])
+        deadline = None if timeout is None else time.time() + timeout
+        while lossless and seq - self.tail() >= self.slots:
+            if self.header[STOP]:
+                return None
+            if deadline is not None and time.time() > deadline:
+                self.header[STALLED] = 1
+                raise TimeoutError("no slot released for {} s, the reader holds all {} slots".format(
+                    timeout, self.slots))
+            time.sleep(POLL_INTERVAL)
+        if self.header[STOP]:
+            return None
+        slot = seq % self.slots
+        # Readers must not take the slot while its pixels change
+        self.slot_seq[slot] = -1
+        return seq, self.frames[slot]
+
+    def publish(self, seq, index, timestamp):
+        """
+        description: Make a written slot visible to the reader.
+        """
+        slot = seq % self.slots
+        with self.fence:
+            self.slot_index[slot] = index
+            self.slot_time[slot] = timestamp
+            self.slot_seq[slot] = seq
+            self.header[HEAD] = seq + 1
+
+    def tail(self):
+        """
+        description: Sequence number of the first slot the reader still holds
+        """
+        with self.fence:
+            return int(self.header[TAIL])
+
+    def finish(self):
+        """
+        description: Tell the reader that no more frames come.
+        """
+        with self.fence:
+            self.header[FINISHED] = 1
+
+    # Reader side
+
+    def read(self, latest=False, timeout=None):
+        """
+        description: Wait for the next frame.
+        param:
+            latest:  skip to the newest published frame instead of the next one
+            timeout: seconds to wait, None to wait until a frame or the end
+        return:
+            a RingFrame whose image is a view into the ring, or None at the
+            end of the stream (or after timeout). Raises TimeoutError if the
+            writer gave up waiting for a free slot, see reserve().
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self.fence:
+                finished, stalled = self.header[FINISHED], self.header[STALLED]
+                head = int(self.header[HEAD])
+                seq = head - 1 if latest else self.next_seq
+                slot = seq % self.slots
+                published = head > self.next_seq and self.slot_seq[slot] == seq
+                if published:
+                    frame = RingFrame(seq, int(self.slot_index[slot]), float(self.slot_time[slot]), self.frames[slot])
+            if published:
+                self.next_seq = seq + 1
+                return frame
+            if head > self.next_seq:
+                if not latest:
+                    # Overwritten, only possible when the writer does not wait
+                    self.next_seq = head - 1
+                continue
+            if finished:
+                if stalled:
+                    raise TimeoutError("the writer stalled, all {} slots were held".format(self.slots))
+                return None
+            if deadline is not None and time.time() > deadline:
+                return None
+            time.sleep(POLL_INTERVAL)
+
+    def release(self, frame):
+        """
+        description: Hand a frame's slot (and all before it) back to the writer.
+                     Frames have to be released in order.
+        """
+        with self.fence:
+            self.header[TAIL] = frame.seq + 1
+
+    def valid(self, frame):
+        """
+        description: False if the writer has reused the frame's slot since
+                     read() returned it (LATEST mode only).
+        """
+        return self.slot_seq[frame.seq % self.slots] == frame.seq
+
+    def stop(self):
+        """
+        description: Ask the writer to stop.
+        """
+        self.header[STOP] = 1
+
+    def close(self):
+        # The views have to go before the block can be closed
+        self.header = self.slot_seq = self.slot_index = self.slot_time = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Frames still referenced by the caller, the mapping goes with them
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+def capture_main(source, ring, mode, props, stall_timeout=None):
+    """
+    description: Body of the capture process: decode source into the ring.
+                 The ring comes over fork, it is the same shared mapping.
+    """
+    cap = cv2.VideoCapture(source)
+    for prop, value in (props or {}).items():
+        cap.set(prop, value)
+    index = 0
+    try:
+        while True:
+            reserved = ring.reserve(lossless=mode == LOSSLESS, timeout=stall_timeout)
+            if reserved is None:
+                break
+            seq, view = reserved
+            # Decode straight into the slot
+            ret, image = cap.read(view)
+            timestamp = time.time()
+            if not ret or image.shape != view.shape:
+                # End of the stream, or it changed its size and the ring can not follow
+                break
+            if image is not view and not np.shares_memory(image, view):
+                # The backend did not decode into the slot (some do not take
+                # the output array), the pixels are only in image
+                view[...] = image
+            ring.publish(seq, index, timestamp)
+            index += 1
+    finally:
+        ring.finish()
+        cap.release()
+
+
+class CaptureProcess(object):
+    """
+    description: Decode a video source in a separate process and read its
+                 frames from a SharedFrameRing.
+    param:
+        source: anything cv2.VideoCapture opens (file, device index, URL)
+        mode:   LOSSLESS (default for files) or LATEST (default for devices),
+                as in capture.CaptureReader
+        slots:  frames in the ring; in LOSSLESS mode that bounds how many
+                frames the consumer can hold before release()
+        props:  optional {cv2.CAP_PROP_*: value} for the capture
+        stall_timeout: seconds either side waits for the other before giving
+                       up with TimeoutError, None to wait forever. A consumer
+                       holding all slots unreleased otherwise hangs both.
+    """
+
+    def __init__(self, source, mode=None, slots=8, props=None, stall_timeout=STALL_TIMEOUT):
+        if mode is None:
+            mode = LATEST if isinstance(source, int) else LOSSLESS
+        # Probe the frame size, the ring is sized once for the whole stream
+        probe = cv2.VideoCapture(source)
+        for prop, value in (props or {}).items():
+            probe.set(prop, value)
+        ret, image = probe.read()
+        probe.release()
+        if not ret:
+            raise IOError("can not read from {!r}".format(source))
+        self.mode = mode
+        self.stall_timeout = stall_timeout
+        self.ring = SharedFrameRing(image.shape, slots)
+        # fork: the child only decodes and never touches CUDA, and unlike
+        # spawn it does not re-import the calling script (and its engine)
+        context = multiprocessing.get_context("fork")
+        self.process = context.Process(target=capture_main, daemon=True,
+                                       args=(source, self.ring, mode, props, stall_timeout))
+        self.process.start()
+
+    def read(self, timeout=None):
+        """
+        description: Next frame, see SharedFrameRing.read(); in LOSSLESS mode
+                     release() it once its pixels are no longer needed.
+        """
+        return self.ring.read(latest=self.mode == LATEST, timeout=timeout)
+
+    def release(self, frame=None):
+        """
+        description: With a frame, hand its slot back to the capture process.
+                     Without one, stop the capture process and free the ring.
+        """
+        if frame is not None:
+            self.ring.release(frame)
+            return
+        self.ring.stop()
+        self.process.join()
+        self.ring.close()
+
+    def __iter__(self):
+        while True:
+            frame = self.read(self.stall_timeout)
+            if frame is None:
+                if not self.ring.header[FINISHED]:
+                    raise TimeoutError("no frame from the capture process for {} s".format(self.stall_timeout))
+                return
+            yield frame
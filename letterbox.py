@@ -0,0 +1,126 @@
+"""
+Letterbox geometry and fused letterbox preprocessing for the yolov5 engines.
+
+The frame is resized straight into a cached, already padded uint8 canvas and the
+canvas is written as normalized RGB CHW float32 into the caller's buffer, usually
+the slot of the pinned host input buffer for one batch index. Apart from the
+canvas, which is allocated once, no full-frame array is created per frame.
+"""
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+
+class LetterboxGeometry(object):
+    """
+    description: Scale and padding that map a src_h x src_w frame into an
+                 input_h x input_w network input, keeping the aspect ratio.
+    attributes:
+        scale:        network pixels per source pixel
+        tw, th:       size of the resized frame inside the network input
+        tx, ty:       integer offset of the resized frame (preprocessing, mask crop)
+        pad_x, pad_y: exact padding used to map boxes back to the source
+        forward:      2x3 affine, source -> network input
+        inverse:      2x3 affine, network input -> source
+    """
+
+    def __init__(self, src_h, src_w, input_h, input_w):
+        self.src_h = src_h
+        self.src_w = src_w
+        self.input_h = input_h
+        self.input_w = input_w
+        r_w = input_w / src_w
+        r_h = input_h / src_h
+        if r_h > r_w:
+            self.scale = r_w
+            self.tw = input_w
+            self.th = int(r_w * src_h)
+            self.tx = 0
+            self.ty = int((input_h - self.th) / 2)
+            self.pad_x = 0.0
+            self.pad_y = (input_h - r_w * src_h) / 2
+        else:
+            self.scale = r_h
+            self.tw = int(r_h * src_w)
+            self.th = input_h
+            self.tx = int((input_w - self.tw) / 2)
+            self.ty = 0
+            self.pad_x = (input_w - r_h * src_w) / 2
+            self.pad_y = 0.0
+        self.forward = np.array([[self.scale, 0, self.pad_x],
+                                 [0, self.scale, self.pad_y]])
+        self.inverse = np.array([[1 / self.scale, 0, -self.pad_x / self.scale],
+                                 [0, 1 / self.scale, -self.pad_y / self.scale]])
+
+    def boxes_to_source(self, x):
+        """
+        description: Convert nx4 letterboxed boxes from [center_x, center_y, w, h]
+                     to source frame [x1, y1, x2, y2]
+        """
+        y = np.empty_like(x)
+        y[:, 0] = x[:, 0] - x[:, 2] / 2
+        y[:, 2] = x[:, 0] + x[:, 2] / 2
+        y[:, 1] = x[:, 1] - x[:, 3] / 2
+        y[:, 3] = x[:, 1] + x[:, 3] / 2
+        y[:, 0::2] -= self.pad_x
+        y[:, 1::2] -= self.pad_y
+        y /= self.scale
+        return y
+
+    def unpad(self, image):
+        """
+        description: View of the part of a network-input sized image that
+                     holds the frame, i.e. without the letterbox padding
+        """
+        return image[self.ty:self.ty + self.th, self.tx:self.tx + self.tw]
+
+
+@lru_cache(maxsize=32)
+def letterbox_geometry(src_h, src_w, input_h, input_w):
+    """
+    description: Cached LetterboxGeometry, a video stream computes it once.
+    """
+    return LetterboxGeometry(src_h, src_w, input_h, input_w)
+
+
+class Letterbox(object):
+    """
+    description: Resize with the long side kept, pad the short side with
+                 (128,128,128), convert BGR to RGB, normalize to [0,1] and
+                 transform to CHW, writing into a given float32 buffer.
+    param:
+        input_h: network input height
+        input_w: network input width
+    """
+
+    def __init__(self, input_h, input_w, pad_value=128):
+        self.input_h = input_h
+        self.input_w = input_w
+        self.pad_value = pad_value
+        self.canvas = np.full((input_h, input_w, 3), pad_value, dtype=np.uint8)
+        self.canvas_geometry = None
+
+    def __call__(self, raw_bgr_image, out):
+        """
+        description: Preprocess one frame into out.
+        param:
+            raw_bgr_image: HxWx3 uint8 BGR frame
+            out:           (3, input_h, input_w) float32 array, e.g. a view
+                           into the host input buffer
+        return:
+            h: original height
+            w: original width
+        """
+        h, w = raw_bgr_image.shape[:2]
+        geometry = letterbox_geometry(h, w, self.input_h, self.input_w)
+        # The padding only has to be repainted when the resolution changes
+        if self.canvas_geometry is not geometry:
+            self.canvas[:] = self.pad_value
+            self.canvas_geometry = geometry
+        # Resize the image with long side while maintaining ratio, in place
+        cv2.resize(raw_bgr_image, (geometry.tw, geometry.th), dst=geometry.unpad(self.canvas))
+        # BGR to RGB, HWC to CHW and normalize to [0,1] in one pass per channel
+        for c in range(3):
+            np.divide(self.canvas[:, :, 2 - c], 255.0, out=out[c], dtype=np.float32)
+        return h, w
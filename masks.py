@@ -0,0 +1,330 @@
+"""
+Instance mask decoding for the yolov5 segmentation engine.
+
+The dense way (sigmoid over the whole proto per instance, resize to the network
+input, un-pad, resize to the frame, threshold, crop to the box) touches
+n x (160*160 + 640*640 + H*W) pixels. Here only the box footprint is evaluated,
+at proto resolution, and the logits of that footprint are mapped onto the box in
+the frame with a single bilinear warp that composes both resizes. sigmoid(x) >= 0.5
+is the same as x >= 0, so no sigmoid is computed at all.
+
+The decoded masks stay box-sized (InstanceMasks): ten instances on a 1080p frame
+are a few MB of bool crops instead of 160 MB of float64 planes.
+"""
+import cv2
+import numpy as np
+
+
+def proto_mapping(geometry, mh, mw):
+    """
+    description: Affine map from frame pixel to proto pixel, the composition of
+                 resizing the proto to the network input and resizing the
+                 un-padded part of that to the frame (cv2.resize pixel centers).
+    param:
+        geometry: LetterboxGeometry of the frame
+        mh, mw:   proto height and width
+    return:
+        sx, bx, sy, by: proto_x = sx * x + bx, proto_y = sy * y + by
+    """
+    kx = mw / geometry.input_w
+    ky = mh / geometry.input_h
+    sx = geometry.tw / geometry.src_w * kx
+    sy = geometry.th / geometry.src_h * ky
+    bx = (geometry.tx + 0.5 * geometry.tw / geometry.src_w) * kx - 0.5
+    by = (geometry.ty + 0.5 * geometry.th / geometry.src_h) * ky - 0.5
+    return sx, bx, sy, by
+
+
+def box_window(box, mapping, mh, mw):
+    """
+    description: Integer box in frame pixels and the proto window its pixels
+                 read, i.e. the box footprint plus the bilinear neighbours.
+    return:
+        (x1, y1, x2, y2), (px1, py1, px2, py2) with the window bounds inclusive,
+        None for the window of an empty box
+    """
+    sx, bx, sy, by = mapping
+    x1, y1, x2, y2 = int(box[0]), int(box[1]), int(box[2]), int(box[3])
+    if x2 <= x1 or y2 <= y1:
+        return (x1, y1, x2, y2), None
+    px1 = min(max(int(np.floor(sx * x1 + bx)), 0), mw - 1)
+    px2 = min(max(int(np.ceil(sx * (x2 - 1) + bx)), 0), mw - 1)
+    py1 = min(max(int(np.floor(sy * y1 + by)), 0), mh - 1)
+    py2 = min(max(int(np.ceil(sy * (y2 - 1) + by)), 0), mh - 1)
+    return (x1, y1, x2, y2), (px1, py1, px2, py2)
+
+
+def window_to_box(logits, box, window, mapping):
+    """
+    description: Map the logits of a proto window onto the box pixels with one
+                 bilinear warp and threshold them.
+    return:
+        crop: bool array of the box size
+    """
+    sx, bx, sy, by = mapping
+    x1, y1, x2, y2 = box
+    if window is None:
+        return np.zeros((max(y2 - y1, 0), max(x2 - x1, 0)), dtype=bool)
+    px1, py1 = window[:2]
+    # Box pixel -> window pixel; replicating the border is what cv2.resize
+    # does at the proto edge, inside the proto the window already covers it
+    M = np.float32([[sx, 0, sx * x1 + bx - px1],
+                    [0, sy, sy * y1 + by - py1]])
+    logits = cv2.warpAffine(logits, M, (x2 - x1, y2 - y1),
+                            flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                            borderMode=cv2.BORDER_REPLICATE)
+    return logits >= 0
+
+
+def decode_box_masks(proto, coefs, boxes, geometry):
+    """
+    description: Decode the masks of n instances inside their boxes only.
+    param:
+        proto:    prototype masks, (c, mh, mw) float32
+        coefs:    prototype mask coefficients, (n, c)
+        boxes:    (n, 4) boxes [x1, y1, x2, y2] in frame pixels
+        geometry: LetterboxGeometry of the frame
+    return:
+        a list of (x1, y1, crop) with crop a bool array of the box size
+    """
+    c, mh, mw = proto.shape
+    mapping = proto_mapping(geometry, mh, mw)
+    coefs = np.asarray(coefs, dtype=np.float32)
+    results = []
+    for coef, box in zip(coefs, boxes):
+        box, window = box_window(box, mapping, mh, mw)
+        logits = None
+        if window is not None:
+            px1, py1, px2, py2 = window
+            proto_window = proto[:, py1:py2 + 1, px1:px2 + 1]
+            logits = (coef @ proto_window.reshape(c, -1)).reshape(proto_window.shape[1:])
+        results.append((box[0], box[1], window_to_box(logits, box, window, mapping)))
+    return results
+
+
+def resized_span(start, size, n, src_n):
+    """
+    description: The pixels of a resized axis whose centers fall into the
+                 source pixels [start, start + size). Resized pixel u takes
+                 source pixel floor((u + 0.5) * src_n / n), in integers so
+                 every span of a frame uses exactly the same mapping.
+    param:
+        n:     resized axis length
+        src_n: source axis length
+    return:
+        first resized pixel, source pixel of every resized pixel relative to start
+    """
+    u = np.arange(max(start * n // src_n - 1, 0), min(-(-(start + size) * n // src_n) + 1, n))
+    src = np.minimum((2 * u + 1) * src_n // (2 * n), src_n - 1)
+    inside = (src >= start) & (src < start + size)
+    if not inside.any():
+        return min(start * n // src_n, n), src[:0]
+    return int(u[inside][0]), src[inside] - start
+
+
+class InstanceMasks(object):
+    """
+    description: Compact result of process_mask: every instance is a bool crop of
+                 its box plus the box offset, inside an ih x iw frame. A full-frame
+                 plane is only made on request (dense(), to_dense(), np.asarray()).
+    param:
+        items: a list of (x1, y1, crop) as returned by decode_box_masks()
+        shape: (ih, iw) of the frame
+    """
+
+    def __init__(self, items, shape):
+        self.items = list(items)
+        self.frame_shape = tuple(shape)
+
+    @classmethod
+    def from_dense(cls, planes, boxes):
+        """
+        description: Keep only the box crops of (n, ih, iw) planes that are zero
+                     outside their boxes, e.g. the masks of a dense process_mask
+        """
+        planes = np.asarray(planes)
+        ih, iw = planes.shape[1:]
+        items = []
+        for plane, box in zip(planes, boxes):
+            x1 = min(max(int(box[0]), 0), iw)
+            y1 = min(max(int(box[1]), 0), ih)
+            x2 = min(max(int(box[2]), x1), iw)
+            y2 = min(max(int(box[3]), y1), ih)
+            items.append((x1, y1, plane[y1:y2, x1:x2] != 0))
+        return cls(items, (ih, iw))
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def shape(self):
+        return (len(self.items),) + self.frame_shape
+
+    def __array__(self, dtype=None, copy=None):
+        return self.to_dense(dtype or np.uint8)
+
+    def select(self, keep):
+        """
+        description: The instances picked by a bool array or a list of indices
+        """
+        keep = np.asarray(keep)
+        if keep.dtype == bool:
+            keep = np.flatnonzero(keep)
+        return InstanceMasks([self.items[i] for i in keep], self.frame_shape)
+
+    def paint(self, i, plane, value=1):
+        """
+        description: Set the pixels of instance i in an ih x iw plane to value
+        """
+        x1, y1, crop = self.items[i]
+        h, w = crop.shape
+        plane[y1:y1 + h, x1:x1 + w][crop] = value
+        return plane
+
+    def dense(self, i, dtype=np.uint8):
+        """
+        description: Full-frame 0/1 plane of instance i
+        """
+        return self.paint(i, np.zeros(self.frame_shape, dtype=dtype))
+
+    def to_dense(self, dtype=np.uint8):
+        """
+        description: The old (n, ih, iw) representation
+        """
+        planes = np.zeros(self.shape, dtype=dtype)
+        for i in range(len(self.items)):
+            self.paint(i, planes[i])
+        return planes
+
+    def union(self, out=None):
+        """
+        description: 0/1 uint8 plane of the pixels covered by any instance
+        param:
+            out: optional ih x iw uint8 plane to reuse, it is cleared first
+        """
+        if out is None:
+            out = np.zeros(self.frame_shape, dtype=np.uint8)
+        else:
+            out[:] = 0
+        for i in range(len(self.items)):
+            self.paint(i, out)
+        return out
+
+    def class_unions(self, classes, num_classes):
+        """
+        description: Per-class union of the instances, the same planes as
+                     class_unions() makes from the proto coefficients, without
+                     decoding the masks a second time
+        param:
+            classes:     (n,) class id of every instance
+            num_classes: number of classes of the model
+        return:
+            unions: (num_classes, ih, iw) bool
+        """
+        unions = np.zeros((num_classes,) + self.frame_shape, dtype=bool)
+        for (x1, y1, crop), k in zip(self.items, classes):
+            h, w = crop.shape
+            plane = unions[int(k), y1:y1 + h, x1:x1 + w]
+            np.logical_or(plane, crop, out=plane)
+        return unions
+
+    def count_nonzero(self, i, roi=None):
+        """
+        description: Number of pixels of instance i, only those inside roi
+                     (a non-zero-means-inside ih x iw plane) if given
+        """
+        x1, y1, crop = self.items[i]
+        if roi is None:
+            return int(np.count_nonzero(crop))
+        h, w = crop.shape
+        return int(np.count_nonzero(crop & (roi[y1:y1 + h, x1:x1 + w] != 0)))
+
+    def resized(self, shape):
+        """
+        description: The same instances in a frame resized to shape (h, w),
+                     e.g. for drawing on a smaller copy of the frame, without
+                     ever making the dense masks. Pixel centers are mapped on
+                     the grid of the whole frame: resized pixel (v, u) takes
+                     source pixel (floor((v + 0.5) * ih / h),
+                     floor((u + 0.5) * iw / w)). That is not cv2.INTER_NEAREST,
+                     which takes floor(u * iw / w) and so differs on some
+                     pixels of every mask edge.
+        """
+        nh, nw = shape
+        ih, iw = self.frame_shape
+        items = []
+        for x1, y1, crop in self.items:
+            h, w = crop.shape
+            nx1, cols = resized_span(x1, w, nw, iw)
+            ny1, rows = resized_span(y1, h, nh, ih)
+            items.append((nx1, ny1, crop[np.ix_(rows, cols)]))
+        return InstanceMasks(items, shape)
+
+    def region(self):
+        """
+        description: Bounding rectangle (x1, y1, x2, y2) of all instances
+        """
+        if not self.items:
+            return 0, 0, 0, 0
+        x1 = min(x for x, _, _ in self.items)
+        y1 = min(y for _, y, _ in self.items)
+        x2 = max(x + crop.shape[1] for x, _, crop in self.items)
+        y2 = max(y + crop.shape[0] for _, y, crop in self.items)
+        return x1, y1, x2, y2
+
+
+# Label of pixels no class covers in class_label_map()
+BACKGROUND = 255
+
+
+def class_unions(proto, coefs, boxes, classes, geometry, num_classes):
+    """
+    description: Per-class union of the instance masks, straight from the proto
+                 coefficients: one matmul gives the logits of every instance,
+                 then each instance's box is warped and OR-ed into the plane of
+                 its class. No instance ever becomes a full-frame plane. Gives
+                 the same pixels as OR-ing the process_mask masks of a class.
+    param:
+        proto:       prototype masks, (c, mh, mw) float32
+        coefs:       prototype mask coefficients, (n, c)
+        boxes:       (n, 4) boxes [x1, y1, x2, y2] in frame pixels
+        classes:     (n,) class ids
+        geometry:    LetterboxGeometry of the frame
+        num_classes: number of classes of the model
+    return:
+        unions: (num_classes, ih, iw) bool
+    """
+    c, mh, mw = proto.shape
+    unions = np.zeros((num_classes, geometry.src_h, geometry.src_w), dtype=bool)
+    if len(coefs) == 0:
+        return unions
+    mapping = proto_mapping(geometry, mh, mw)
+    logits = (np.asarray(coefs, dtype=np.float32) @ proto.reshape(c, -1)).reshape(-1, mh, mw)
+    for logit, box, k in zip(logits, boxes, classes):
+        box, window = box_window(box, mapping, mh, mw)
+        if window is None:
+            continue
+        px1, py1, px2, py2 = window
+        crop = window_to_box(logit[py1:py2 + 1, px1:px2 + 1], box, window, mapping)
+        x1, y1, x2, y2 = box
+        np.logical_or(unions[int(k), y1:y2, x1:x2], crop, out=unions[int(k), y1:y2, x1:x2])
+    return unions
+
+
+def class_label_map(unions, priority=None, background=BACKGROUND):
+    """
+    description: Collapse per-class unions into one label map.
+    param:
+        unions:     (num_classes, ih, iw) bool, see class_unions()
+        priority:   class ids, highest priority first; where classes overlap the
+                    pixel gets the first one. Defaults to ascending class id.
+        background: label of pixels no class covers
+    return:
+        label_map: (ih, iw) uint8
+    """
+    if priority is None:
+        priority = range(unions.shape[0])
+    label_map = np.full(unions.shape[1:], background, dtype=np.uint8)
+    for k in reversed(list(priority)):
+        label_map[unions[k]] = k
+    return label_map
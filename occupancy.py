@@ -0,0 +1,170 @@
+"""
+Occupancy of regions of interest by segmentation classes, e.g. how much of the
+lower half of the frame is road.
+
+ROIs are given per class in a config dict, as rectangles or polygons in fractions
+of the frame size. They are rasterized once per frame resolution and kept as
+box-sized crops with their pixel counts, so a frame costs one pass over each ROI's
+bounding rectangle for all classes together, and no full-frame ROI image is built.
+
+With scale < 1 the class masks are area-averaged down inside each ROI rectangle
+and weighted by the ROI's cell coverage. Cells fully inside the ROI stay exact,
+the error comes only from cells the ROI edge crosses (none for rectangles) plus
+the 8 bit rounding of the scaled masks, and error_bounds() reports it per ROI in
+percentage points. Exact counting already costs only one pass over the ROI
+rectangles; the scaled path is meant for large polygon sets and slow CPUs.
+"""
+import cv2
+import numpy as np
+
+# Same regions as the white_image cut-outs used so far:
+# road: bottom 50%, footpath: bottom 25% without the left and right quarters
+DEFAULT_ROIS = {
+    "road": {"class_id": 1, "rect": (0.0, 0.5, 1.0, 1.0)},
+    "footpath": {"class_id": 0, "rect": (0.25, 0.75, 0.75, 1.0)},
+}
+
+
+def roi_mask(roi, h, w):
+    """
+    description: Rasterize one ROI into an h x w 0/1 uint8 plane
+    param:
+        roi: {"rect": (x1, y1, x2, y2)} or {"polygon": [(x, y), ...]}, in fractions
+             of the frame width and height
+    """
+    mask = np.zeros((h, w), dtype=np.uint8)
+    if "rect" in roi:
+        fx1, fy1, fx2, fy2 = roi["rect"]
+        # Same rounding as int(0.25 * width) style cut-outs from both sides
+        x1 = int(fx1 * w)
+        y1 = int(fy1 * h)
+        x2 = w - int((1 - fx2) * w)
+        y2 = h - int((1 - fy2) * h)
+        mask[y1:y2, x1:x2] = 1
+    else:
+        points = np.array([(x * w, y * h) for x, y in roi["polygon"]], dtype=np.int32)
+        cv2.fillPoly(mask, [points], 1)
+    return mask
+
+
+class OccupancyLayout(object):
+    """
+    description: The ROIs of an OccupancyAnalyzer rasterized for one resolution.
+                 Every ROI is kept as the crop of its bounding rectangle; scaled
+                 down, the crop holds the fraction of each analysis cell inside
+                 the ROI.
+    """
+
+    def __init__(self, rois, h, w, scale):
+        self.h = h
+        self.w = w
+        self.scaled = scale != 1
+        self.names = []
+        self.class_ids = []
+        self.slices = []
+        self.weights = []
+        self.totals = []
+        self.scratch = []
+        self.error_bounds = {}
+        for name, roi in rois.items():
+            mask = roi_mask(roi, h, w)
+            ys, xs = np.nonzero(mask)
+            if len(ys):
+                sl = np.s_[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+            else:
+                sl = np.s_[0:0, 0:0]
+            crop = mask[sl]
+            total = int(np.count_nonzero(crop))
+            if self.scaled and total:
+                ch, cw = crop.shape
+                size = (max(int(round(cw * scale)), 1), max(int(round(ch * scale)), 1))
+                weight = cv2.resize(crop.astype(np.float32), size, interpolation=cv2.INTER_AREA)
+                # Only cells the ROI edge crosses can be off, by at most their
+                # ROI share; every cell also by the 8 bit rounding of the mask
+                cell_area = (ch * cw) / float(size[0] * size[1])
+                partial = weight[(weight > 1e-3) & (weight < 1 - 1e-3)].sum() * cell_area
+                self.error_bounds[name] = 100.0 * partial / total + 100.0 * 0.5 / 255
+                # Scratch plane for scaling the class masks down, reused every frame
+                self.scratch.append(np.zeros(crop.shape, dtype=np.uint8))
+                total = float(weight.sum())
+            else:
+                weight = crop.astype(bool)
+                self.error_bounds[name] = 0.0
+                self.scratch.append(None)
+            self.names.append(name)
+            self.class_ids.append(roi["class_id"])
+            self.slices.append(sl)
+            self.weights.append(weight)
+            self.totals.append(total)
+
+
+class OccupancyAnalyzer(object):
+    """
+    description: Percentage of every ROI covered by every class.
+    param:
+        rois:  {name: {"class_id": id, "rect" or "polygon": ...}}, see roi_mask()
+        scale: analysis resolution relative to the frame, 1 for exact counts
+    """
+
+    def __init__(self, rois=None, scale=1.0):
+        self.rois = dict(DEFAULT_ROIS if rois is None else rois)
+        self.scale = scale
+        self.layouts = {}
+
+    def layout(self, h, w):
+        """
+        description: The ROIs rasterized for an h x w frame, built once per resolution
+        """
+        layout = self.layouts.get((h, w))
+        if layout is None:
+            layout = OccupancyLayout(self.rois, h, w, self.scale)
+            self.layouts[(h, w)] = layout
+        return layout
+
+    def error_bounds(self, h, w):
+        """
+        description: Worst-case error of each ROI's percentages at this
+                     resolution, in percentage points (0 when scale is 1)
+        """
+        return dict(self.layout(h, w).error_bounds)
+
+    def overlap_matrix(self, unions):
+        """
+        description: Overlap of every ROI with every class in one pass per ROI.
+        param:
+            unions: (num_classes, h, w) bool class masks, e.g. from class_unions(),
+                    or an (h, w) class label map
+        return:
+            percent: (num_rois, num_classes) array, ROIs in config order
+        """
+        if unions.ndim == 2:
+            label_map = unions
+            num_classes = max(self.layout(*label_map.shape).class_ids) + 1
+            unions = np.stack([label_map == k for k in range(num_classes)])
+        num_classes, h, w = unions.shape
+        layout = self.layout(h, w)
+        percent = np.zeros((len(layout.names), num_classes))
+        for r, (sl, weight, total, scratch) in enumerate(zip(layout.slices, layout.weights, layout.totals, layout.scratch)):
+            if not total:
+                continue
+            cover = unions[(slice(None),) + sl]
+            if scratch is None:
+                inside = np.count_nonzero(cover & weight, axis=(1, 2))
+            else:
+                inside = np.empty(num_classes)
+                for k in range(num_classes):
+                    np.multiply(cover[k], 255, out=scratch, dtype=np.uint8)
+                    cells = cv2.resize(scratch, weight.shape[::-1], interpolation=cv2.INTER_AREA)
+                    inside[k] = (cells * weight).sum() / 255.0
+            percent[r] = 100.0 * inside / total
+        return percent
+
+    def __call__(self, unions):
+        """
+        description: Overlap of every ROI with its own class.
+        return:
+            {roi name: percent}
+        """
+        percent = self.overlap_matrix(unions)
+        layout = self.layout(*unions.shape[-2:])
+        return {name: percent[r, k] for r, (name, k) in enumerate(zip(layout.names, layout.class_ids))}
@@ -0,0 +1,142 @@
+"""
+Postprocessing in worker processes.
+
+Mask decoding, the overlap analytics and the drawing are NumPy/OpenCV work on
+the thread that also drives the engine. A PostprocessPool runs them in forked
+worker processes instead, several frames at a time. The engine outputs of a
+frame and the frame itself are copied into a slot of one shared memory block,
+a worker postprocesses the slot in place and only the small results (boxes,
+scores, class ids, compact masks, overlaps) travel back through a pipe. When
+nothing is drawn the frame is not copied at all. Results are delivered in
+submission order.
+"""
+import multiprocessing
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# State of a worker process, set by init_worker()
+_worker = None
+
+
+def init_worker(postprocess_image, det, proto, frames):
+    global _worker
+    _worker = (postprocess_image, det, proto, frames)
+
+
+def run_job(slot, h, w, draw):
+    """
+    description: Postprocess the frame in a slot, in a worker process.
+    """
+    postprocess_image, det, proto, frames = _worker
+    image = frames[slot, :h * w * 3].reshape(h, w, 3)
+    return postprocess_image(det[slot], proto[slot], image, h, w, draw)
+
+
+class PoolJob(object):
+    """
+    description: One frame handed to a PostprocessPool.
+    """
+
+    def __init__(self, slot, async_result, image_raw, draw):
+        self.slot = slot
+        self.async_result = async_result
+        self.image_raw = image_raw
+        self.draw = draw
+        self.result = None
+        self.done = False
+
+
+class PostprocessPool(object):
+    """
+    description: Worker processes running a per-frame postprocess function on
+                 shared memory slots.
+    param:
+        postprocess_image: function(output_bbox, output_proto_mask, image_raw,
+                           origin_h, origin_w, draw) returning a picklable result
+                           and drawing on image_raw if draw is set, e.g.
+                           YoLov5TRT.postprocess_image.
+                           The workers get it, and everything it refers to,
+                           by fork, so it has to be set up before the pool.
+        det_length:        detection output length of one image
+        proto_shape:       (seg_c, seg_h, seg_w) of one image
+        max_frame_shape:   (h, w, 3) of the largest frame that will be submitted
+        workers:           number of worker processes
+        slots:             frames in flight, defaults to 2 per worker
+    """
+
+    def __init__(self, postprocess_image, det_length, proto_shape, max_frame_shape, workers=2, slots=None):
+        self.workers = workers
+        self.num_slots = slots or 2 * workers
+        self.frame_size = int(np.prod(max_frame_shape))
+        det_bytes = 4 * det_length
+        proto_bytes = 4 * int(np.prod(proto_shape))
+        self.shm = shared_memory.SharedMemory(create=True, size=self.num_slots * (det_bytes + proto_bytes + self.frame_size))
+        buf = self.shm.buf
+        self.det = np.ndarray((self.num_slots, det_length), dtype=np.float32, buffer=buf)
+        self.proto = np.ndarray((self.num_slots,) + tuple(proto_shape), dtype=np.float32, buffer=buf,
+                                offset=self.num_slots * det_bytes)
+        self.frames = np.ndarray((self.num_slots, self.frame_size), dtype=np.uint8, buffer=buf,
+                                 offset=self.num_slots * (det_bytes + proto_bytes))
+        self.free = deque(range(self.num_slots))
+        self.jobs = deque()
+        # fork: the workers share the mapping above and inherit postprocess_image
+        # without pickling; they never touch CUDA
+        context = multiprocessing.get_context("fork")
+        self.pool = context.Pool(workers, initializer=init_worker,
+                                 initargs=(postprocess_image, self.det, self.proto, self.frames))
+
+    def submit(self, output_bbox, output_proto_mask, image_raw, origin_h, origin_w, draw=True):
+        """
+        description: Copy one frame's engine outputs, and its pixels if it is to
+                     be drawn, into a free slot and queue it. Waits for the
+                     oldest job if no slot is free.
+        return:
+            a PoolJob for result()
+        """
+        size = origin_h * origin_w * 3
+        if size > self.frame_size:
+            raise ValueError("frame {}x{} is larger than the pool's slots".format(origin_w, origin_h))
+        if not self.free:
+            self.complete(next(job for job in self.jobs if not job.done))
+        slot = self.free.popleft()
+        self.det[slot] = output_bbox
+        self.proto[slot] = output_proto_mask
+        if draw:
+            self.frames[slot, :size].reshape(origin_h, origin_w, 3)[:] = image_raw
+        job = PoolJob(slot, self.pool.apply_async(run_job, (slot, origin_h, origin_w, draw)), image_raw, draw)
+        self.jobs.append(job)
+        return job
+
+    def complete(self, job):
+        """
+        description: Wait for a job, copy the drawn frame back into the
+                     caller's image and free the slot.
+        """
+        if job.done:
+            return
+        job.result = job.async_result.get()
+        if job.draw:
+            h, w = job.image_raw.shape[:2]
+            job.image_raw[:] = self.frames[job.slot, :h * w * 3].reshape(h, w, 3)
+        job.done = True
+        self.free.append(job.slot)
+
+    def result(self, job):
+        """
+        description: The result of a job, waiting for it if needed. Jobs have
+                     to be picked up in the order they were submitted.
+        """
+        if job is not self.jobs[0]:
+            raise RuntimeError("results are delivered in submission order")
+        self.complete(job)
+        self.jobs.popleft()
+        return job.result
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.det = self.proto = self.frames = None
+        self.shm.close()
+        self.shm.unlink()
@@ -0,0 +1,211 @@
+"""
+Stage profiling for the inference wrappers.
+
+The wrappers time their stages (preprocess, the engine's h2d/execute/d2h,
+post_process, process_mask, overlap, draw) through a Profiler:
+
+    profiler = Profiler()
+    yolov5_wrapper = YoLov5TRT(engine_file_path, profiler=profiler)
+    ...
+    print(profiler.report())
+
+Durations come from time.perf_counter_ns() and go into one streaming histogram
+per stage: log-spaced buckets 2% wide, so memory stays fixed however long the
+run is and p50/p95/p99 are within 2%. Nothing is printed while running. A
+disabled Profiler (the wrappers' default) hands out one shared no-op span, so
+the instrumentation costs a method call per stage.
+"""
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Relative width of a histogram bucket
+BUCKET_GROWTH = 1.02
+_LOG_GROWTH = math.log(BUCKET_GROWTH)
+
+
+class StageHistogram(object):
+    """
+    description: Streaming histogram of the durations of one stage, in ns.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, ns):
+        bucket = int(math.log(ns) / _LOG_GROWTH) if ns > 0 else 0
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += ns
+        if self.min is None or ns < self.min:
+            self.min = ns
+        if self.max is None or ns > self.max:
+            self.max = ns
+
+    def merge(self, other):
+        """
+        description: Add the samples of another histogram, e.g. of another run
+        """
+        for bucket, n in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + n
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q):
+        """
+        description: Duration in ns below which q percent of the samples are,
+                     the geometric middle of the bucket it falls into
+        """
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                value = BUCKET_GROWTH ** (bucket + 0.5)
+                return min(max(value, self.min), self.max)
+        return float(self.max)
+
+    def mean(self):
+        return self.total / float(self.count) if self.count else 0.0
+
+    def to_dict(self):
+        return {"count": self.count, "total": self.total, "min": self.min, "max": self.max,
+                "growth": BUCKET_GROWTH, "buckets": {str(b): n for b, n in sorted(self.buckets.items())}}
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls()
+        hist.buckets = {int(b): n for b, n in data["buckets"].items()}
+        hist.count = data["count"]
+        hist.total = data["total"]
+        hist.min = data["min"]
+        hist.max = data["max"]
+        return hist
+
+
+class Span(object):
+    """
+    description: Times one run of a stage, see Profiler.stage()
+    """
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter_ns() - self.start)
+        return False
+
+
+class NullSpan(object):
+    """
+    description: Span of a disabled Profiler, does nothing
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Profiler(object):
+    """
+    description: Per-stage duration histograms.
+    param:
+        enabled: False turns stage() and record() into no-ops
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = OrderedDict()
+        self.lock = threading.Lock()
+
+    def stage(self, name):
+        """
+        description: Context manager timing the block it wraps as stage name
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def add(self, name, ns):
+        """
+        description: Add one duration in ns to a stage
+        """
+        with self.lock:
+            hist = self.stages.get(name)
+            if hist is None:
+                hist = self.stages[name] = StageHistogram()
+            hist.add(ns)
+
+    def record(self, times):
+        """
+        description: Add durations measured elsewhere, e.g. on the GPU
+        param:
+            times: {stage name: seconds}
+        """
+        if not self.enabled:
+            return
+        for name, seconds in times.items():
+            self.add(name, int(seconds * 1e9))
+
+    def stats(self):
+        """
+        return:
+            {stage: {"count", "mean", "p50", "p95", "p99", "max"}}, times in ms
+        """
+        with self.lock:
+            return OrderedDict(
+                (name, {"count": hist.count,
+                        "mean": hist.mean() / 1e6,
+                        "p50": hist.percentile(50) / 1e6,
+                        "p95": hist.percentile(95) / 1e6,
+                        "p99": hist.percentile(99) / 1e6,
+                        "max": (hist.max or 0) / 1e6})
+                for name, hist in self.stages.items())
+
+    def report(self):
+        """
+        description: stats() as a table
+        """
+        lines = ["{:>14} {:>8} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+            "stage (ms)", "count", "mean", "p50", "p95", "p99", "max")]
+        for name, s in self.stats().items():
+            lines.append("{:>14} {:>8} {:9.3f} {:9.3f} {:9.3f} {:9.3f} {:9.3f}".format(
+                name, s["count"], s["mean"], s["p50"], s["p95"], s["p99"], s["max"]))
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """
+        description: Write the histograms as JSON, to merge or compare runs later
+        """
+        with self.lock:
+            data = {"stages": OrderedDict((name, hist.to_dict()) for name, hist in self.stages.items())}
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
@@ -0,0 +1,275 @@
+"""
+Drawing of inference results, apart from the inference itself.
+
+The results-only calls of the wrappers (YoLov5TRT.detect/results_stream,
+YoloTRT.Detect) return boxes, scores, class ids and compact masks and never
+touch the pixels, so a headless deployment pays nothing for drawing. A renderer
+makes a picture of them only where a display or an output sink wants one, and
+optionally at a lower resolution than the source: the frame is area-resized
+once, boxes and mask crops are mapped onto it, and blending and text then cost
+as much as the output size, not the camera's.
+"""
+import random
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# Text color of the labels
+LABEL_TEXT_COLOR = (225, 255, 255)
+
+
+def plot_one_box(x, img, color=None, label=None, line_thickness=None):
+    """
+    description: Plots one bounding box on image img,
+                 this function comes from YoLov5 project.
+    param:
+        x:      a box likes [x1,y1,x2,y2]
+        img:    a opencv image object
+        color:  color to draw rectangle, such as (0,255,0)
+        label:  str
+        line_thickness: int
+    return:
+        no return
+
+    """
+    tl = (
+        line_thickness or round(0.002 * (img.shape[0] + img.shape[1]) / 2) + 1
+    )  # line/font thickness
+    color = color or [random.randint(0, 255) for _ in range(3)]
+    c1, c2 = (int(x[0]), int(x[1])), (int(x[2]), int(x[3]))
+    cv2.rectangle(img, c1, c2, color, thickness=tl, lineType=cv2.LINE_AA)
+    if label:
+        tf = max(tl - 1, 1)  # font thickness
+        t_size = cv2.getTextSize(label, 0, fontScale=tl / 3, thickness=tf)[0]
+        c2 = c1[0] + t_size[0], c1[1] - t_size[1] - 3
+        cv2.rectangle(img, c1, c2, color, -1, cv2.LINE_AA)  # filled
+        cv2.putText(
+            img,
+            label,
+            (c1[0], c1[1] - 2),
+            0,
+            tl / 3,
+            [225, 255, 255],
+            thickness=tf,
+            lineType=cv2.LINE_AA,
+        )
+
+
+class Colors:
+    def __init__(self):
+        hexs = ('FF3838', 'FF9D97', 'FF701F', 'FFB21D', 'CFD231', '48F90A',
+                '92CC17', '3DDB86', '1A9334', '00D4BB', '2C99A8', '00C2FF',
+                '344593', '6473FF', '0018EC', '8438FF', '520085', 'CB38FF',
+                'FF95C8', 'FF37C7')
+        self.palette = [self.hex2rgb(f'#{c}') for c in hexs]
+        self.n = len(self.palette)
+
+    def __call__(self, i, bgr=False):
+        c = self.palette[int(i) % self.n]
+        return (c[2], c[1], c[0]) if bgr else c
+
+    @staticmethod
+    def hex2rgb(h):  # rgb order (PIL)
+        return tuple(int(h[1 + i:1 + i + 2], 16) for i in (0, 2, 4))
+
+
+def line_thickness(shape):
+    """
+    description: Box line thickness of plot_one_box for a frame of this shape
+    """
+    return round(0.002 * (shape[0] + shape[1]) / 2) + 1
+
+
+class BoxRenderer(object):
+    """
+    description: Draws all boxes of a frame in one call, like plot_one_box but
+                 with a fixed color per class and cached labels: the label of a
+                 (class, score bucket, line thickness) is rendered once, with
+                 its background, and later only copied onto the frame.
+    param:
+        categories: class names
+        colors:     palette called as colors(class_id, True) for a BGR color,
+                    Colors() by default
+        score_step: scores in the labels are rounded to this step
+        max_labels: label patches kept, least recently used ones go first
+    """
+
+    def __init__(self, categories, colors=None, score_step=0.01, max_labels=1024):
+        colors = colors or Colors()
+        self.categories = categories
+        self.color_table = [tuple(int(c) for c in colors(k, True)) for k in range(len(categories))]
+        self.score_step = score_step
+        self.max_labels = max_labels
+        self.labels = OrderedDict()
+
+    def label(self, class_id, bucket, tl):
+        """
+        description: The label patch of a class and score bucket: text on a
+                     box filled with the class color, placed above the box
+                     corner as plot_one_box does; the fill also covers the
+                     descenders of the text.
+        return:
+            patch: (h, w, 3) uint8
+            top:   rows of the patch above the box corner row
+        """
+        key = (class_id, bucket, tl)
+        label = self.labels.get(key)
+        if label is not None:
+            self.labels.move_to_end(key)
+            return label
+        text = "{}:{:.2f}".format(self.categories[class_id], bucket * self.score_step)
+        tf = max(tl - 1, 1)  # font thickness
+        (tw, th), baseline = cv2.getTextSize(text, 0, fontScale=tl / 3, thickness=tf)
+        # The filled box spans th + 3 rows above the corner row; the patch
+        # also holds the descenders below the text baseline
+        patch = np.empty((th + 4 + baseline, tw + 1, 3), dtype=np.uint8)
+        patch[:] = self.color_table[class_id]
+        cv2.putText(patch, text, (0, th + 1), 0, tl / 3, LABEL_TEXT_COLOR, thickness=tf, lineType=cv2.LINE_AA)
+        label = (patch, th + 3)
+        self.labels[key] = label
+        if len(self.labels) > self.max_labels:
+            self.labels.popitem(last=False)
+        return label
+
+    def draw(self, img, boxes, classid, scores):
+        """
+        description: Draw boxes with their labels on img, in place.
+        param:
+            boxes:   (n, 4) boxes [x1, y1, x2, y2] in img pixels
+            classid: (n,) class ids
+            scores:  (n,) scores
+        """
+        if len(boxes) == 0:
+            return
+        tl = line_thickness(img.shape)
+        boxes = np.asarray(boxes).reshape(-1, 4).astype(np.int64).tolist()
+        classid = [int(k) for k in classid]
+        for (x1, y1, x2, y2), k in zip(boxes, classid):
+            cv2.rectangle(img, (x1, y1), (x2, y2), self.color_table[k], thickness=tl, lineType=cv2.LINE_AA)
+        # Labels on top of all boxes, copied from the cache and clipped to the frame
+        h, w = img.shape[:2]
+        for (x1, y1, _, _), k, score in zip(boxes, classid, scores):
+            patch, above = self.label(k, int(round(score / self.score_step)), tl)
+            ph, pw = patch.shape[:2]
+            top = y1 - above
+            px1, py1 = max(x1, 0), max(top, 0)
+            px2, py2 = min(x1 + pw, w), min(top + ph, h)
+            if px2 > px1 and py2 > py1:
+                img[py1:py2, px1:px2] = patch[py1 - top:py2 - top, px1 - x1:px2 - x1]
+
+
+def draw_mask(masks, colors_, im_src, alpha=0.5):
+    """
+    description: Draw mask on image ,
+    param:
+        masks  : InstanceMasks from process_mask
+        colors_: color to draw mask
+        im_src : original image
+        alpha  : scale between original  image and mask
+    return:
+        no return
+    """
+    if len(masks) == 0:
+        return
+    # uint8 throughout, with OpenCV doing the per-pixel work, and only inside
+    # the instance boxes; the rest of the frame is never touched. Where
+    # instances overlap their colors add up (saturating), as before
+    x1, y1, x2, y2 = masks.region()
+    colored = np.zeros((y2 - y1, x2 - x1, 3), dtype=np.uint8)
+    covered = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+    boxes = []
+    for (mx, my, crop), color in zip(masks.items, colors_):
+        h, w = crop.shape
+        if crop.size == 0:
+            continue
+        box = np.s_[my - y1:my - y1 + h, mx - x1:mx - x1 + w]
+        mask = crop.view(np.uint8)
+        cv2.add(colored[box], tuple(float(c) for c in color), dst=colored[box], mask=mask)
+        covered[box] |= mask
+        boxes.append((box, np.s_[my:my + h, mx:mx + w]))
+    for box, frame_box in boxes:
+        im_roi = im_src[frame_box]
+        blended = cv2.addWeighted(colored[box], alpha, im_roi, 1 - alpha, 0)
+        cv2.copyTo(blended, covered[box], im_roi)
+        # Blended now, overlapping boxes that follow must not blend it again
+        covered[box] = 0
+
+
+def output_frame(image, width):
+    """
+    description: The frame to draw on: the source itself, or an area-resized
+                 copy when width is below the source width.
+    return:
+        frame, scale (output pixels per source pixel)
+    """
+    h, w = image.shape[:2]
+    if width is None or width >= w:
+        return image, 1.0
+    scale = width / float(w)
+    size = (width, max(int(round(h * scale)), 1))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+
+class SegmentationRenderer(object):
+    """
+    description: Draws the results of YoLov5TRT: masks blended in their class
+                 color, boxes labelled with class and score.
+    param:
+        categories: class names
+        colors:     palette called as colors(class_id, True) for a BGR color,
+                    e.g. Colors()
+        width:      output width in pixels; None draws on the source frame in place
+        alpha:      mask opacity
+    """
+
+    def __init__(self, categories, colors, width=None, alpha=0.5):
+        self.categories = categories
+        self.colors = colors
+        self.width = width
+        self.alpha = alpha
+        self.boxes = BoxRenderer(categories, colors)
+
+    def render(self, image, result):
+        """
+        description: Draw one frame's result.
+        param:
+            image:  the source frame the result belongs to
+            result: a SegmentationResult of that frame
+        return:
+            the drawn frame, image itself at full resolution
+        """
+        out, scale = output_frame(image, self.width)
+        masks = result.masks
+        boxes = np.asarray(result.boxes, dtype=np.float64).reshape(-1, 4)
+        if scale != 1:
+            masks = masks.resized(out.shape[:2])
+            boxes = boxes * scale
+        draw_mask(masks, [self.boxes.color_table[int(k)] for k in result.classid], out, self.alpha)
+        self.boxes.draw(out, boxes, result.classid, result.scores)
+        return out
+
+
+class DetectionRenderer(object):
+    """
+    description: Draws the detections of YoloTRT, boxes labelled with class and score.
+    param:
+        categories: class names, e.g. YoloTRT.categories
+        width:      output width in pixels; None draws on the source frame in place
+        colors:     palette as for BoxRenderer
+    """
+
+    def __init__(self, categories, width=None, colors=None):
+        self.width = width
+        self.boxes = BoxRenderer(categories, colors)
+
+    def render(self, image, detections):
+        """
+        description: Draw one frame's detections, as returned by YoloTRT.Detect.
+        return:
+            the drawn frame, image itself at full resolution
+        """
+        out, scale = output_frame(image, self.width)
+        boxes = np.array([det["box"] for det in detections], dtype=np.float64).reshape(-1, 4) * scale
+        self.boxes.draw(out, boxes, [det["class_id"] for det in detections], [det["conf"] for det in detections])
+        return out
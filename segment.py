@@ -1,13 +1,7 @@
-def create_binary_mask(image_in):
-    height, width = image_in.shape
-    white_image = np.ones((height, width), dtype=np.uint8) * 255
-
-    top_black_height = int(0.50 * height)
-    left_black_width = int(0.25 * width)
-    right_black_width = int(0.25 * width)
+from occupancy import roi_mask
 
-    white_image[0:top_black_height, :] = 0
-    white_image[:, 0:left_black_width] = 0
-    white_image[:, -right_black_width:] = 0
 
-    return white_image
+def create_binary_mask(image_in):
+    height, width = image_in.shape
+    # Bottom half without the left and right quarters, see occupancy.py
+    return roi_mask({"rect": (0.25, 0.5, 0.75, 1.0)}, height, width) * 255
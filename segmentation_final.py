@@ -3,19 +3,30 @@ An example that uses TensorRT's Python api to make inferences.
 """
 import ctypes
 import os
-import shutil
-import random
 import sys
 import threading
-import time
+from collections import deque, namedtuple
 import cv2
 import numpy as np
-import pycuda.autoinit
-import pycuda.driver as cuda
-import tensorrt as trt
+
+from backend import TensorRTBackend
+from capture import CaptureReader
+from display import DisplaySink
+from engine_capture import CaptureWriter
+from frame_ring import CaptureProcess
+from letterbox import Letterbox, letterbox_geometry
+from masks import InstanceMasks, class_label_map, class_unions, decode_box_masks
+from nms import MAX_DET, NMS_TOP_K, nms
+from occupancy import OccupancyAnalyzer
+from postpool import PostprocessPool
+from profiler import Profiler
+from render import Colors, SegmentationRenderer
 
 CONF_THRESH = 0.5
 IOU_THRESHOLD = 0.4
+categories = ["Footpath", "Road"]
+# Default width of the displayed frames, see --show
+DISPLAY_WIDTH = 960
 
 
 def get_img_path_batches(batch_size, img_dir):
@@ -32,237 +43,326 @@ def get_img_path_batches(batch_size, img_dir):
     return ret
 
 
-def plot_one_box(x, img, color=None, label=None, line_thickness=None):
-    """
-    description: Plots one bounding box on image img,
-                 this function comes from YoLov5 project.
-    param: 
-        x:      a box likes [x1,y1,x2,y2]
-        img:    a opencv image object
-        color:  color to draw rectangle, such as (0,255,0)
-        label:  str
-        line_thickness: int
-    return:
-        no return
-
-    """
-    tl = (
-        line_thickness or round(0.002 * (img.shape[0] + img.shape[1]) / 2) + 1
-    )  # line/font thickness
-    color = color or [random.randint(0, 255) for _ in range(3)]
-    c1, c2 = (int(x[0]), int(x[1])), (int(x[2]), int(x[3]))
-    cv2.rectangle(img, c1, c2, color, thickness=tl, lineType=cv2.LINE_AA)
-    if label:
-        tf = max(tl - 1, 1)  # font thickness
-        t_size = cv2.getTextSize(label, 0, fontScale=tl / 3, thickness=tf)[0]
-        c2 = c1[0] + t_size[0], c1[1] - t_size[1] - 3
-        cv2.rectangle(img, c1, c2, color, -1, cv2.LINE_AA)  # filled
-        cv2.putText(
-            img,
-            label,
-            (c1[0], c1[1] - 2),
-            0,
-            tl / 3,
-            [225, 255, 255],
-            thickness=tf,
-            lineType=cv2.LINE_AA,
-        )
+# Results of one frame, see YoLov5TRT.postprocess_image(): boxes (n, 4) in frame
+# pixels, scores (n,), class ids (n,), InstanceMasks and {ROI name: percent}
+SegmentationResult = namedtuple("SegmentationResult", ["boxes", "scores", "classid", "masks", "overlap"])
 
 
 class YoLov5TRT(object):
     """
     description: A YOLOv5 class that warps TensorRT ops, preprocess and postprocess ops.
+
+    post_process keeps at most max_det (MAX_DET, 100) detections, picked from
+    the nms_top_k (NMS_TOP_K, 300) most confident ones, see nms.py. The old
+    suppression had no limit; pass nms_top_k=None and max_det=None to get its
+    result back.
     """
 
-    def __init__(self, engine_file_path):
-        # Create a Context on this device,
-        self.ctx = cuda.Device(0).make_context()
-        stream = cuda.Stream()
-        TRT_LOGGER = trt.Logger(trt.Logger.INFO)
-        runtime = trt.Runtime(TRT_LOGGER)
-
-        # Deserialize the engine from file
-        with open(engine_file_path, "rb") as f:
-            engine = runtime.deserialize_cuda_engine(f.read())
-        context = engine.create_execution_context()
-
-        host_inputs = []
-        cuda_inputs = []
-        host_outputs = []
-        cuda_outputs = []
-        bindings = []
-
-        for binding in engine:
-            print('bingding:', binding, engine.get_binding_shape(binding))
-            size = trt.volume(engine.get_binding_shape(binding)) * engine.max_batch_size
-            dtype = trt.nptype(engine.get_binding_dtype(binding))
-            # Allocate host and device buffers
-            host_mem = cuda.pagelocked_empty(size, dtype)
-            cuda_mem = cuda.mem_alloc(host_mem.nbytes)
-            # Append the device buffer to device bindings.
-            bindings.append(int(cuda_mem))
-            # Append to the appropriate list.
-            if engine.binding_is_input(binding):
-                self.input_w = engine.get_binding_shape(binding)[-1]
-                self.input_h = engine.get_binding_shape(binding)[-2]
-                host_inputs.append(host_mem)
-                cuda_inputs.append(cuda_mem)
-            else:
-                host_outputs.append(host_mem)
-                cuda_outputs.append(cuda_mem)
+    def __init__(self, engine_file_path=None, backend=None, in_flight=1, postprocess_workers=0,
+                 max_frame_shape=(1080, 1920, 3), profiler=None, recorder=None,
+                 nms_top_k=NMS_TOP_K, max_det=MAX_DET):
+        # Deserialize the engine and allocate its buffers, unless a backend
+        # (e.g. a ReplayBackend for CPU-only runs) is given. With in_flight > 1
+        # there is one buffer set per batch in flight, see submit()
+        if backend is None:
+            backend = TensorRTBackend(engine_file_path, num_slots=in_flight)
+        host_outputs = backend.host_outputs
+
         # Store
-        self.stream = stream
-        self.context = context
-        self.engine = engine
-        self.host_inputs = host_inputs
-        self.cuda_inputs = cuda_inputs
+        self.backend = backend
+        # Stage timings, see profiler.py; off unless a Profiler is given. The
+        # postprocess stages of pool workers stay in the workers, the pool
+        # shows up as "pool_wait"
+        self.profiler = profiler or Profiler(enabled=False)
+        # Engine outputs of every frame go to the recorder if given, e.g. an
+        # engine_capture.CaptureWriter for offline postprocessing benchmarks
+        self.recorder = recorder
+        self.host_inputs = backend.host_inputs
         self.host_outputs = host_outputs
-        self.cuda_outputs = cuda_outputs
-        self.bindings = bindings
-        self.batch_size = engine.max_batch_size
-
-        # Data length
-        self.det_output_length  = host_outputs[0].shape[0]
-        self.mask_output_length = host_outputs[1].shape[0]
+        self.input_h = backend.input_h
+        self.input_w = backend.input_w
+        self.batch_size = backend.batch_size
+        # Per batch index (3, h, w) views of the host input buffer of every
+        # buffer set, the preprocessing writes straight into them
+        self.input_batches = [slot.host_inputs[0].reshape(self.batch_size, 3, self.input_h, self.input_w)
+                              for slot in backend.slots]
+        self.input_batch = self.input_batches[0]
+        # Batches submitted but not collected yet, oldest first
+        self.pending = deque()
+        self.next_slot = 0
+        self.letterbox = Letterbox(self.input_h, self.input_w)
+        # Caps of the non-maximum suppression, None for no limit; set before
+        # the postprocess pool forks, the workers keep their own copy
+        self.nms_top_k = nms_top_k
+        self.max_det = max_det
+
+        # Data length, per image; the output buffers hold batch_size of each
+        self.det_output_length  = host_outputs[0].shape[0] // self.batch_size
+        self.mask_output_length = host_outputs[1].shape[0] // self.batch_size
         self.seg_w = int(self.input_w / 4)
         self.seg_h = int(self.input_h / 4)
-        self.seg_c = int(self.mask_output_length / (self.seg_w * self.seg_w))
+        self.seg_c = int(self.mask_output_length / (self.seg_h * self.seg_w))
         self.det_row_output_length = self.seg_c + 6
         
-        # Draw mask
+        # Draw mask; the renderer draws on the source frames in place, only
+        # for infer() and friends, the results-only calls never draw
         self.colors_obj = Colors()
+        self.renderer = SegmentationRenderer(categories, self.colors_obj)
+        # Road/footpath ROIs, rasterized once per resolution
+        self.occupancy = OccupancyAnalyzer()
+
+        # Postprocessing in worker processes, for frames up to max_frame_shape
+        self.pool = None
+        self.dispatched = deque()
+        if postprocess_workers:
+            self.pool = PostprocessPool(self.postprocess_image, self.det_output_length,
+                                        (self.seg_c, self.seg_h, self.seg_w), max_frame_shape, postprocess_workers)
 
     def infer(self, raw_image_generator):
         threading.Thread.__init__(self)
-        # Make self the active context, pushing it on top of the context stack.
-        self.ctx.push()
-        # Restore
-        stream = self.stream
-        context = self.context
-        engine = self.engine
-        host_inputs = self.host_inputs
-        cuda_inputs = self.cuda_inputs
-        host_outputs = self.host_outputs
-        cuda_outputs = self.cuda_outputs
-        bindings = self.bindings
-        # Do image preprocess
+        if self.pending:
+            raise RuntimeError("infer() with batches in flight, collect() them first")
+        self.submit(raw_image_generator)
+        return self.collect()
+
+    def detect(self, raw_image_generator):
+        """
+        description: Results-only infer: nothing is drawn on the frames, see
+                     render.SegmentationRenderer to draw them where needed.
+        return:
+            results:  a SegmentationResult per frame
+            use_time: engine time in seconds
+        """
+        if self.pending:
+            raise RuntimeError("detect() with batches in flight, collect() them first")
+        self.submit(raw_image_generator, draw=False)
+        _, results, use_time = self.collect_results()
+        return results, use_time
+
+    def submit(self, raw_image_generator, draw=True):
+        """
+        description: Preprocess a batch into the next free buffer set and start
+                     the engine on it without waiting. While it runs the caller
+                     can preprocess the next batch or collect() an earlier one.
+        param:
+            raw_image_generator: the frames of one batch, 1 to batch_size of them
+            draw:                draw the results on the frames when collected
+        """
+        if len(self.pending) == self.backend.num_slots:
+            raise RuntimeError("all {} buffer sets are in flight, collect() first".format(len(self.pending)))
+        slot = self.next_slot
+        # Do image preprocess, straight into the host input buffer
         batch_image_raw = []
         batch_origin_h = []
         batch_origin_w = []
-        batch_input_image = np.empty(shape=[self.batch_size, 3, self.input_h, self.input_w])
         for i, image_raw in enumerate(raw_image_generator):
-            input_image, image_raw, origin_h, origin_w = self.preprocess_image(image_raw)
+            if i == self.batch_size:
+                raise ValueError("more than {} frames in one batch".format(self.batch_size))
+            with self.profiler.stage("preprocess"):
+                origin_h, origin_w = self.letterbox(image_raw, self.input_batches[slot][i])
             batch_image_raw.append(image_raw)
             batch_origin_h.append(origin_h)
             batch_origin_w.append(origin_w)
-            np.copyto(batch_input_image[i], input_image)
-        batch_input_image = np.ascontiguousarray(batch_input_image)
-
-        # Copy input image to host buffer
-        np.copyto(host_inputs[0], batch_input_image.ravel())
-        start = time.time()
-        # Transfer input data  to the GPU.
-        cuda.memcpy_htod_async(cuda_inputs[0], host_inputs[0], stream)
-        # Run inference.
-        context.execute_async(batch_size=self.batch_size, bindings=bindings, stream_handle=stream.handle)
-        # Transfer predictions back from the GPU.
-        cuda.memcpy_dtoh_async(host_outputs[0], cuda_outputs[0], stream)
-        cuda.memcpy_dtoh_async(host_outputs[1], cuda_outputs[1], stream)
-        # Synchronize the stream
-        stream.synchronize()
-        end = time.time()
-        # Remove any context from the top of the context stack, deactivating it.
-        self.ctx.pop()
-        # Here we use the first row of output in that batch_size = 1
-        output_bbox = host_outputs[0]
-        output_proto_mask = host_outputs[1]
-        # Do postprocess
-        for i in range(self.batch_size):
+        if not batch_image_raw:
+            raise ValueError("empty batch")
+        # Start the engine, transfers included. A partial batch runs only its
+        # real frames, the unused slots are neither inferred nor postprocessed
+        self.backend.push()
+        self.backend.enqueue(slot, len(batch_image_raw))
+        self.backend.pop()
+        self.next_slot = (slot + 1) % self.backend.num_slots
+        self.pending.append((slot, batch_image_raw, batch_origin_h, batch_origin_w, draw))
+
+    def collect(self):
+        """
+        description: Wait for the oldest submitted batch and postprocess it, so
+                     results come back in submission order.
+        return:
+            batch_image_raw: the frames of that batch, drawn on
+            use_time:        its engine time in seconds
+        """
+        batch_image_raw, _, use_time = self.collect_results()
+        return batch_image_raw, use_time
+
+    def collect_results(self):
+        """
+        description: collect() with the results of every frame.
+        return:
+            batch_image_raw, results (a SegmentationResult per frame), use_time
+        """
+        if self.pool is not None:
+            if not self.dispatched:
+                self.dispatch()
+            return self.finish()
+        slot, batch_image_raw, batch_origin_h, batch_origin_w, draw = self.pending.popleft()
+        use_time = self.wait(slot)
+        self.record(self.backend.slots[slot].host_outputs, batch_origin_h, batch_origin_w)
+        results = self.postprocess(self.backend.slots[slot].host_outputs, batch_image_raw,
+                                   batch_origin_h, batch_origin_w, draw)
+        return batch_image_raw, results, use_time
+
+    def dispatch(self):
+        """
+        description: Wait for the oldest submitted batch and hand its frames to
+                     the postprocess pool; its buffer set is free afterwards.
+        """
+        slot, batch_image_raw, batch_origin_h, batch_origin_w, draw = self.pending.popleft()
+        use_time = self.wait(slot)
+        self.record(self.backend.slots[slot].host_outputs, batch_origin_h, batch_origin_w)
+        output_bbox, output_proto_mask = self.output_views(self.backend.slots[slot].host_outputs)
+        jobs = [self.pool.submit(output_bbox[i], output_proto_mask[i], batch_image_raw[i],
+                                 batch_origin_h[i], batch_origin_w[i], draw)
+                for i in range(len(batch_image_raw))]
+        self.dispatched.append((batch_image_raw, use_time, jobs))
+
+    def finish(self):
+        """
+        description: Wait until the pool is done with the oldest dispatched batch.
+        return:
+            batch_image_raw, results, use_time as collect_results()
+        """
+        batch_image_raw, use_time, jobs = self.dispatched.popleft()
+        with self.profiler.stage("pool_wait"):
+            results = [self.pool.result(job) for job in jobs]
+        return batch_image_raw, results, use_time
+
+    def wait(self, slot):
+        """
+        description: Wait for the batch of a buffer set. The time the host
+                     blocked goes to the profiler as "wait", the engine's own
+                     stages (h2d, execute, d2h) as the backend measured them.
+        return:
+            the engine time in seconds
+        """
+        with self.profiler.stage("wait"):
+            self.backend.push()
+            use_time = self.backend.wait(slot)
+            self.backend.pop()
+        self.profiler.record(self.backend.slots[slot].stage_times)
+        return use_time
+
+    def record(self, host_outputs, batch_origin_h, batch_origin_w):
+        """
+        description: Hand the engine outputs of the real frames of a batch to the recorder, if any
+        """
+        if self.recorder is None:
+            return
+        output_bbox, output_proto_mask = self.output_views(host_outputs)
+        for i in range(len(batch_origin_h)):
+            self.recorder.write([output_bbox[i], output_proto_mask[i]], batch_origin_h[i], batch_origin_w[i])
+
+    def infer_stream(self, batches):
+        """
+        description: Pipelined infer over an iterable of batches: batch N+1 is
+                     preprocessed and enqueued while batch N runs on the engine
+                     and batch N-1 is postprocessed. Needs in_flight >= 2 to
+                     overlap anything, with 1 it is plain infer() in a loop.
+                     With a postprocess pool, up to one batch per worker is
+                     postprocessed at the same time.
+        return:
+            a generator of (batch_image_raw, use_time), in input order
+        """
+        for batch_image_raw, _, use_time in self.results_stream(batches, draw=True):
+            yield batch_image_raw, use_time
+
+    def results_stream(self, batches, draw=False):
+        """
+        description: infer_stream() with the results of every frame, by default
+                     results-only (the frames are not drawn on).
+        return:
+            a generator of (batch_image_raw, results, use_time), in input order
+        """
+        for batch in batches:
+            if len(self.pending) == self.backend.num_slots:
+                if self.pool is None:
+                    yield self.collect_results()
+                else:
+                    self.dispatch()
+                    while len(self.dispatched) > self.pool.workers:
+                        yield self.finish()
+            self.submit(batch, draw)
+        while self.pending:
+            if self.pool is None:
+                yield self.collect_results()
+            else:
+                self.dispatch()
+        while self.dispatched:
+            yield self.finish()
+
+    def output_views(self, host_outputs):
+        """
+        description: Split the host output buffers of a batch into per image
+                     views, no data is copied.
+        param:
+            host_outputs: host output buffers of one buffer set
+        return:
+            output_bbox:       (batch_size, det_output_length)
+            output_proto_mask: (batch_size, seg_c, seg_h, seg_w)
+        """
+        output_bbox = host_outputs[0].reshape(self.batch_size, self.det_output_length)
+        output_proto_mask = host_outputs[1].reshape(self.batch_size, self.seg_c, self.seg_h, self.seg_w)
+        return output_bbox, output_proto_mask
+
+    def postprocess(self, host_outputs, batch_image_raw, batch_origin_h, batch_origin_w, draw=True):
+        """
+        description: Boxes, masks and overlaps of one batch, drawn on its frames
+                     unless draw is False
+        param:
+            host_outputs: host output buffers of the buffer set holding the batch
+        return:
+            a SegmentationResult per frame
+        """
+        # Per image views of the detections and the prototype masks
+        output_bbox, output_proto_mask = self.output_views(host_outputs)
+        # Do postprocess, for the real frames only
+        return [self.postprocess_image(output_bbox[i], output_proto_mask[i], batch_image_raw[i],
+                                       batch_origin_h[i], batch_origin_w[i], draw)
+                for i in range(len(batch_image_raw))]
+
+    def postprocess_image(self, output_bbox, output_proto_mask, image_raw, origin_h, origin_w, draw=True):
+        """
+        description: Boxes, masks and overlaps of one image, drawn on it unless
+                     draw is False. Only host memory is used, so it also runs in
+                     a PostprocessPool worker.
+        param:
+            output_bbox:       this image's detection output
+            output_proto_mask: this image's prototype masks
+            image_raw:         the frame, drawn on in place
+            origin_h, origin_w: size of the frame
+            draw:              draw the result and print the overlaps
+        return:
+            a SegmentationResult
+        """
+        profiler = self.profiler
+        with profiler.stage("post_process"):
             result_boxes, result_scores, result_classid, result_proto_coef = self.post_process(
-                output_bbox[i * self.det_output_length: (i + 1) * self.det_output_length], batch_origin_h[i], batch_origin_w[i]
+                output_bbox, origin_h, origin_w
             )
-            if result_proto_coef.shape[0] == 0:
-                continue
-            result_masks = self.process_mask(output_proto_mask, result_proto_coef, result_boxes, batch_origin_h[i], batch_origin_w[i])
-            '''
-            class_id = 1
-            class_masks = []
-            for mask in result_masks:
-            	class_mask = np.where(mask == class_id,1,0)
-            	class_masks.append(class_mask)
-            class_masks = np.array(class_masks)
-            for i in class_masks:
-            	print(i)
-            	#cv2.imshow("Fraem",i)
-            
-            print(result_masks)
-            print(type(result_masks))
-            print(result_masks.shape)
-            '''
-          
-            footpath_masks = [mask for mask,result_classid in zip(result_masks,result_classid) if result_classid==0]
-            footpath_masks = np.array(footpath_masks)
-            #for fp_instance in footpath_masks:
-            	#cv2.imshow("Frame",fp_instance)
-            road_masks = [mask for mask,result_classid in zip(result_masks,result_classid) if result_classid==0]
-            road_masks = np.array(road_masks)
-            for road_instance in road_masks:
-            	cv2.imshow("Frame",road_instance)
-            	height, width = road_instance.shape
-            	white_image = np.ones((height, width), dtype=np.uint8) * 255
-            	top_black_height = int(0.70 * height)
-            	left_black_width = int(0.25 * width)
-            	right_black_width = int(0.25 * width)
-            	white_image[0:top_black_height, :] = 0
-            	white_image[:, 0:left_black_width] = 0
-            	white_image[:, -right_black_width:] = 0
-            	
-            	total = cv2.countNonZero(white_image)
-            	
-    
-            	road_instance = road_instance.astype(int)
-            	intersection_mask = white_image & road_instance
-            	intersection = cv2.countNonZero(intersection_mask)   
-            	
-            	print(intersection,total) 
-            	print(f"Overlap percent = {int(intersection*100/total)}%")
-    
-            '''
-            road_masks = [mask for mask,result_classid in zip(result_masks,result_classid) if result_classid==1]
-            print("Footpath Masks")
-            print(footpath_masks)
-            print(type(footpath_masks))
-            footpath_masks = np.array(footpath_masks)
-            for i in footpath_masks:
-            	cv2.imshow("Frame",i)
-     
-            print("Road Masks")
-            print(road_masks)
-            print(type(road_masks))
-            
-            print("Resultant Masks")
-            print(result_masks)
-            print(type(result_masks))
-            '''
-            
-            # Draw masks on  the original image
-            self.draw_mask(result_masks, colors_=[self.colors_obj(x, True) for x in result_classid],im_src=batch_image_raw[i])
-
-            # Draw rectangles and labels on the original image
-            for j in range(len(result_boxes)):
-                box = result_boxes[j]
-                plot_one_box(
-                    box,
-                    batch_image_raw[i],
-                    label="{}:{:.2f}".format(
-                        categories[int(result_classid[j])], result_scores[j]
-                    ),
-                )
-        return batch_image_raw, end - start
+        if result_proto_coef.shape[0] == 0:
+            return SegmentationResult(result_boxes, result_scores, result_classid,
+                                      InstanceMasks([], (origin_h, origin_w)), {})
+        with profiler.stage("process_mask"):
+            result_masks = self.process_mask(output_proto_mask, result_proto_coef, result_boxes, origin_h, origin_w)
+
+        # Overlap of the road/footpath ROIs with their class, see occupancy.py;
+        # the class unions come from the masks decoded above
+        with profiler.stage("overlap"):
+            unions = result_masks.class_unions(result_classid, len(categories))
+            overlap = self.occupancy(unions)
+
+        result = SegmentationResult(result_boxes, result_scores, result_classid, result_masks, overlap)
+        if draw:
+            for name, percent in overlap.items():
+                print(f"Overlap of {name}: {percent}")
+            # Draw masks, rectangles and labels on the original image
+            with profiler.stage("draw"):
+                self.renderer.render(image_raw, result)
+        return result
 
     def destroy(self):
-        # Remove any context from the top of the context stack, deactivating it.
-        self.ctx.pop()
+        if self.pool is not None:
+            self.pool.close()
+        self.backend.destroy()
 
     def get_raw_image(self, image_path_batch):
         """
@@ -283,6 +383,8 @@ class YoLov5TRT(object):
         description: Convert BGR image to RGB,
                      resize and pad it to target size, normalize to [0,1],
                      transform to NCHW format.
+                     infer() writes into the host input buffer directly,
+                     this allocating variant is kept for other callers.
         param:
             input_image_path: str, image path
         return:
@@ -292,38 +394,8 @@ class YoLov5TRT(object):
             w: original width
         """
         image_raw = raw_bgr_image
-        h, w, c = image_raw.shape
-        image = cv2.cvtColor(image_raw, cv2.COLOR_BGR2RGB)
-        # Calculate widht and height and paddings
-        r_w = self.input_w / w
-        r_h = self.input_h / h
-        if r_h > r_w:
-            tw = self.input_w
-            th = int(r_w * h)
-            tx1 = tx2 = 0
-            ty1 = int((self.input_h - th) / 2)
-            ty2 = self.input_h - th - ty1
-        else:
-            tw = int(r_h * w)
-            th = self.input_h
-            tx1 = int((self.input_w - tw) / 2)
-            tx2 = self.input_w - tw - tx1
-            ty1 = ty2 = 0
-        # Resize the image with long side while maintaining ratio
-        image = cv2.resize(image, (tw, th))
-        # Pad the short side with (128,128,128)
-        image = cv2.copyMakeBorder(
-            image, ty1, ty2, tx1, tx2, cv2.BORDER_CONSTANT, None, (128, 128, 128)
-        )
-        image = image.astype(np.float32)
-        # Normalize to [0,1]
-        image /= 255.0
-        # HWC to CHW format:
-        image = np.transpose(image, [2, 0, 1])
-        # CHW to NCHW format
-        image = np.expand_dims(image, axis=0)
-        # Convert the image to row-major order, also known as "C order":
-        image = np.ascontiguousarray(image)
+        image = np.empty((1, 3, self.input_h, self.input_w), dtype=np.float32)
+        h, w = self.letterbox(image_raw, image[0])
         return image, image_raw, h, w
 
     def xywh2xyxy(self, origin_h, origin_w, x):
@@ -336,23 +408,7 @@ class YoLov5TRT(object):
         return:
             y:          A boxes numpy, each row is a box [x1, y1, x2, y2]
         """
-        y = np.zeros_like(x)
-        r_w = self.input_w / origin_w
-        r_h = self.input_h / origin_h
-        if r_h > r_w:
-            y[:, 0] = x[:, 0] - x[:, 2] / 2
-            y[:, 2] = x[:, 0] + x[:, 2] / 2
-            y[:, 1] = x[:, 1] - x[:, 3] / 2 - (self.input_h - r_w * origin_h) / 2
-            y[:, 3] = x[:, 1] + x[:, 3] / 2 - (self.input_h - r_w * origin_h) / 2
-            y /= r_w
-        else:
-            y[:, 0] = x[:, 0] - x[:, 2] / 2 - (self.input_w - r_h * origin_w) / 2
-            y[:, 2] = x[:, 0] + x[:, 2] / 2 - (self.input_w - r_h * origin_w) / 2
-            y[:, 1] = x[:, 1] - x[:, 3] / 2
-            y[:, 3] = x[:, 1] + x[:, 3] / 2
-            y /= r_h
-
-        return y
+        return letterbox_geometry(origin_h, origin_w, self.input_h, self.input_w).boxes_to_source(x)
 
     def post_process(self, output_boxes, origin_h, origin_w):
         """
@@ -372,7 +428,7 @@ class YoLov5TRT(object):
         pred = np.reshape(output_boxes[1:], (-1, self.det_row_output_length))[:num, :]
         # Do nms
         boxes = self.non_max_suppression(pred, origin_h, origin_w, conf_thres=CONF_THRESH,
-                                         nms_thres=IOU_THRESHOLD)
+                                         nms_thres=IOU_THRESHOLD, top_k=self.nms_top_k, max_det=self.max_det)
         result_boxes = boxes[:, :4] if len(boxes) else np.array([])
         result_scores = boxes[:, 4] if len(boxes) else np.array([])
         result_classid = boxes[:, 5] if len(boxes) else np.array([])
@@ -416,7 +472,8 @@ class YoLov5TRT(object):
 
         return iou
 
-    def non_max_suppression(self, prediction, origin_h, origin_w, conf_thres=0.5, nms_thres=0.4):
+    def non_max_suppression(self, prediction, origin_h, origin_w, conf_thres=0.5, nms_thres=0.4,
+                            top_k=NMS_TOP_K, max_det=MAX_DET):
         """
         description: Removes detections with lower object confidence score than 'conf_thres' and performs
         Non-Maximum Suppression to further filter detections.
@@ -426,8 +483,10 @@ class YoLov5TRT(object):
             origin_w: original image width
             conf_thres: a confidence threshold to filter detections
             nms_thres: a iou threshold to filter detections
+            top_k: only the top_k most confident detections go into nms
+            max_det: at most max_det detections are returned
         return:
-            boxes: output after nms with the shape (x1, y1, x2, y2, conf, cls_id)
+            boxes: output after nms with the shape (x1, y1, x2, y2, conf, cls_id), by descending conf
         """
         # Get the boxes that score > CONF_THRESH
         boxes = prediction[prediction[:, 4] >= conf_thres]
@@ -438,40 +497,16 @@ class YoLov5TRT(object):
         boxes[:, 2] = np.clip(boxes[:, 2], 0, origin_w - 1)
         boxes[:, 1] = np.clip(boxes[:, 1], 0, origin_h - 1)
         boxes[:, 3] = np.clip(boxes[:, 3], 0, origin_h - 1)
-        # Object confidence
-        confs = boxes[:, 4]
-        # Sort by the confs
-        boxes = boxes[np.argsort(-confs)]
-        # Perform non-maximum suppression
-        keep_boxes = []
-        while boxes.shape[0]:
-            large_overlap = self.bbox_iou(np.expand_dims(boxes[0, :4], 0), boxes[:, :4]) > nms_thres
-            label_match = boxes[0, 5] == boxes[:, 5]
-            # Indices of boxes with lower confidence scores, large IOUs and matching labels
-            invalid = large_overlap & label_match
-            keep_boxes += [boxes[0]]
-            boxes = boxes[~invalid]
-        boxes = np.stack(keep_boxes, 0) if len(keep_boxes) else np.array([])
-        return boxes
+        # Perform class-aware non-maximum suppression, bounded by top_k and max_det
+        keep = nms(boxes[:, :4], boxes[:, 4], boxes[:, 5], iou_thres=nms_thres, top_k=top_k, max_det=max_det)
+        return boxes[keep]
 
     def sigmoid(self, x):
         return 1 / (1 + np.exp(-x))
 
     def scale_mask(self, mask, ih, iw):
         mask = cv2.resize(mask, (self.input_w, self.input_h))
-        r_w = self.input_w / (iw * 1.0)
-        r_h = self.input_h / (ih * 1.0)
-        if r_h > r_w:
-            w = self.input_w
-            h = int(r_w * ih)
-            x = 0
-            y = int((self.input_h - h) / 2)
-        else:
-            w = int(r_h * iw)
-            h = self.input_h
-            x = int((self.input_w - w) / 2)
-            y = 0
-        crop = mask[y:y+h, x:x+w]
+        crop = letterbox_geometry(ih, iw, self.input_h, self.input_w).unpad(mask)
         crop = cv2.resize(crop, (iw, ih))
         return crop
 
@@ -480,56 +515,41 @@ class YoLov5TRT(object):
         """
         description: Mask pred by yolov5 instance segmentation ,
         param: 
-            output_proto_mask: prototype mask e.g. (32, 160, 160) for 640x640 input
+            output_proto_mask: prototype mask of this image e.g. (32, 160, 160) for 640x640 input
             result_proto_coef: prototype mask coefficients (n, 32), n represents n results
             result_boxes     :  
             ih: rows of original image
             iw: cols of original image
         return:
-            mask_result: (n, ih, iw)
+            mask_result: InstanceMasks, n box-sized crops, np.asarray() gives (n, ih, iw)
         """
         result_proto_masks = output_proto_mask.reshape(self.seg_c, self.seg_h, self.seg_w)
-        c, mh, mw = result_proto_masks.shape
-        masks = self.sigmoid((result_proto_coef @ result_proto_masks.astype(np.float32).reshape(c, -1))).reshape(-1, mh, mw)
-        mask_result = []
-
-        for mask, box in zip(masks, result_boxes):
-            mask_s = np.zeros((ih, iw))
-            crop_mask = self.scale_mask(mask, ih, iw)            
-            x1 = int(box[0])
-            y1 = int(box[1])
-            x2 = int(box[2])
-            y2 = int(box[3])
-            crop = crop_mask[y1:y2, x1:x2]
-            crop = np.where(crop >= 0.5, 1, 0)
-            crop = crop.astype(np.uint8)
-            mask_s[y1:y2, x1:x2] = crop
-            mask_result.append(mask_s)
-
-        mask_result = np.array(mask_result)
-        return mask_result
-
-    def draw_mask(self, masks, colors_, im_src, alpha=0.5):
-        """
-        description: Draw mask on image ,
-        param: 
-            masks  : result_mask
-            colors_: color to draw mask
-            im_src : original image
-            alpha  : scale between original  image and mask
+        geometry = letterbox_geometry(ih, iw, self.input_h, self.input_w)
+        # Only the box footprints are decoded and kept, see masks.py
+        return InstanceMasks(decode_box_masks(result_proto_masks, result_proto_coef, result_boxes, geometry), (ih, iw))
+
+    def class_masks(self, output_proto_mask, result_proto_coef, result_boxes, result_classid, ih, iw, priority=None):
+        """
+        description: Per-class masks of one image, built from the proto
+                     coefficients without per-instance full-frame masks.
+        param:
+            output_proto_mask: prototype mask of this image
+            result_proto_coef: prototype mask coefficients (n, 32)
+            result_boxes     : boxes (n, 4) from post_process
+            result_classid   : class ids (n,) from post_process
+            ih: rows of original image
+            iw: cols of original image
+            priority: class ids, highest first, deciding overlapping pixels
+                      of the label map; ascending class id by default
         return:
-            no return
+            unions   : (len(categories), ih, iw) bool, one union per class
+            label_map: (ih, iw) uint8 class id per pixel, masks.BACKGROUND elsewhere
         """
-        if len(masks) == 0:
-            return
-        masks = np.asarray(masks, dtype=np.uint8)
-        masks = np.ascontiguousarray(masks.transpose(1, 2, 0))
-        masks = np.asarray(masks, dtype=np.float32)
-        colors_ = np.asarray(colors_, dtype=np.float32)
-        s = masks.sum(2, keepdims=True).clip(0, 1)
-        masks = (masks @ colors_).clip(0, 255)
-        im_src[:] = masks * alpha + im_src * (1 - s * alpha)
-    
+        result_proto_masks = output_proto_mask.reshape(self.seg_c, self.seg_h, self.seg_w)
+        geometry = letterbox_geometry(ih, iw, self.input_h, self.input_w)
+        unions = class_unions(result_proto_masks, result_proto_coef, result_boxes, result_classid, geometry, len(categories))
+        return unions, class_label_map(unions, priority)
+
 
 class inferThread(threading.Thread):
     def __init__(self, yolov5_wrapper, image_path_batch):
@@ -557,62 +577,104 @@ class warmUpThread(threading.Thread):
         print('warm_up->{}, time->{:.2f}ms'.format(batch_image_raw[0].shape, use_time * 1000))
 
 
-class Colors:
-    def __init__(self):
-        hexs = ('FF3838', 'FF9D97', 'FF701F', 'FFB21D', 'CFD231', '48F90A',
-                '92CC17', '3DDB86', '1A9334', '00D4BB', '2C99A8', '00C2FF',
-                '344593', '6473FF', '0018EC', '8438FF', '520085', 'CB38FF',
-                'FF95C8', 'FF37C7')
-        self.palette = [self.hex2rgb(f'#{c}') for c in hexs]
-        self.n = len(self.palette)
-
-    def __call__(self, i, bgr=False):
-        c = self.palette[int(i) % self.n]
-        return (c[2], c[1], c[0]) if bgr else c
-
-    @staticmethod
-    def hex2rgb(h):  # rgb order (PIL)
-        return tuple(int(h[1 + i:1 + i + 2], 16) for i in (0, 2, 4))
-
 if __name__ == "__main__":
     PLUGIN_LIBRARY = "yolov5/build/libmyplugins.so"
     engine_file_path = "Seg/best_seg.engine"
 
-    if len(sys.argv) > 1:
-        engine_file_path = sys.argv[1]
-    if len(sys.argv) > 2:
-        PLUGIN_LIBRARY = sys.argv[2]
+    # --capture-process decodes in a separate process, see frame_ring.py;
+    # --workers=N postprocesses in N worker processes, see postpool.py;
+    # --show[=WIDTH] displays the results, drawn at WIDTH pixels wide.
+    # Without it nothing is drawn at all;
+    # --profile[=PATH] prints per-stage timings at the end, and with PATH
+    # also writes them as JSON, see profiler.py;
+    # --record=PATH[:N] writes the engine outputs of the first N (all) frames
+    # to a capture file for offline postprocessing runs, see engine_capture.py
+    capture_process = "--capture-process" in sys.argv
+    workers = int(next((arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--workers=")), 0))
+    show = next((arg for arg in sys.argv if arg == "--show" or arg.startswith("--show=")), None)
+    profile = next((arg for arg in sys.argv if arg == "--profile" or arg.startswith("--profile=")), None)
+    profiler = Profiler(enabled=profile is not None)
+    record = next((arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--record=")), None)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if len(args) > 0:
+        engine_file_path = args[0]
+    if len(args) > 1:
+        PLUGIN_LIBRARY = args[1]
 
     ctypes.CDLL(PLUGIN_LIBRARY)
 
-    categories = ["Footpath","Road"]
-
-    # Create an instance of the YoLov5TRT class
-    yolov5_wrapper = YoLov5TRT(engine_file_path)
-
-    # Open a video capture object
+    # Create an instance of the YoLov5TRT class, with two batches in flight.
+    # The pool workers fork after the engine is loaded and the capture
+    # process forks after the pool started its threads; that is safe only
+    # because neither child touches CUDA or the pool, they must not
+    in_flight = 2
+    yolov5_wrapper = YoLov5TRT(engine_file_path, in_flight=in_flight, postprocess_workers=workers, profiler=profiler)
+    if record:
+        path, _, limit = record.partition(":")
+        yolov5_wrapper.recorder = CaptureWriter(path, yolov5_wrapper.backend.binding_list,
+                                                int(limit) if limit else None)
+
+    # Open a video capture object, decoding runs on its own thread or process
     video_path = "videos/Input_fp_1.mp4"  # Replace with your video file path
-    cap = cv2.VideoCapture(video_path)
-
-    try:
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
+    if capture_process:
+        # The loop below holds up to in_flight + workers + 1 frames unreleased
+        # (in the engine, in the pool, and the one being read); with fewer
+        # slots the capture process and the loop wait for each other forever.
+        # One more lets decoding run ahead
+        cap = CaptureProcess(video_path, slots=max(8, in_flight + workers + 2))
+    else:
+        cap = CaptureReader(video_path)
+    # Frames handed to the pipeline and not done yet, oldest first
+    in_use = deque()
+
+    # The window lives on its own thread, see display.py; the frames are
+    # drawn there too, only those that are shown
+    display = None
+    if show:
+        width = int(show.split("=", 1)[1]) if "=" in show else DISPLAY_WIDTH
+        renderer = SegmentationRenderer(categories, Colors(), width=width)
+        display = DisplaySink("Processed Frame", render=renderer.render)
+
+    def read_batches():
+        for captured in cap:
+            in_use.append(captured)
+            frame = captured.image
 
             # Resize the frame if needed
             #frame = cv2.resize(frame, (width, height))
+            yield [frame]
 
-            # Perform inference on the current frame
-            result_image, use_time = yolov5_wrapper.infer([frame])
-
-            # Display or save the processed frame
-            #cv2.imshow("Processed Frame", result_image[0])
-
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+    try:
+        # Perform inference, the next frame is read and preprocessed while
+        # the current one runs on the engine. Results only, the frames are
+        # drawn below if there is a display
+        for batch_image_raw, results, use_time in yolov5_wrapper.results_stream(read_batches()):
+            for name, percent in results[0].overlap.items():
+                print(f"Overlap of {name}: {percent}")
+
+            # Display the processed frame; a ring slot is reused once it is
+            # released, so the display gets its own copy of those
+            if display is not None:
+                image = batch_image_raw[0].copy() if capture_process else batch_image_raw[0]
+                display.show(image, results[0])
+
+            done = in_use.popleft()
+            if capture_process:
+                # The frame is a view into the ring, hand its slot back
+                cap.release(done)
+
+            if display is not None and display.quit:
                 break
 
     finally:
+        in_use.clear()
         cap.release()
-        cv2.destroyAllWindows()
         yolov5_wrapper.destroy()
+        if yolov5_wrapper.recorder is not None:
+            yolov5_wrapper.recorder.close()
+        if profile is not None:
+            print(profiler.report())
+            if "=" in profile:
+                profiler.dump(profile.split("=", 1)[1])
+        if display is not None:
+            display.close()
@@ -0,0 +1,410 @@
+"""
+Deterministic synthetic street scenes and matching engine outputs.
+
+The demos read videos/Input_fp_1.mp4 and videos/demo.mp4, which are not in the
+tree. A Scene draws a street procedurally instead: roads and footpaths as
+trapezoids running to the horizon, swaying as if the camera steered, and
+sign-like boxes on poles that grow as they come closer. Every frame depends only
+on the scene parameters, the seed and the frame index, so two runs see the same
+pixels.
+
+The scene also writes what the engines would have said about each frame, in the
+layout of their output bindings (see backend.py):
+
+    - segmentation: a detection row per road/footpath region, and proto masks
+      whose channel 1 + k % (seg_c - 2) is positive inside region k, so the
+      decoded mask of a region is the region itself (channel 0 is a -1 bias)
+    - detection: a detection row per sign
+
+instances sets the number of rows per frame. Beyond one row per object the
+extra rows are instances laid out on a grid over the frame, one per cell with
+a gap around it, with confidences above the wrappers' threshold and a class
+that no object overlapping it has. No two rows of a class overlap, so all of
+them survive the confidence filter and NMS, which makes them the worst case
+for NMS, the mask decoding and the drawing. A segmentation instance's mask is
+an ellipse in its box, in proto channel seg_c - 1. Up to max_det rows can be
+written; the wrappers keep at most MAX_DET (100) of them unless their NMS caps
+are lifted (nms_top_k / max_det None, benchmark.py --uncapped).
+
+    python synthetic.py --video street.avi --frames 300 --width 1920 --height 1080
+    python synthetic.py --capture worst.cap --frames 50 --instances 1000
+    python engine_capture.py worst.cap
+"""
+import argparse
+
+import cv2
+import numpy as np
+
+from backend import detection_bindings, segmentation_bindings
+from letterbox import letterbox_geometry
+from nms import box_iou_matrix
+from render import Colors
+
+# Class ids of the segmentation engine, see segmentation_final.categories
+FOOTPATH = 0
+ROAD = 1
+# Number of classes of the segmentation engine
+SEGMENTATION_CLASSES = 2
+# Number of classes of the detection engine, see YoloTRT.categories
+SIGN_CLASSES = 22
+# An instance overlapping an object by more than this IoU gets another class,
+# so it stays well below the wrappers' IOU_THRESHOLD (0.4)
+INSTANCE_IOU = 0.2
+
+ROAD_COLOR = (72, 72, 76)
+FOOTPATH_COLOR = (150, 160, 170)
+LANE_COLOR = (230, 230, 230)
+POLE_COLOR = (90, 90, 90)
+GROUND_COLOR = (60, 110, 80)
+SKY_TOP = (235, 180, 120)
+SKY_HORIZON = (245, 225, 205)
+# Height of the horizon, a fraction of the frame height
+HORIZON = 0.45
+
+
+class Scene(object):
+    """
+    description: A procedural street scene.
+    param:
+        width, height: frame size in pixels
+        fps:           frame rate, sets the speed of the motion per frame
+        roads:         number of road regions
+        footpaths:     number of footpath regions
+        signs:         number of sign boxes, each of its own class up to
+                       SIGN_CLASSES signs
+        instances:     detection rows per frame in the engine outputs, None
+                       for one per object
+        noise:         amplitude of the uniform pixel noise, 0 for none
+        seed:          layout and noise seed
+    """
+
+    def __init__(self, width=1280, height=720, fps=30.0, roads=1, footpaths=2, signs=4,
+                 instances=None, noise=0, seed=0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.instances = instances
+        self.noise = noise
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        # Roads side by side: (bottom center, bottom half width, top half width), in frame widths
+        self.road_layout = []
+        for k in range(roads):
+            half = 0.45 / roads * rng.uniform(0.8, 1.0)
+            self.road_layout.append(((k + 0.5) / roads + rng.uniform(-0.05, 0.05) / roads, half, half * 0.12))
+        # Footpaths side by side, apart so their boxes never overlap:
+        # (bottom center, bottom half width, top half width, bottom y)
+        self.footpath_layout = []
+        for k in range(footpaths):
+            slot = 1.0 / footpaths
+            half = rng.uniform(0.4, 1.0) * min(0.1, slot / 4)
+            center = (k + 0.5 + rng.uniform(-0.1, 0.1)) * slot
+            self.footpath_layout.append((center, half, half * 0.15, rng.uniform(0.85, 1.0)))
+        # Signs: (x, y, size) at their farthest, phase, class id; the classes
+        # only repeat beyond SIGN_CLASSES signs
+        sign_classes = rng.permutation(SIGN_CLASSES)
+        self.sign_layout = [(rng.uniform(0.05, 0.95), rng.uniform(0.2, HORIZON), rng.uniform(0.015, 0.04),
+                             rng.uniform(0, 1), int(sign_classes[k % SIGN_CLASSES]))
+                            for k in range(signs)]
+        colors = Colors()
+        self.sign_colors = [tuple(int(c) for c in colors(k, True)) for k in range(SIGN_CLASSES)]
+        # The sky and ground are the same in every frame, drawn once
+        self.background = np.empty((height, width, 3), dtype=np.uint8)
+        horizon = int(HORIZON * height)
+        t = np.linspace(0, 1, max(horizon, 1))[:, None]
+        self.background[:horizon] = (np.float32(SKY_TOP) * (1 - t) + np.float32(SKY_HORIZON) * t)[:, None, :]
+        self.background[horizon:] = GROUND_COLOR
+
+    def sway(self, index):
+        """
+        description: Horizontal camera sway at a frame, in frame widths
+        """
+        return 0.03 * np.sin(2 * np.pi * index / (self.fps * 4))
+
+    def regions(self, index):
+        """
+        description: The road and footpath regions of a frame.
+        return:
+            a list of (class_id, polygon), the polygon (4, 2) float32 in frame pixels
+        """
+        w, h = self.width, self.height
+        shift = self.sway(index)
+        horizon = HORIZON * h
+        regions = []
+        for center, bottom_half, top_half in self.road_layout:
+            x = center + shift
+            top = center + shift * 0.2
+            regions.append((ROAD, np.float32([[(x - bottom_half) * w, h], [(top - top_half) * w, horizon],
+                                              [(top + top_half) * w, horizon], [(x + bottom_half) * w, h]])))
+        for center, bottom_half, top_half, bottom in self.footpath_layout:
+            x = center + shift
+            top = center + shift * 0.2
+            y = horizon + 0.15 * h
+            regions.append((FOOTPATH, np.float32([[(x - bottom_half) * w, bottom * h], [(top - top_half) * w, y],
+                                                  [(top + top_half) * w, y], [(x + bottom_half) * w, bottom * h]])))
+        return regions
+
+    def signs(self, index):
+        """
+        description: The sign boxes of a frame. A sign comes closer over a
+                     cycle of two seconds: it grows and moves away from the
+                     middle of the frame, then starts far away again.
+        return:
+            a list of (class_id, box), the box [x1, y1, x2, y2] in frame pixels
+        """
+        w, h = self.width, self.height
+        t = index / float(self.fps)
+        signs = []
+        for x, y, size, phase, class_id in self.sign_layout:
+            closer = 1 + 3 * ((t / 2.0 + phase) % 1.0)
+            cx = (0.5 + (x - 0.5) * closer + self.sway(index)) * w
+            cy = (HORIZON - (HORIZON - y) * closer) * h
+            half = size * closer * w / 2
+            box = np.float32([cx - half, cy - half, cx + half, cy + half])
+            box[0::2] = np.clip(box[0::2], 0, w - 1)
+            box[1::2] = np.clip(box[1::2], 0, h - 1)
+            if box[2] > box[0] and box[3] > box[1]:
+                signs.append((class_id, box))
+        return signs
+
+    def frame(self, index):
+        """
+        description: The BGR frame at an index
+        """
+        image = self.background.copy()
+        h = self.height
+        for class_id, polygon in self.regions(index):
+            color = ROAD_COLOR if class_id == ROAD else FOOTPATH_COLOR
+            cv2.fillPoly(image, [np.round(polygon * 16).astype(np.int32)], color, cv2.LINE_AA, shift=4)
+        # Dashed lane markings down the middle of the roads, moving towards the camera
+        for class_id, polygon in self.regions(index):
+            if class_id != ROAD:
+                continue
+            bottom = (polygon[0] + polygon[3]) / 2
+            top = (polygon[1] + polygon[2]) / 2
+            offset = (index / float(self.fps)) % 1.0
+            for k in range(8):
+                a = ((k + offset) / 8.0) ** 2
+                b = ((k + offset + 0.4) / 8.0) ** 2
+                p1 = top + (bottom - top) * a
+                p2 = top + (bottom - top) * min(b, 1.0)
+                thickness = max(int(h * 0.01 * (a + b)), 1)
+                cv2.line(image, (int(p1[0]), int(p1[1])), (int(p2[0]), int(p2[1])), LANE_COLOR, thickness)
+        for class_id, (x1, y1, x2, y2) in self.signs(index):
+            cx = int((x1 + x2) / 2)
+            pole = max(int((x2 - x1) / 8), 1)
+            cv2.line(image, (cx, int(y2)), (cx, int(min(y2 + 2 * (y2 - y1), h - 1))), POLE_COLOR, pole)
+            cv2.rectangle(image, (int(x1), int(y1)), (int(x2), int(y2)), self.sign_colors[class_id], -1)
+            cv2.rectangle(image, (int(x1), int(y1)), (int(x2), int(y2)), (255, 255, 255), max(pole // 2, 1))
+        if self.noise:
+            rng = np.random.default_rng((self.seed, index))
+            image = cv2.add(image, rng.integers(0, self.noise, image.shape, dtype=np.uint8))
+        return image
+
+    def frames(self, count, start=0):
+        for index in range(start, start + count):
+            yield self.frame(index)
+
+    def grid(self, count):
+        """
+        description: count boxes on a grid over the frame, one per cell, half
+                     the cell's size and in its middle, so no two overlap
+        return:
+            boxes (count, 4) float32 in frame pixels
+        """
+        cols = int(np.ceil(np.sqrt(count * self.width / float(self.height))))
+        rows = int(np.ceil(count / float(cols)))
+        cell_w, cell_h = self.width / float(cols), self.height / float(rows)
+        k = np.arange(count)
+        x1 = (k % cols + 0.25) * cell_w
+        y1 = (k // cols + 0.25) * cell_h
+        return np.float32([x1, y1, x1 + cell_w / 2, y1 + cell_h / 2]).T.reshape(-1, 4)
+
+    def rows(self, objects, index, max_det, num_classes):
+        """
+        description: The detection rows of a frame: every object once with a
+                     high confidence, then grid instances up to instances.
+        return:
+            object index of every row (-1 for an instance), class ids (n,),
+            boxes (n, 4) in frame pixels, confidences (n,)
+        """
+        count = len(objects) if self.instances is None else self.instances
+        count = min(count, max_det)
+        rng = np.random.default_rng((self.seed, index, 1))
+        which = np.arange(min(count, len(objects)))
+        classes = np.int64([objects[k][0] for k in which])
+        boxes = np.float32([objects[k][1] for k in which]).reshape(-1, 4)
+        conf = rng.uniform(0.6, 0.95, len(which)).astype(np.float32)
+        extra = count - len(which)
+        if extra > 0:
+            grid = self.grid(extra)
+            grid_classes = np.arange(extra) % num_classes
+            if len(boxes):
+                # Move an instance off the classes of the objects it overlaps
+                iou = box_iou_matrix(np.concatenate([grid, boxes]))[:extra, extra:]
+                for i in np.nonzero((iou > INSTANCE_IOU).any(axis=1))[0]:
+                    taken = set(classes[iou[i] > INSTANCE_IOU].tolist())
+                    free = [c for c in range(num_classes) if c not in taken]
+                    if free:
+                        grid_classes[i] = free[i % len(free)]
+            which = np.concatenate([which, np.full(extra, -1)])
+            classes = np.concatenate([classes, grid_classes])
+            boxes = np.concatenate([boxes, grid])
+            conf = np.concatenate([conf, rng.uniform(0.55, 0.95, extra).astype(np.float32)])
+        return which, classes, boxes, conf
+
+    def prob(self, rows, geometry, row_length, max_det):
+        """
+        description: The detection output of one image: the row count, then
+                     [cx, cy, w, h, conf, class id, ...] rows in network input pixels
+        """
+        which, classes, boxes, conf = rows
+        prob = np.zeros(max_det * row_length + 1, dtype=np.float32)
+        prob[0] = len(which)
+        table = prob[1:].reshape(max_det, row_length)
+        x1 = boxes[:, 0] * geometry.scale + geometry.pad_x
+        y1 = boxes[:, 1] * geometry.scale + geometry.pad_y
+        x2 = boxes[:, 2] * geometry.scale + geometry.pad_x
+        y2 = boxes[:, 3] * geometry.scale + geometry.pad_y
+        n = len(which)
+        table[:n, 0] = (x1 + x2) / 2
+        table[:n, 1] = (y1 + y2) / 2
+        table[:n, 2] = np.abs(x2 - x1)
+        table[:n, 3] = np.abs(y2 - y1)
+        table[:n, 4] = conf
+        table[:n, 5] = classes
+        return prob, table
+
+    def segmentation_outputs(self, index, input_h=640, input_w=640, seg_c=32, max_det=1000):
+        """
+        description: The segmentation engine's outputs for a frame.
+        return:
+            [prob, proto] in the per-image shapes of segmentation_bindings()
+        """
+        geometry = letterbox_geometry(self.height, self.width, input_h, input_w)
+        regions = self.regions(index)
+        objects = [(class_id, np.float32([polygon[:, 0].min(), polygon[:, 1].min(),
+                                          polygon[:, 0].max(), polygon[:, 1].max()]))
+                   for class_id, polygon in regions]
+        rows = self.rows(objects, index, max_det, SEGMENTATION_CLASSES)
+        prob, table = self.prob(rows, geometry, seg_c + 6, max_det)
+        mh, mw = input_h // 4, input_w // 4
+        proto = np.zeros((seg_c, mh, mw), dtype=np.float32)
+        proto[0] = -1
+        plane = np.zeros((mh, mw), dtype=np.uint8)
+        for k, (_, polygon) in enumerate(regions):
+            # Frame pixel -> network input -> proto pixel (cv2.resize centers)
+            points = (polygon * geometry.scale + (geometry.pad_x, geometry.pad_y) + 0.5) / 4 - 0.5
+            plane[:] = 0
+            cv2.fillPoly(plane, [np.round(points * 16).astype(np.int32)], 1, shift=4)
+            channel = proto[1 + k % (seg_c - 2)]
+            np.maximum(channel, 2 * plane, out=channel)
+        # The instances' ellipses, all in the last channel; their boxes do not
+        # overlap, so the crop to its box leaves every instance its own
+        which, _, boxes, _ = rows
+        instances = which < 0
+        if instances.any():
+            plane[:] = 0
+            corners = (boxes[instances] * geometry.scale + (geometry.pad_x, geometry.pad_y,
+                                                            geometry.pad_x, geometry.pad_y) + 0.5) / 4 - 0.5
+            for x1, y1, x2, y2 in np.round(corners * 16).astype(np.int64):
+                cv2.ellipse(plane, (int(x1 + x2) // 2, int(y1 + y2) // 2), (int(x2 - x1) // 2, int(y2 - y1) // 2),
+                            0, 0, 360, 1, -1, shift=4)
+            proto[seg_c - 1] = 2 * plane
+        # Coefficients: the bias and the channel of the row's region or instance
+        coefs = table[:len(which), 6:]
+        coefs[:, 0] = 1
+        coefs[np.arange(len(which)), np.where(instances, seg_c - 1, 1 + which % (seg_c - 2))] = 1
+        return [prob.reshape(-1, 1, 1), proto]
+
+    def detection_outputs(self, index, input_h=640, input_w=640, max_det=1000):
+        """
+        description: The detection engine's outputs for a frame.
+        return:
+            [prob] in the per-image shape of detection_bindings()
+        """
+        geometry = letterbox_geometry(self.height, self.width, input_h, input_w)
+        objects = self.signs(index)
+        rows = self.rows(objects, index, max_det, SIGN_CLASSES)
+        prob, _ = self.prob(rows, geometry, 38, max_det)
+        return [prob.reshape(-1, 1, 1)]
+
+    def engine_outputs(self, model, index, input_h=640, input_w=640):
+        """
+        description: segmentation_outputs() for model "seg", detection_outputs() for "det"
+        """
+        if model == "seg":
+            return self.segmentation_outputs(index, input_h, input_w)
+        return self.detection_outputs(index, input_h, input_w)
+
+    def replay(self, model, count, input_h=640, input_w=640):
+        """
+        description: The outputs argument of a ReplayBackend running the
+                     outputs of frames 0 .. count - 1 in a loop, every image of
+                     a batch getting the next frame. They are made up front,
+                     so the simulated engine time does not include them.
+        """
+        frames = [self.engine_outputs(model, index, input_h, input_w) for index in range(count)]
+
+        def outputs(backend):
+            batch = [frames[(backend.calls * backend.batch_size + i) % count] for i in range(backend.batch_size)]
+            return [np.concatenate([np.ravel(frame[k]) for frame in batch]) for k in range(len(batch[0]))]
+        return outputs
+
+    def write_video(self, path, count, fourcc="MJPG"):
+        """
+        description: Write frames 0 .. count - 1 to a video file
+        """
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), self.fps, (self.width, self.height))
+        if not writer.isOpened():
+            raise IOError("cannot write {}".format(path))
+        for image in self.frames(count):
+            writer.write(image)
+        writer.release()
+
+    def write_capture(self, path, model, count, input_h=640, input_w=640):
+        """
+        description: Write the engine outputs of frames 0 .. count - 1 as an
+                     engine capture, see engine_capture.py
+        """
+        from engine_capture import CaptureWriter
+        if model == "seg":
+            bindings = segmentation_bindings(input_h, input_w)
+        else:
+            bindings = detection_bindings(input_h, input_w)
+        with CaptureWriter(path, bindings) as writer:
+            for index in range(count):
+                writer.write(self.engine_outputs(model, index, input_h, input_w), self.height, self.width)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic street video and its engine outputs")
+    parser.add_argument("--video", default=None, help="video file to write")
+    parser.add_argument("--capture", default=None, help="engine capture to write, see engine_capture.py")
+    parser.add_argument("--model", choices=["seg", "det"], default="seg", help="engine of the capture")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--roads", type=int, default=1)
+    parser.add_argument("--footpaths", type=int, default=2)
+    parser.add_argument("--signs", type=int, default=4)
+    parser.add_argument("--instances", type=int, default=None, help="detection rows per frame")
+    parser.add_argument("--noise", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--input-h", type=int, default=640)
+    parser.add_argument("--input-w", type=int, default=640)
+    args = parser.parse_args()
+    if not args.video and not args.capture:
+        parser.error("nothing to write, give --video and/or --capture")
+
+    scene = Scene(args.width, args.height, args.fps, args.roads, args.footpaths, args.signs,
+                  args.instances, args.noise, args.seed)
+    if args.video:
+        scene.write_video(args.video, args.frames)
+    if args.capture:
+        scene.write_capture(args.capture, args.model, args.frames, args.input_h, args.input_w)
+
+
+if __name__ == "__main__":
+    main()
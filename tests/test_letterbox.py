@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+import pytest
+
+from letterbox import Letterbox, letterbox_geometry
+
+INPUT_H = INPUT_W = 640
+SIZES = [(720, 1280), (1080, 1920), (480, 640), (640, 640), (1280, 720), (333, 517), (100, 2000)]
+
+
+def baseline_preprocess(image_raw, input_h=INPUT_H, input_w=INPUT_W):
+    # YoLov5TRT.preprocess_image before the fused letterbox
+    h, w, c = image_raw.shape
+    image = cv2.cvtColor(image_raw, cv2.COLOR_BGR2RGB)
+    r_w = input_w / w
+    r_h = input_h / h
+    if r_h > r_w:
+        tw = input_w
+        th = int(r_w * h)
+        tx1 = tx2 = 0
+        ty1 = int((input_h - th) / 2)
+        ty2 = input_h - th - ty1
+    else:
+        tw = int(r_h * w)
+        th = input_h
+        tx1 = int((input_w - tw) / 2)
+        tx2 = input_w - tw - tx1
+        ty1 = ty2 = 0
+    image = cv2.resize(image, (tw, th))
+    image = cv2.copyMakeBorder(image, ty1, ty2, tx1, tx2, cv2.BORDER_CONSTANT, None, (128, 128, 128))
+    image = image.astype(np.float32)
+    image /= 255.0
+    image = np.transpose(image, [2, 0, 1])
+    return np.ascontiguousarray(image)
+
+
+def baseline_xywh2xyxy(origin_h, origin_w, x, input_h=INPUT_H, input_w=INPUT_W):
+    y = np.zeros_like(x)
+    r_w = input_w / origin_w
+    r_h = input_h / origin_h
+    if r_h > r_w:
+        y[:, 0] = x[:, 0] - x[:, 2] / 2
+        y[:, 2] = x[:, 0] + x[:, 2] / 2
+        y[:, 1] = x[:, 1] - x[:, 3] / 2 - (input_h - r_w * origin_h) / 2
+        y[:, 3] = x[:, 1] + x[:, 3] / 2 - (input_h - r_w * origin_h) / 2
+        y /= r_w
+    else:
+        y[:, 0] = x[:, 0] - x[:, 2] / 2 - (input_w - r_h * origin_w) / 2
+        y[:, 2] = x[:, 0] + x[:, 2] / 2 - (input_w - r_h * origin_w) / 2
+        y[:, 1] = x[:, 1] - x[:, 3] / 2
+        y[:, 3] = x[:, 1] + x[:, 3] / 2
+        y /= r_h
+    return y
+
+
+def test_letterbox_matches_baseline():
+    rng = np.random.default_rng(0)
+    letterbox = Letterbox(INPUT_H, INPUT_W)
+    out = np.empty((3, INPUT_H, INPUT_W), dtype=np.float32)
+    # Twice over, so every size also follows another one on the same canvas
+    for h, w in SIZES + SIZES[::-1]:
+        image = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+        out[:] = np.nan
+        assert letterbox(image, out) == (h, w)
+        assert np.array_equal(out, baseline_preprocess(image))
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_boxes_to_source_matches_baseline(size):
+    h, w = size
+    rng = np.random.default_rng(1)
+    x = np.concatenate([rng.uniform(0, INPUT_W, (50, 2)), rng.uniform(1, 200, (50, 2))], axis=1).astype(np.float32)
+    geometry = letterbox_geometry(h, w, INPUT_H, INPUT_W)
+    assert np.array_equal(geometry.boxes_to_source(x), baseline_xywh2xyxy(h, w, x))
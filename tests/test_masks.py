@@ -0,0 +1,105 @@
+import cv2
+import numpy as np
+import pytest
+
+from letterbox import letterbox_geometry
+from masks import BACKGROUND, InstanceMasks, class_label_map, class_unions, decode_box_masks
+
+INPUT_H = INPUT_W = 640
+SIZES = [(720, 1280), (1080, 1920), (640, 480), (640, 640), (333, 517)]
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def baseline_process_mask(proto, coefs, boxes, ih, iw, input_h=INPUT_H, input_w=INPUT_W):
+    # YoLov5TRT.process_mask and scale_mask before the crop-first decoding
+    c, mh, mw = proto.shape
+    masks = sigmoid((coefs @ proto.astype(np.float32).reshape(c, -1))).reshape(-1, mh, mw)
+    mask_result = []
+    for mask, box in zip(masks, boxes):
+        mask_s = np.zeros((ih, iw))
+        mask = cv2.resize(mask, (input_w, input_h))
+        r_w = input_w / (iw * 1.0)
+        r_h = input_h / (ih * 1.0)
+        if r_h > r_w:
+            w, h, x, y = input_w, int(r_w * ih), 0, int((input_h - int(r_w * ih)) / 2)
+        else:
+            w, h, x, y = int(r_h * iw), input_h, int((input_w - int(r_h * iw)) / 2), 0
+        crop_mask = cv2.resize(mask[y:y + h, x:x + w], (iw, ih))
+        x1, y1, x2, y2 = int(box[0]), int(box[1]), int(box[2]), int(box[3])
+        mask_s[y1:y2, x1:x2] = np.where(crop_mask[y1:y2, x1:x2] >= 0.5, 1, 0).astype(np.uint8)
+        mask_result.append(mask_s)
+    return np.array(mask_result)
+
+
+def random_instances(rng, ih, iw, n=10, c=32, mh=160, mw=160):
+    # Smooth prototypes like a trained model's, and boxes anywhere in the frame
+    proto = rng.normal(0, 1, (c, mh, mw)).astype(np.float32)
+    proto = np.stack([cv2.GaussianBlur(p, (0, 0), 4) * 8 for p in proto])
+    coefs = rng.normal(0, 1, (n, c)).astype(np.float32)
+    xy = rng.uniform(0, [iw * 0.8, ih * 0.8], (n, 2))
+    wh = rng.uniform(20, [iw * 0.5, ih * 0.5], (n, 2))
+    boxes = np.clip(np.hstack([xy, xy + wh]), 0, [iw - 1, ih - 1, iw - 1, ih - 1]).astype(np.float32)
+    classes = rng.integers(0, 2, n).astype(np.float32)
+    return proto, coefs, boxes, classes
+
+
+def decode(proto, coefs, boxes, ih, iw):
+    geometry = letterbox_geometry(ih, iw, INPUT_H, INPUT_W)
+    return InstanceMasks(decode_box_masks(proto, coefs, boxes, geometry), (ih, iw))
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_decoding_matches_baseline(size):
+    ih, iw = size
+    proto, coefs, boxes, _ = random_instances(np.random.default_rng(ih * iw), ih, iw)
+    expected = baseline_process_mask(proto, coefs, boxes, ih, iw).astype(np.uint8)
+    masks = decode(proto, coefs, boxes, ih, iw).to_dense()
+    differ = masks != expected
+    # The logits are warped once instead of resized twice, which moves a
+    # few pixels where the sigmoid crosses 0.5
+    assert differ.mean() < 1e-4
+    # and only there: every pixel that differs is within two pixels of an
+    # edge of the old mask
+    kernel = np.ones((5, 5), np.uint8)
+    edges = np.stack([cv2.dilate(m, kernel) != cv2.erode(m, kernel) for m in expected])
+    assert not (differ & ~edges).any()
+
+
+def test_decoding_outside_boxes_is_empty():
+    ih, iw = 720, 1280
+    proto, coefs, boxes, _ = random_instances(np.random.default_rng(5), ih, iw)
+    masks = decode(proto, coefs, boxes, ih, iw)
+    for i, box in enumerate(boxes):
+        plane = masks.dense(i)
+        x1, y1, x2, y2 = [int(v) for v in box]
+        plane[y1:y2, x1:x2] = 0
+        assert not plane.any()
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_class_unions_match_baseline(size):
+    ih, iw = size
+    proto, coefs, boxes, classes = random_instances(np.random.default_rng(ih + iw), ih, iw)
+    geometry = letterbox_geometry(ih, iw, INPUT_H, INPUT_W)
+    unions = class_unions(proto, coefs, boxes, classes, geometry, 2)
+    # The same planes as OR-ing the decoded masks of a class ...
+    masks = decode(proto, coefs, boxes, ih, iw)
+    assert np.array_equal(unions, masks.class_unions(classes, 2))
+    # ... and, up to the decoding's edge pixels of every instance, the union
+    # of the old dense masks
+    expected = baseline_process_mask(proto, coefs, boxes, ih, iw) != 0
+    for k in range(2):
+        instances = classes == k
+        assert np.mean(unions[k] != expected[instances].any(axis=0)) < 1e-4 * max(instances.sum(), 1)
+
+
+def test_class_label_map():
+    unions = np.zeros((2, 4, 4), dtype=bool)
+    unions[0, :2] = True
+    unions[1, 1:3] = True
+    labels = class_label_map(unions, priority=[1, 0])
+    assert labels[:, 0].tolist() == [0, 1, 1, BACKGROUND]
+    assert class_label_map(unions)[:, 0].tolist() == [0, 0, 1, BACKGROUND]
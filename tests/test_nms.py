@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from nms import box_iou_matrix, nms
+
+
+def baseline_bbox_iou(box1, box2):
+    # YoLov5TRT.bbox_iou, x1y1x2y2 boxes
+    inter_w = np.clip(np.minimum(box1[:, 2], box2[:, 2]) - np.maximum(box1[:, 0], box2[:, 0]) + 1, 0, None)
+    inter_h = np.clip(np.minimum(box1[:, 3], box2[:, 3]) - np.maximum(box1[:, 1], box2[:, 1]) + 1, 0, None)
+    inter_area = inter_w * inter_h
+    b1_area = (box1[:, 2] - box1[:, 0] + 1) * (box1[:, 3] - box1[:, 1] + 1)
+    b2_area = (box2[:, 2] - box2[:, 0] + 1) * (box2[:, 3] - box2[:, 1] + 1)
+    return inter_area / (b1_area + b2_area - inter_area + 1e-16)
+
+
+def baseline_nms(boxes, nms_thres):
+    # The suppression loop of YoLov5TRT.non_max_suppression before nms.py,
+    # boxes rows are [x1, y1, x2, y2, conf, cls_id]
+    boxes = boxes[np.argsort(-boxes[:, 4])]
+    keep_boxes = []
+    while boxes.shape[0]:
+        large_overlap = baseline_bbox_iou(np.expand_dims(boxes[0, :4], 0), boxes[:, :4]) > nms_thres
+        label_match = boxes[0, 5] == boxes[:, 5]
+        invalid = large_overlap & label_match
+        keep_boxes += [boxes[0]]
+        boxes = boxes[~invalid]
+    return np.stack(keep_boxes, 0) if len(keep_boxes) else np.zeros((0, boxes.shape[1]))
+
+
+def crowded_scene(rng, n, classes, size=640):
+    # Clusters of jittered boxes, so most boxes overlap some others
+    centers = rng.uniform(0, size, (max(n // 8, 1), 2))
+    xy = centers[rng.integers(0, len(centers), n)] + rng.normal(0, 15, (n, 2))
+    wh = rng.uniform(20, 120, (n, 2))
+    boxes = np.concatenate([xy - wh / 2, xy + wh / 2], axis=1).astype(np.float32)
+    scores = rng.uniform(0.5, 1.0, n).astype(np.float32)
+    return boxes, scores, rng.integers(0, classes, n).astype(np.float32)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_greedy_matches_baseline(seed):
+    rng = np.random.default_rng(seed)
+    boxes, scores, classes = crowded_scene(rng, int(rng.integers(1, 600)), int(rng.integers(1, 4)))
+    keep = nms(boxes, scores, classes, iou_thres=0.4, top_k=None, max_det=None)
+    expected = baseline_nms(np.concatenate([boxes, scores[:, None], classes[:, None]], axis=1), 0.4)
+    assert np.array_equal(np.concatenate([boxes, scores[:, None]], axis=1)[keep], expected[:, :5])
+    assert np.array_equal(classes[keep], expected[:, 5])
+
+
+def test_caps():
+    rng = np.random.default_rng(1)
+    boxes, scores, classes = crowded_scene(rng, 2000, 2)
+    order = np.argsort(-scores, kind="stable")
+    top = order[:300]
+    keep = nms(boxes, scores, classes, top_k=300, max_det=50)
+    assert len(keep) == 50
+    assert np.array_equal(keep, top[nms(boxes[top], scores[top], classes[top], top_k=None, max_det=None)][:50])
+
+
+def test_fast_suppresses_at_least_greedy():
+    rng = np.random.default_rng(2)
+    boxes, scores, classes = crowded_scene(rng, 500, 3)
+    greedy = nms(boxes, scores, classes, top_k=None, max_det=None)
+    fast = nms(boxes, scores, classes, top_k=None, max_det=None, mode="fast")
+    assert set(fast.tolist()) <= set(greedy.tolist())
+
+
+def test_iou_matrix_matches_baseline():
+    rng = np.random.default_rng(3)
+    boxes, _, _ = crowded_scene(rng, 100, 1)
+    iou = box_iou_matrix(boxes)
+    for i in range(len(boxes)):
+        assert np.allclose(iou[i], baseline_bbox_iou(boxes[i:i + 1], boxes), rtol=1e-6, atol=0)
+
+
+def test_empty():
+    assert len(nms(np.zeros((0, 4)), np.zeros(0), np.zeros(0))) == 0
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from backend import ReplayBackend, detection_bindings, segmentation_bindings
+from segmentation_final import YoLov5TRT
+from synthetic import Scene
+from yoloDet import YoloTRT
+
+
+@pytest.mark.parametrize("instances", [20, 300, 1000])
+@pytest.mark.parametrize("size", [(1280, 720), (640, 480)])
+def test_segmentation_instances_survive_nms(instances, size):
+    scene = Scene(size[0], size[1], roads=2, footpaths=3, instances=instances, seed=1)
+    wrapper = YoLov5TRT(backend=ReplayBackend(segmentation_bindings(), outputs=scene.replay("seg", 2)),
+                        nms_top_k=None, max_det=None)
+    for index in range(2):
+        output, proto = scene.segmentation_outputs(index)
+        boxes, scores, classid, coefs = wrapper.post_process(np.ravel(output), scene.height, scene.width)
+        assert len(boxes) == instances
+    results, _ = wrapper.detect([scene.frame(0)])
+    masks = results[0].masks
+    assert len(results[0].boxes) == instances
+    assert all(masks.count_nonzero(i) for i in range(instances))
+
+
+@pytest.mark.parametrize("instances", [20, 300, 1000])
+def test_detection_instances_survive_nms(instances):
+    scene = Scene(signs=8, instances=instances, seed=2)
+    wrapper = YoloTRT(None, None, 0.5, "v5", backend=ReplayBackend(detection_bindings()))
+    wrapper.NMS_TOP_K = wrapper.MAX_DET = None
+    for index in range(0, 60, 15):
+        output, = scene.detection_outputs(index)
+        boxes, scores, classid = wrapper.PostProcess(np.ravel(output)[:wrapper.LEN_ALL_RESULT],
+                                                     scene.height, scene.width)
+        assert len(boxes) == instances
+
+
+def test_wrapper_caps():
+    scene = Scene(instances=1000)
+    wrapper = YoLov5TRT(backend=ReplayBackend(segmentation_bindings()))
+    output, _ = scene.segmentation_outputs(0)
+    boxes, _, _, _ = wrapper.post_process(np.ravel(output), scene.height, scene.width)
+    assert len(boxes) == wrapper.max_det
@@ -0,0 +1,269 @@
+"""
+Per-stage statistics of timing logs, and side-by-side comparison of two runs.
+
+Reads the stdout captures of the old timing scripts and the JSON written by
+Profiler.dump() (--profile PATH of segmentation_final.py and benchmark.py):
+
+    Line-Wise-Time-Detection.txt    Line N: / Plot Bbox: / Last For Loop:
+    Line-wise-time-segmentation.txt Line N, M: / Section ...: / Total Post processing:
+    time_readings*.txt, parth_*.txt,
+    segmentation_timing_results_without_post.txt
+                                    Total preprocessing time: / Inference time: /
+                                    Postprocessing TIme: / Complete execution time ...:
+
+Every value in the text logs is a time.time() difference in seconds, whatever
+unit the line claims ("Inference time: 0.05 ms" is 50 ms); the units are
+ignored. TensorRT log lines and the non-timing prints (overlaps, distances) are
+skipped. Logs are read line by line into the Profiler's streaming histograms,
+so a multi-hour log costs the same memory as a short one.
+
+The first --warmup samples of every stage (engine and CUDA start-up, first
+allocations) are kept apart from the steady-state statistics. A profiler dump
+holds histograms only; benchmark.py already leaves its warm-up batches out.
+
+usage: python timing_logs.py time_readings.txt
+       python timing_logs.py --warmup 10 before.txt after.json
+"""
+import argparse
+import json
+import re
+import sys
+
+from profiler import Profiler, StageHistogram
+
+# "Label: value" with an optional, unreliable unit
+TIMING_LINE = re.compile(r"^(?P<label>[A-Za-z][^:\[]*?)\s*:\s*(?P<value>[-+]?[0-9.]+(?:[eE][-+]?[0-9]+)?)\s*(?:ms|s)?\s*$")
+
+# Labels of the old scripts and the stage names they are reported under; the
+# names of the stages the wrappers' Profiler also times match its names
+STAGE_NAMES = {
+    "Instance Creation time": "setup",
+    "Instance Creation time for Engine and plugin library": "setup",
+    "Total preprocessing time": "preprocess",
+    "Inference time": "inference",
+    "Postprocessing TIme": "post_process",
+    "Total Post processing": "post_process",
+    "Complete execution time for Engine and plugin library": "total",
+    "Plot Bbox": "draw_box",
+    "Last For Loop": "box_loop",
+    "Section Road Segmentation": "road",
+    "Section Footpath Segmentation": "footpath",
+}
+
+# Printed values that are not durations
+NOT_TIMINGS = ("Overlap of ", "Distance")
+
+# Labels logged as start - end by the old detection script
+NEGATED = ("Plot Bbox",)
+
+
+def stage_name(label):
+    """
+    description: Stage name of a log label, e.g. "line 15-20" for "Line 15, 16, 17, 18, 19, 20"
+    """
+    if label in STAGE_NAMES:
+        return STAGE_NAMES[label]
+    if label.startswith("Line "):
+        numbers = [n.strip() for n in label[5:].split(",")]
+        return "line " + (numbers[0] if len(numbers) == 1 else "{}-{}".format(numbers[0], numbers[-1]))
+    return label.lower().replace(" ", "_")
+
+
+def parse_line(line):
+    """
+    description: The timing on one line of a text log.
+    return:
+        (stage name, seconds), or None for a line that holds no timing
+    """
+    match = TIMING_LINE.match(line.strip())
+    if match is None:
+        return None
+    label = match.group("label")
+    if label.startswith(NOT_TIMINGS):
+        return None
+    seconds = float(match.group("value"))
+    if label in NEGATED:
+        seconds = -seconds
+    return stage_name(label), seconds
+
+
+class TimingRun(object):
+    """
+    description: Stage statistics of one run, split into warm-up and steady state.
+    param:
+        warmup: samples of every stage that count as warm-up
+    """
+
+    def __init__(self, warmup=0):
+        self.warmup = warmup
+        self.seen = {}
+        self.steady = Profiler()
+        self.warm = Profiler()
+        self.skipped = 0
+
+    def add(self, name, seconds):
+        if seconds < 0:
+            # Clock steps of time.time() and the like
+            self.skipped += 1
+            return
+        n = self.seen.get(name, 0)
+        self.seen[name] = n + 1
+        profiler = self.warm if n < self.warmup else self.steady
+        profiler.add(name, int(round(seconds * 1e9)))
+
+    def read_log(self, lines):
+        """
+        description: Add the timings of text log lines, read lazily
+        """
+        for line in lines:
+            timing = parse_line(line)
+            if timing is not None:
+                self.add(*timing)
+
+    def read_dump(self, data):
+        """
+        description: Add the histograms of a Profiler.dump() file
+        """
+        for name, hist in data["stages"].items():
+            hist = StageHistogram.from_dict(hist)
+            with self.steady.lock:
+                if name in self.steady.stages:
+                    self.steady.stages[name].merge(hist)
+                else:
+                    self.steady.stages[name] = hist
+
+    @classmethod
+    def load(cls, path, warmup=0):
+        """
+        description: Read a text log or a profiler dump, told apart by the first character
+        """
+        run = cls(warmup)
+        with open(path) as f:
+            first = f.read(1)
+            f.seek(0)
+            if first == "{":
+                run.read_dump(json.load(f))
+            else:
+                run.read_log(f)
+        return run
+
+    def stats(self):
+        """
+        return:
+            Profiler.stats() of the steady state, plus "warmup_mean", the mean
+            of the warm-up samples (None without any)
+        """
+        stats = self.steady.stats()
+        warm = self.warm.stats()
+        for name, s in warm.items():
+            if name not in stats:
+                stats[name] = {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+        for name, s in stats.items():
+            s["warmup_mean"] = warm[name]["mean"] if name in warm else None
+        return stats
+
+
+def report(run):
+    """
+    description: The stage table of one run, times in ms
+    """
+    lines = ["{:>14} {:>8} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+        "stage (ms)", "count", "mean", "p50", "p95", "p99", "max", "warm-up")]
+    for name, s in run.stats().items():
+        warm = "-" if s["warmup_mean"] is None else "{:.3f}".format(s["warmup_mean"])
+        lines.append("{:>14} {:>8} {:9.3f} {:9.3f} {:9.3f} {:9.3f} {:9.3f} {:>9}".format(
+            name, s["count"], s["mean"], s["p50"], s["p95"], s["p99"], s["max"], warm))
+    if run.skipped:
+        lines.append("{} negative durations skipped".format(run.skipped))
+    return "\n".join(lines)
+
+
+def compare(base, new, threshold=10.0):
+    """
+    description: Side-by-side table of two runs. A stage whose steady-state
+                 mean, p50 or p95 grew by more than threshold percent is
+                 marked as a regression.
+    return:
+        the table, the names of the regressed stages
+    """
+    base_stats, new_stats = base.stats(), new.stats()
+    names = list(base_stats) + [name for name in new_stats if name not in base_stats]
+    lines = ["{:>14} {:>19} {:>19} {:>19} {:>19}".format(
+        "stage (ms)", "mean", "p50", "p95", "p99")]
+    lines.append("{:>14}".format("") + "    base     new change" * 4)
+    regressions = []
+    for name in names:
+        a, b = base_stats.get(name), new_stats.get(name)
+        if not a or not b or not a["count"] or not b["count"]:
+            lines.append("{:>14}   only in {}".format(name, "base" if a and a["count"] else "new"))
+            continue
+        cells = []
+        regressed = False
+        for key in ("mean", "p50", "p95", "p99"):
+            change = (b[key] - a[key]) / a[key] * 100 if a[key] else 0.0
+            if key != "p99" and change > threshold:
+                regressed = True
+            cells.append("{:7.3f} {:7.3f} {:+4.0f}%".format(a[key], b[key], change))
+        lines.append("{:>14} {}{}".format(name, " ".join(cells), "  << slower" if regressed else ""))
+        if regressed:
+            regressions.append(name)
+    return "\n".join(lines), regressions
+
+
+def plot(run, path=None):
+    """
+    description: Bar chart of the steady-state p50 and p95 of every stage,
+                 shown, or saved to path
+    """
+    import matplotlib
+    if path:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    stats = run.stats()
+    names = list(stats)
+    x = range(len(names))
+    plt.figure(figsize=(max(6, 0.5 * len(names)), 4))
+    plt.bar([i - 0.2 for i in x], [stats[n]["p50"] for n in names], width=0.4, label="p50")
+    plt.bar([i + 0.2 for i in x], [stats[n]["p95"] for n in names], width=0.4, label="p95")
+    plt.xticks(list(x), names, rotation=60, ha="right")
+    plt.ylabel("ms")
+    plt.legend()
+    plt.grid(True, axis="y")
+    plt.tight_layout()
+    if path:
+        plt.savefig(path)
+    else:
+        plt.show()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("logs", nargs="+", metavar="LOG", help="one run to report, or base and new run to compare")
+    parser.add_argument("--warmup", type=int, default=5, help="samples of every stage left out as warm-up")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent growth that counts as a regression")
+    parser.add_argument("--dump", metavar="PATH", help="write the steady-state histograms of one run as profiler JSON")
+    parser.add_argument("--plot", nargs="?", const="", default=None, metavar="PATH",
+                        help="bar chart of the stages of one run, saved to PATH if given")
+    args = parser.parse_args()
+    if len(args.logs) > 2:
+        parser.error("give one log to report or two to compare")
+
+    runs = [TimingRun.load(path, args.warmup) for path in args.logs]
+    if len(runs) == 1:
+        print(report(runs[0]))
+        if args.dump:
+            runs[0].steady.dump(args.dump)
+        if args.plot is not None:
+            plot(runs[0], args.plot)
+        return 0
+    table, regressions = compare(runs[0], runs[1], args.threshold)
+    print("base: {}\n new: {}".format(*args.logs))
+    print(table)
+    if regressions:
+        print("slower by more than {:g}%: {}".format(args.threshold, ", ".join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
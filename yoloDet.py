@@ -1,99 +1,92 @@
 import cv2
 import numpy as np
-import tensorrt as trt
-import pycuda.autoinit
 import random
 import ctypes
-import pycuda.driver as cuda
-import time
+import threading
 
-
-EXPLICIT_BATCH = 1 << (int)(trt.NetworkDefinitionCreationFlag.EXPLICIT_BATCH)
-host_inputs  = []
-cuda_inputs  = []
-host_outputs = []
-cuda_outputs = []
-bindings = []
+from backend import TensorRTBackend
+from letterbox import Letterbox, letterbox_geometry
+from nms import MAX_DET, NMS_TOP_K, nms
+from profiler import Profiler
+from render import DetectionRenderer
 
 
 class YoloTRT():
-    def __init__(self, library, engine, conf, yolo_ver):
+    """
+    description: TensorRT detector of the traffic signs and lights.
+
+    NonMaxSuppression keeps at most MAX_DET (100) boxes, picked from the
+    NMS_TOP_K (300) most confident candidates, so the postprocessing of a
+    crowded frame has a bounded cost, see nms.py; the greedy suppression loops
+    over at most NMS_TOP_K candidates. The old suppression had no limit; set
+    NMS_TOP_K and MAX_DET to None on an instance to get its result back.
+    """
+
+    def __init__(self, library, engine, conf, yolo_ver, backend=None, profiler=None, recorder=None):
         self.CONF_THRESH = conf 
         self.IOU_THRESHOLD = 0.4
+        self.NMS_TOP_K = NMS_TOP_K
+        self.MAX_DET = MAX_DET
         self.LEN_ALL_RESULT = 38001
         self.LEN_ONE_RESULT = 38
         self.yolo_version = yolo_ver
         self.categories = ["bus_stop", "20_mph", "do_not_enter", "do_not_stop", "do_not_turn_l", "do_not_turn_r", "do_not_u_turn", "enter_left_lane", "green_light", "left_right_lane", "no_parking", "parking", "ped_crossing", "ped_zebra_cross", "railway_crossing", "red_light", "stop", "t_intersection_l", "traffic_light", "u_turn", "warning", "yellow_light"]
         
-        TRT_LOGGER = trt.Logger(trt.Logger.INFO)
-
-        ctypes.CDLL(library)
-
-        with open(engine, 'rb') as f:
-            serialized_engine = f.read()
-
-        runtime = trt.Runtime(TRT_LOGGER)
-        self.engine = runtime.deserialize_cuda_engine(serialized_engine)
-        self.batch_size = self.engine.max_batch_size
-
-        for binding in self.engine:
-            size = trt.volume(self.engine.get_binding_shape(binding)) * self.batch_size
-            dtype = trt.nptype(self.engine.get_binding_dtype(binding))
-            host_mem = cuda.pagelocked_empty(size, dtype)
-            cuda_mem = cuda.mem_alloc(host_mem.nbytes)
+        if backend is None:
+            ctypes.CDLL(library)
+            # Own context, stream and buffers; the deserialized engine is
+            # shared with the other detectors on the same engine file
+            backend = TensorRTBackend(engine, make_context=False)
+        self.backend = backend
+        # One frame at a time per detector, detectors run side by side
+        self.lock = threading.Lock()
+        self.batch_size = backend.batch_size
+        self.input_w = backend.input_w
+        self.input_h = backend.input_h
+        self.input_batch = backend.host_inputs[0].reshape(self.batch_size, 3, self.input_h, self.input_w)
+        self.letterbox = Letterbox(self.input_h, self.input_w)
+        # Draws for Inference(), in place; colors per class and cached labels
+        self.renderer = DetectionRenderer(self.categories)
+        # Stage timings, see profiler.py; off unless a Profiler is given
+        self.profiler = profiler or Profiler(enabled=False)
+        # Engine outputs of every frame go to the recorder if given, see engine_capture.py
+        self.recorder = recorder
 
-            bindings.append(int(cuda_mem))
-            if self.engine.binding_is_input(binding):
-                self.input_w = self.engine.get_binding_shape(binding)[-1]
-                self.input_h = self.engine.get_binding_shape(binding)[-2]
-                host_inputs.append(host_mem)
-                cuda_inputs.append(cuda_mem)
-            else:
-                host_outputs.append(host_mem)
-                cuda_outputs.append(cuda_mem)
+    def destroy(self):
+        with self.lock:
+            self.backend.destroy()
 
     def PreProcessImg(self, img):
         image_raw = img
-        h, w, c = image_raw.shape
-        image = cv2.cvtColor(image_raw, cv2.COLOR_BGR2RGB)
-        r_w = self.input_w / w
-        r_h = self.input_h / h
-        if r_h > r_w:
-            tw = self.input_w
-            th = int(r_w * h)
-            tx1 = tx2 = 0
-            ty1 = int((self.input_h - th) / 2)
-            ty2 = self.input_h - th - ty1
-        else:
-            tw = int(r_h * w)
-            th = self.input_h
-            tx1 = int((self.input_w - tw) / 2)
-            tx2 = self.input_w - tw - tx1
-            ty1 = ty2 = 0
-        image = cv2.resize(image, (tw, th))
-        image = cv2.copyMakeBorder(image, ty1, ty2, tx1, tx2, cv2.BORDER_CONSTANT, None, (128, 128, 128))
-        image = image.astype(np.float32)
-        image /= 255.0
-        image = np.transpose(image, [2, 0, 1])
-        image = np.expand_dims(image, axis=0)
-        image = np.ascontiguousarray(image)
+        image = np.empty((1, 3, self.input_h, self.input_w), dtype=np.float32)
+        h, w = self.letterbox(image_raw, image[0])
         return image, image_raw, h, w
 
-    def Inference(self, img):
-        input_image, image_raw, origin_h, origin_w = self.PreProcessImg(img)
-        np.copyto(host_inputs[0], input_image.ravel())
-        stream = cuda.Stream()
-        self.context = self.engine.create_execution_context()
-        cuda.memcpy_htod_async(cuda_inputs[0], host_inputs[0], stream)
-        t1 = time.time()
-        self.context.execute_async(self.batch_size, bindings, stream_handle=stream.handle)
-        cuda.memcpy_dtoh_async(host_outputs[0], cuda_outputs[0], stream)
-        stream.synchronize()
-        t2 = time.time()
-        output = host_outputs[0]
-                
-        for i in range(self.batch_size):
-            result_boxes, result_scores, result_classid = self.PostProcess(output[i * self.LEN_ALL_RESULT: (i + 1) * self.LEN_ALL_RESULT], origin_h, origin_w)
+    def Detect(self, img):
+        """
+        description: Results-only inference: img is not drawn on and nothing is
+                     printed, see render.DetectionRenderer to draw the detections.
+        return:
+            det_res:  a dict per detection with class, class_id, conf, box and distance
+            use_time: engine time in seconds
+        """
+        profiler = self.profiler
+        with self.lock:
+            with profiler.stage("preprocess"):
+                origin_h, origin_w = self.letterbox(img, self.input_batch[0])
+            self.backend.push()
+            try:
+                # One frame, the other slots of a batched engine are not run
+                use_time = self.backend.execute(1)
+            finally:
+                self.backend.pop()
+            profiler.record(self.backend.slots[0].stage_times)
+            output = self.backend.host_outputs[0]
+            if self.recorder is not None:
+                self.recorder.write([output[:output.size // self.batch_size]], origin_h, origin_w)
+
+            with profiler.stage("post_process"):
+                result_boxes, result_scores, result_classid = self.PostProcess(output[:self.LEN_ALL_RESULT], origin_h, origin_w)
             
         det_res = []
         for j in range(len(result_boxes)):
@@ -108,14 +101,25 @@ class YoloTRT():
             distance = (squared_diff_x + squared_diff_y)**0.5
             area = (px2-px1) * (py2-py1)
             distance_real = area/distance
-            print(f"Distance (Real): {distance_real}")
             det = dict()
             det["class"] = self.categories[int(result_classid[j])]
+            det["class_id"] = int(result_classid[j])
             det["conf"] = result_scores[j]
             det["box"] = box 
+            det["distance"] = distance_real
             det_res.append(det)
-            self.PlotBbox(box, img, label="{}:{:.2f}".format(self.categories[int(result_classid[j])], result_scores[j]),)
-        return det_res, t2-t1
+        return det_res, use_time
+
+    def Inference(self, img):
+        """
+        description: Detect(), then print the distances and draw the boxes on img
+        """
+        det_res, use_time = self.Detect(img)
+        for det in det_res:
+            print(f"Distance (Real): {det['distance']}")
+        with self.profiler.stage("draw"):
+            self.renderer.render(img, det_res)
+        return det_res, use_time
 
     def PostProcess(self, output, origin_h, origin_w):
         num = int(output[0])
@@ -138,36 +142,12 @@ class YoloTRT():
         boxes[:, 2] = np.clip(boxes[:, 2], 0, origin_w -1)
         boxes[:, 1] = np.clip(boxes[:, 1], 0, origin_h -1)
         boxes[:, 3] = np.clip(boxes[:, 3], 0, origin_h -1)
-        confs = boxes[:, 4]
-        boxes = boxes[np.argsort(-confs)]
-        keep_boxes = []
-        while boxes.shape[0]:
-            large_overlap = self.bbox_iou(np.expand_dims(boxes[0, :4], 0), boxes[:, :4]) > nms_thres
-            label_match = boxes[0, -1] == boxes[:, -1]
-            # Indices of boxes with lower confidence scores, large IOUs and matching labels
-            invalid = large_overlap & label_match
-            keep_boxes += [boxes[0]]
-            boxes = boxes[~invalid]
-        boxes = np.stack(keep_boxes, 0) if len(keep_boxes) else np.array([])
-        return boxes
+        # Class-aware nms in a bounded number of numpy passes, see nms.py
+        keep = nms(boxes[:, :4], boxes[:, 4], boxes[:, -1], iou_thres=nms_thres, top_k=self.NMS_TOP_K, max_det=self.MAX_DET)
+        return boxes[keep]
     
     def xywh2xyxy(self, origin_h, origin_w, x):
-        y = np.zeros_like(x)
-        r_w = self.input_w / origin_w
-        r_h = self.input_h / origin_h
-        if r_h > r_w:
-            y[:, 0] = x[:, 0] - x[:, 2] / 2
-            y[:, 2] = x[:, 0] + x[:, 2] / 2
-            y[:, 1] = x[:, 1] - x[:, 3] / 2 - (self.input_h - r_w * origin_h) / 2
-            y[:, 3] = x[:, 1] + x[:, 3] / 2 - (self.input_h - r_w * origin_h) / 2
-            y /= r_w
-        else:
-            y[:, 0] = x[:, 0] - x[:, 2] / 2 - (self.input_w - r_h * origin_w) / 2
-            y[:, 2] = x[:, 0] + x[:, 2] / 2 - (self.input_w - r_h * origin_w) / 2
-            y[:, 1] = x[:, 1] - x[:, 3] / 2
-            y[:, 3] = x[:, 1] + x[:, 3] / 2
-            y /= r_h
-        return y
+        return letterbox_geometry(origin_h, origin_w, self.input_h, self.input_w).boxes_to_source(x)
     
     def bbox_iou(self, box1, box2, x1y1x2y2=True):
         if not x1y1x2y2: